@@ -0,0 +1 @@
+"""Benchmarks, run as modules from the repo root: `uv run python -m benchmarks.<name> --help`."""
@@ -0,0 +1,135 @@
+"""Build a synthetic inventory from a local, fault-injecting origin, and record how it went.
+
+    uv run python -m benchmarks.build --hosts 2000 --latency 0.02 --jitter 0.01 --output before.json
+    uv run python -m benchmarks.build --hosts 2000 --latency 0.02 --jitter 0.01 --compare before.json
+
+Serves synthetic_repo from benchmarks.origin, then drives AnsibleCMDB.build() and refresh() against it, several
+times over. Each phase records its wall time, the CPU time this process spent, the requests the origin saw (and
+their statuses), and the process's peak RSS. The median of each goes to --output as JSON, a baseline that a later
+run can --compare against. Peak RSS is the high-water mark of the whole process, so it only ever goes up between
+phases.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import platform
+import resource
+import statistics
+import sys
+import time
+from pathlib import Path
+
+from ansibleinventorycmdb.cmdb import AnsibleCMDB
+from ansibleinventorycmdb.config import Inventory
+
+from .origin import FAULT_DEFAULTS, Origin
+from .synthetic import SCHEMA_MAPPING, synthetic_repo
+
+PHASES = ("build", "refresh")
+METRICS = ("wall_s", "cpu_s", "requests", "peak_rss_mb")
+
+
+def peak_rss_mb() -> float:
+    """This process's peak resident set size so far. ru_maxrss is in KiB on Linux, but bytes on macOS."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def measure_phase(cmdb: AnsibleCMDB, phase: str, origin: Origin) -> dict:
+    """Run one phase, build or refresh, and record what it took."""
+    before = origin.stats()
+    cpu_start = time.process_time()
+    start = time.perf_counter()
+    asyncio.run(getattr(cmdb, phase)())
+    wall = time.perf_counter() - start
+    cpu = time.process_time() - cpu_start
+    served = origin.stats() - before
+
+    return {
+        "wall_s": wall,
+        "cpu_s": cpu,
+        "requests": served.pop("requests", 0),
+        "statuses": dict(sorted(served.items())),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def run_benchmark(files: dict[str, bytes], faults: dict, runs: int) -> dict:
+    """Build and refresh `runs` times against an origin serving files. Returns the median of each metric by phase."""
+    samples: dict[str, list[dict]] = {phase: [] for phase in PHASES}
+    with Origin(files, **faults) as origin:
+        inventories = {
+            "synthetic": Inventory(inventory_url=f"{origin.url}/inventory/main.yml", schema_mapping=SCHEMA_MAPPING)
+        }
+        for _ in range(runs):
+            cmdb = AnsibleCMDB(inventories)  # No instance path: nothing cached on disk between runs
+            for phase in PHASES:
+                samples[phase].append(measure_phase(cmdb, phase, origin))
+            hosts = len(cmdb.inventories["synthetic"]["hosts"])
+
+    results = {}
+    for phase, phase_samples in samples.items():
+        results[phase] = {metric: statistics.median(sample[metric] for sample in phase_samples) for metric in METRICS}
+        results[phase]["statuses"] = phase_samples[-1]["statuses"]
+    results["hosts"] = hosts
+    return results
+
+
+def compare(baseline: dict, current: dict) -> None:
+    """Print each metric of a baseline next to this run's, with the ratio."""
+    if baseline["params"] != current["params"]:
+        print("Warning: the baseline was run with different parameters:", baseline["params"])  # noqa: T201
+    for phase in PHASES:
+        for metric in METRICS:
+            before = baseline["results"][phase][metric]
+            after = current["results"][phase][metric]
+            ratio = f"{after / before:6.2f}x" if before else "     -"
+            print(f"{phase:>8} {metric:<12} {before:10.3f} -> {after:10.3f}  {ratio}")  # noqa: T201
+
+
+def main() -> None:
+    """Run the benchmark, print the results, and save or compare them."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hosts", type=int, default=1000, help="hosts in the inventory")
+    parser.add_argument("--groups", type=int, default=20, help="groups besides all and the role groups")
+    parser.add_argument("--vars", type=int, default=20, help="extra vars in each host's vars file")
+    parser.add_argument("--missing", type=float, default=0.5, help="fraction of hosts and groups with no vars file")
+    parser.add_argument("--manifest", action="store_true", help="publish a vars file manifest beside the inventory")
+    parser.add_argument("--runs", type=int, default=3, help="builds and refreshes to take the median of")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds every response waits")
+    parser.add_argument("--jitter", type=float, default=0.0, help="seconds the latency varies by, either way")
+    parser.add_argument("--not-found", type=float, default=0.0, help="fraction of requests answered 404 anyway")
+    parser.add_argument("--timeouts", type=float, default=0.0, help="fraction of requests never answered")
+    parser.add_argument("--rate", type=float, default=0.0, help="requests per second before 429s, 0 for no limit")
+    parser.add_argument("--output", type=Path, help="write the results here as a JSON baseline")
+    parser.add_argument("--compare", type=Path, help="a baseline from --output to compare against")
+    args = parser.parse_args()
+
+    params = {
+        "hosts": args.hosts,
+        "groups": args.groups,
+        "vars": args.vars,
+        "missing": args.missing,
+        "manifest": args.manifest,
+    }
+    faults = {fault: getattr(args, fault) for fault in FAULT_DEFAULTS if hasattr(args, fault)}
+    files = synthetic_repo(args.hosts, args.groups, args.vars, args.missing, manifest=args.manifest)
+
+    current = {
+        "params": {**params, **faults, "runs": args.runs},
+        "python": platform.python_version(),
+        "results": run_benchmark(files, faults, args.runs),
+    }
+    print(json.dumps(current, indent=2))  # noqa: T201
+
+    if args.compare:
+        compare(json.loads(args.compare.read_text()), current)
+    if args.output:
+        args.output.write_text(json.dumps(current, indent=2) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""Measure what a Worker cold start pays before its first page: imports, loading the config, and the first render.
+
+    uv run python -m benchmarks.coldstart --runs 10
+
+Compares the two ways entry.py can start. "source" validates config.yml with PyYAML and pydantic and compiles the
+templates from source on the first render; "bundled" reads the config.json and compiled templates that
+`npm run bundle` leaves (ansibleinventorycmdb.bundle), prepared here in a temporary directory. Every run is a
+fresh interpreter, since a warm one has everything imported already. Reports the median of each.
+
+CPython is not Pyodide, where imports are slower still, so read the ratio rather than the milliseconds.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Objects rendered for the "first render": the home page, the inventory page and its JSON, and the first hosts.
+FIRST_RENDER_OBJECTS = 6
+
+
+def child(mode: str, work_dir: Path) -> None:
+    """One cold start, in this fresh interpreter. Prints its timings as JSON."""
+    import itertools  # noqa: PLC0415 Everything is imported in here, so the parent costs the child nothing
+
+    inventories = json.loads((work_dir / "inventory.json").read_text())
+
+    start = time.perf_counter()
+    if mode == "bundled":
+        from ansibleinventorycmdb.bundle import load_bundled_config  # noqa: PLC0415
+
+        config = load_bundled_config(work_dir / "config.json")
+    else:
+        import yaml  # noqa: PLC0415
+
+        from ansibleinventorycmdb.config import Config  # noqa: PLC0415
+
+        config = Config(**yaml.safe_load((work_dir / "config.yml").read_text()))
+    from ansibleinventorycmdb import site  # noqa: PLC0415
+
+    # Either the bundled set, or a directory with nothing in it, which leaves compiling from source.
+    site.COMPILED_TEMPLATES_DIR = work_dir / ("compiled_templates" if mode == "bundled" else "none")
+    loaded = time.perf_counter()
+
+    list(itertools.islice(site.render_site(inventories, config.cmdb, "benchmark"), FIRST_RENDER_OBJECTS))
+    rendered = time.perf_counter()
+
+    print(json.dumps({"startup": loaded - start, "first_render": rendered - loaded}))  # noqa: T201
+
+
+def prepare(work_dir: Path, hosts: int) -> None:
+    """Write what both modes start from: the inventory, config.yml, and the bundle made from them."""
+    import yaml  # noqa: PLC0415
+
+    from ansibleinventorycmdb.bundle import compile_templates  # noqa: PLC0415
+    from ansibleinventorycmdb.config import Config  # noqa: PLC0415
+
+    from .synthetic import SCHEMA_MAPPING, synthetic_inventory  # noqa: PLC0415
+
+    (work_dir / "inventory.json").write_text(json.dumps({"synthetic": synthetic_inventory(hosts)}))
+    raw_config = {
+        "cmdb": {"synthetic": {"inventory_url": "https://example.com/inventory.yml", "schema_mapping": SCHEMA_MAPPING}}
+    }
+    (work_dir / "config.yml").write_text(yaml.safe_dump(raw_config))
+    (work_dir / "config.json").write_text(json.dumps(Config(**raw_config).model_dump(mode="json")))
+    compile_templates(work_dir / "compiled_templates")
+
+
+def measure(mode: str, work_dir: Path, runs: int) -> dict[str, float]:
+    """Median timings, in ms, over `runs` fresh interpreters."""
+    results = [
+        json.loads(
+            subprocess.run(  # noqa: S603 Runs this file again, with arguments from here
+                [sys.executable, "-m", "benchmarks.coldstart", "--child", mode, "--work-dir", str(work_dir)],
+                check=True,
+                capture_output=True,
+                text=True,
+            ).stdout
+        )
+        for _ in range(runs)
+    ]
+    return {key: 1000 * statistics.median(result[key] for result in results) for key in results[0]}
+
+
+def main() -> None:
+    """Run the benchmark and print the timings."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=10, help="fresh interpreters per mode")
+    parser.add_argument("--hosts", type=int, default=50, help="hosts in the synthetic inventory")
+    parser.add_argument("--child", choices=["source", "bundled"], help=argparse.SUPPRESS)
+    parser.add_argument("--work-dir", type=Path, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child, args.work_dir)
+        return
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        prepare(Path(work_dir), args.hosts)
+        for mode in ("source", "bundled"):
+            timings = measure(mode, Path(work_dir), args.runs)
+            print(  # noqa: T201
+                f"{mode:>8}: imports and config {timings['startup']:6.1f} ms, "
+                f"first render {timings['first_render']:6.1f} ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
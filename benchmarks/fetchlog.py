@@ -0,0 +1,84 @@
+"""What logging costs the fetch loop: at INFO, and at DEBUG to a file, written directly or through the queue.
+
+    uv run python -m benchmarks.fetchlog --fetches 20000
+
+Drives AnsibleCMDB._get_yaml over distinct URLs with a fetch that answers at once with nothing, so what's left is
+the cache lookup, the semaphore and the logging, all on the event loop's thread. The console handler writes to
+os.devnull, leaving the file handler's writes and rotations as the only I/O. Reported per fetch, as the loop sees
+it: with the queue, the file is written on the listener's thread, which this doesn't count.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+import os
+import tempfile
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+from ansibleinventorycmdb.cmdb import AnsibleCMDB
+from ansibleinventorycmdb.logger import setup_logger
+
+# name: (level, log to a file, through the queue)
+MODES = {
+    "info": ("INFO", False, False),
+    "debug-file": ("DEBUG", True, False),
+    "debug-file-queue": ("DEBUG", True, True),
+}
+
+
+async def _nothing(_url: str) -> None:
+    """A fetch that answers at once, with no body."""
+
+
+def _reset(root: logging.Logger) -> None:
+    """Take down the last mode's handlers, draining and stopping its queue listener if it had one."""
+    for handler in root.handlers[:]:
+        if listener := getattr(handler, "listener", None):
+            listener.stop()
+            for inner in listener.handlers:
+                inner.close()
+        root.removeHandler(handler)
+        handler.close()
+
+
+def time_fetches(fetches: int, level: str, log_path: str, *, queue: bool) -> float:
+    """Microseconds per fetch of `fetches` distinct URLs, logging as configured."""
+    root = logging.getLogger()
+    _reset(root)
+    root.addHandler(logging.StreamHandler(open(os.devnull, "w")))  # noqa: SIM115 Closed by _reset
+    setup_logger(SimpleNamespace(level=level, path=log_path, queue=queue))
+
+    cmdb = AnsibleCMDB({})
+    urls = [f"https://example.com/inventory/host_vars/host{number}.yml" for number in range(fetches)]
+
+    async def fetch_all() -> float:
+        start = time.perf_counter()
+        for url in urls:
+            await cmdb._get_yaml(url, _nothing)  # noqa: SLF001 The hot path itself is what's measured
+        return time.perf_counter() - start
+
+    elapsed = asyncio.run(fetch_all())
+    _reset(root)
+    return elapsed / fetches * 1e6
+
+
+def main() -> None:
+    """Run each mode and print the cost per fetch."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fetches", type=int, default=20000, help="distinct URLs to fetch per mode")
+    parser.add_argument("--runs", type=int, default=3, help="runs per mode, keeping the fastest")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        for mode, (level, to_file, queue) in MODES.items():
+            log_path = str(Path(directory) / f"{mode}.log") if to_file else ""
+            best = min(time_fetches(args.fetches, level, log_path, queue=queue) for _ in range(args.runs))
+            print(f"{mode:<18} {best:7.2f} us/fetch")  # noqa: T201
+
+
+if __name__ == "__main__":
+    main()
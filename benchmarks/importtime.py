@@ -0,0 +1,90 @@
+"""Report what importing a module costs, per module, from CPython's `-X importtime`.
+
+    uv run python -m benchmarks.importtime ansibleinventorycmdb.site --top 15
+
+Imports the module in a fresh interpreter and reports the total, the time by top-level package, and the modules
+that took longest themselves. Only what the import itself loaded counts: whatever the interpreter imported while
+starting up (site, .pth files) is already loaded by then, and left out. tests/test_importtime.py holds the
+package's entry points to a budget using the same parse.
+"""
+
+from __future__ import annotations
+
+import argparse
+import subprocess
+import sys
+from collections import defaultdict
+
+# Printed between interpreter startup and the import being measured, see import_times.
+_MARKER = "-- importtime start --"
+
+
+def parse_importtime(output: str) -> list[dict]:
+    """Parse `-X importtime` output into one dict per module, from the first line after the marker (if any).
+
+    Each has `module`, `depth` (0 for what the statement imported itself), and `self_us` and `cumulative_us`,
+    the microseconds spent in that module alone and including everything it imported. Listed in the order the
+    imports finished, so a module comes after everything it imported.
+    """
+    _, marker, after = output.partition(_MARKER)
+    modules = []
+    for line in (after if marker else output).splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line.removeprefix("import time:").split("|")
+        modules.append(
+            {
+                "module": name.strip(),
+                "depth": (len(name) - len(name.lstrip()) - 1) // 2,
+                "self_us": int(self_us),
+                "cumulative_us": int(cumulative_us),
+            }
+        )
+    return modules
+
+
+def import_times(module: str) -> list[dict]:
+    """Import module in a fresh interpreter, and parse what that imported. See parse_importtime."""
+    statement = f"import sys; sys.stderr.write({_MARKER!r} + '\\n'); sys.stderr.flush(); import {module}"
+    result = subprocess.run(  # noqa: S603 The interpreter running this, on a module name
+        [sys.executable, "-X", "importtime", "-c", statement], capture_output=True, text=True, check=True
+    )
+    return parse_importtime(result.stderr)
+
+
+def total_ms(modules: list[dict]) -> float:
+    """Milliseconds the whole import took: the top-level imports' cumulative times."""
+    return sum(module["cumulative_us"] for module in modules if module["depth"] == 0) / 1000
+
+
+def by_package(modules: list[dict]) -> dict[str, float]:
+    """Milliseconds spent in each top-level package's own modules, most first."""
+    packages: dict[str, float] = defaultdict(float)
+    for module in modules:
+        packages[module["module"].partition(".")[0]] += module["self_us"] / 1000
+    return dict(sorted(packages.items(), key=lambda item: item[1], reverse=True))
+
+
+def main() -> None:
+    """Print the report for one module."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("module", help="module to import, e.g. ansibleinventorycmdb.site")
+    parser.add_argument("--top", type=int, default=15, help="packages and modules to list (default: 15)")
+    args = parser.parse_args()
+
+    modules = import_times(args.module)
+    print(f"import {args.module}: {total_ms(modules):.1f} ms, {len(modules)} modules\n")  # noqa: T201
+
+    print("By package (own time):")  # noqa: T201
+    for package, ms in list(by_package(modules).items())[: args.top]:
+        print(f"  {ms:8.1f} ms  {package}")  # noqa: T201
+
+    print("\nSlowest modules (own time, then including what they imported):")  # noqa: T201
+    for module in sorted(modules, key=lambda module: module["self_us"], reverse=True)[: args.top]:
+        print(  # noqa: T201
+            f"  {module['self_us'] / 1000:8.1f} ms {module['cumulative_us'] / 1000:8.1f} ms  {module['module']}"
+        )
+
+
+if __name__ == "__main__":
+    main()
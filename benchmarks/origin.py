@@ -0,0 +1,173 @@
+"""A local origin serving an inventory repo, with faults to inject: latency, jitter, 404s, timeouts and throttling.
+
+Runs in a process of its own, so serving takes neither CPU time nor the GIL from the build being measured. Faults
+are drawn from a seeded random generator, so a run with the same settings sees much the same faults, though which
+request draws which depends on the order concurrent requests arrive in.
+
+Faults, each off by default:
+
+- latency, jitter: every response waits latency seconds, give or take up to jitter.
+- not_found: this fraction of requests for files that exist are answered 404 anyway.
+- timeouts: this fraction of requests get no answer for `hang` seconds, past the client's timeout, and then the
+  connection is closed.
+- rate: requests per second allowed, with a second's worth of burst. Beyond that, 429 Too Many Requests.
+
+GET STATS_PATH for what the origin has served so far: requests in total, and a count per status.
+"""
+
+from __future__ import annotations
+
+import json
+import multiprocessing
+import random
+import threading
+import time
+import urllib.request
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import TYPE_CHECKING, Self
+
+from ansibleinventorycmdb.cmdb import REQUEST_TIMEOUT_SECONDS
+
+if TYPE_CHECKING:
+    from multiprocessing.connection import Connection
+    from types import TracebackType
+
+STATS_PATH = "/_origin/stats"
+
+FAULT_DEFAULTS = {
+    "latency": 0.0,
+    "jitter": 0.0,
+    "not_found": 0.0,
+    "timeouts": 0.0,
+    "hang": REQUEST_TIMEOUT_SECONDS + 1.0,
+    "rate": 0.0,
+    "seed": 0,
+}
+
+
+class _OriginHandler(BaseHTTPRequestHandler):
+    """Serves the repo's files, injecting the configured faults. State is set on the class by _serve."""
+
+    files: dict[str, bytes] = {}  # noqa: RUF012 One origin per process, http.server gives no other hook
+    faults: dict = FAULT_DEFAULTS
+    rng = random.Random()  # noqa: S311 Fault injection, not crypto
+    lock = threading.Lock()
+    stats: Counter = Counter()  # noqa: RUF012
+    tokens = 0.0
+    refilled_at = 0.0
+
+    def _take_token(self) -> bool:
+        """Whether the rate limit lets this request through. Call with the lock held."""
+        rate = self.faults["rate"]
+        if not rate:
+            return True
+        now = time.monotonic()
+        cls = type(self)
+        cls.tokens = min(rate, cls.tokens + (now - cls.refilled_at) * rate)
+        cls.refilled_at = now
+        if cls.tokens < 1:
+            return False
+        cls.tokens -= 1
+        return True
+
+    def _fault(self) -> tuple[str, float]:
+        """What happens to this request, and how long it waits first. Draws under the lock, the generator is shared."""
+        with self.lock:
+            self.stats["requests"] += 1
+            if not self._take_token():
+                return "429", 0.0
+            if self.rng.random() < self.faults["timeouts"]:
+                return "timeout", self.faults["hang"]
+            delay = max(0.0, self.faults["latency"] + self.rng.uniform(-1, 1) * self.faults["jitter"])
+            if self.rng.random() < self.faults["not_found"]:
+                return "404", delay
+            return "", delay
+
+    def _respond(self, status: int, body: bytes, content_type: str = "application/yaml") -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self) -> None:
+        """Serve a file, a fault, or the stats."""
+        if self.path == STATS_PATH:
+            with self.lock:
+                body = json.dumps(dict(self.stats)).encode()
+            self._respond(200, body, "application/json")
+            return
+
+        fault, delay = self._fault()
+        time.sleep(delay)
+
+        if fault == "timeout":
+            self.close_connection = True  # Nothing was sent; the client gave up long ago
+            status = "timeout"
+        elif fault == "429":
+            self._respond(429, b"")
+            status = "429"
+        elif fault == "404" or (body := self.files.get(self.path.lstrip("/"))) is None:
+            self._respond(404, b"")
+            status = "404"
+        else:
+            self._respond(200, body)
+            status = "200"
+
+        with self.lock:
+            self.stats[status] += 1
+
+    def log_message(self, format, *args) -> None:  # noqa: A002, ANN001, ANN002 Matches BaseHTTPRequestHandler
+        """Silence the per-request stderr logging."""
+
+
+def _serve(files: dict[str, bytes], faults: dict, connection: Connection) -> None:
+    """Serve until terminated, in the origin's own process. Sends the port back once listening."""
+    _OriginHandler.files = files
+    _OriginHandler.faults = faults
+    _OriginHandler.rng = random.Random(faults["seed"])  # noqa: S311
+    _OriginHandler.tokens = faults["rate"]
+    _OriginHandler.refilled_at = time.monotonic()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _OriginHandler)
+    server.daemon_threads = True
+    connection.send(server.server_address[1])
+    server.serve_forever()
+
+
+class Origin:
+    """The origin, as a context manager that starts its process and stops it. `url` is its base URL."""
+
+    def __init__(self, files: dict[str, bytes], **faults: float) -> None:
+        """Serve files, {path: body}, with any of FAULT_DEFAULTS overridden."""
+        unknown = faults.keys() - FAULT_DEFAULTS.keys()
+        if unknown:
+            msg = f"Unknown faults: {sorted(unknown)}"
+            raise ValueError(msg)
+        self.files = files
+        self.faults = {**FAULT_DEFAULTS, **faults}
+        self.url = ""
+        self._process: multiprocessing.process.BaseProcess | None = None
+
+    def __enter__(self) -> Self:
+        """Start serving."""
+        context = multiprocessing.get_context("spawn")
+        receiver, sender = context.Pipe(duplex=False)
+        self._process = context.Process(target=_serve, args=(self.files, self.faults, sender), daemon=True)
+        self._process.start()
+        self.url = f"http://127.0.0.1:{receiver.recv()}"
+        return self
+
+    def __exit__(
+        self, exc_type: type[BaseException] | None, exc: BaseException | None, traceback: TracebackType | None
+    ) -> None:
+        """Stop serving."""
+        if self._process is not None:
+            self._process.terminate()
+            self._process.join()
+
+    def stats(self) -> Counter:
+        """What the origin has served so far: `requests`, and a count per status ("200", "404", "timeout"...)."""
+        with urllib.request.urlopen(f"{self.url}{STATS_PATH}") as response:  # noqa: S310 Our own local origin
+            return Counter(json.loads(response.read()))
@@ -0,0 +1,56 @@
+"""Render a large synthetic inventory serially and across processes, and report the speed-up.
+
+    uv run python -m benchmarks.render --hosts 20000 --jobs 4
+
+Also checks the two renders produced the same objects, byte for byte, in the same order.
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import os
+import time
+
+from ansibleinventorycmdb.site import render_site
+
+from .synthetic import synthetic_config, synthetic_inventory
+
+
+def timed_render(inventories: dict, cmdb_config: dict, jobs: int) -> tuple[float, int, str]:
+    """Render the whole site. Returns (seconds, object count, a digest of every key and body in order)."""
+    digest = hashlib.sha256()
+    count = 0
+    start = time.perf_counter()
+    for key, body, _ in render_site(inventories, cmdb_config, "benchmark", jobs=jobs):
+        digest.update(key.encode())
+        digest.update(body)
+        count += 1
+    return time.perf_counter() - start, count, digest.hexdigest()
+
+
+def main() -> None:
+    """Run the benchmark and print the timings."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hosts", type=int, default=20000, help="hosts in the synthetic inventory")
+    parser.add_argument("--vars", type=int, default=20, help="extra vars per host")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="processes for the parallel render")
+    args = parser.parse_args()
+
+    inventories = {"synthetic": synthetic_inventory(args.hosts, vars_per_host=args.vars)}
+    cmdb_config = synthetic_config()
+
+    serial, count, serial_digest = timed_render(inventories, cmdb_config, jobs=1)
+    parallel, _, parallel_digest = timed_render(inventories, cmdb_config, jobs=args.jobs)
+
+    print(f"{args.hosts} hosts, {count} objects")  # noqa: T201
+    print(f"jobs=1:  {serial:.2f}s")  # noqa: T201
+    print(f"jobs={args.jobs}:  {parallel:.2f}s  ({serial / parallel:.2f}x)")  # noqa: T201
+    if parallel_digest != serial_digest:
+        msg = "Parallel render differs from the serial one"
+        raise SystemExit(msg)
+    print("Output identical")  # noqa: T201
+
+
+if __name__ == "__main__":
+    main()
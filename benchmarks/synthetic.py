@@ -0,0 +1,116 @@
+"""A synthetic inventory, shaped like AnsibleCMDB.inventories after a build, for benchmarks to render and serve.
+
+Deterministic for a given size, so two runs, or a serial and a parallel render, see the same data.
+"""
+
+from __future__ import annotations
+
+import ipaddress
+import random
+from collections import defaultdict
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from ansibleinventorycmdb.config import Inventory
+
+SCHEMA_MAPPING = {"ansible_host": "IP Address", "os_family": "OS", "role": "Role", "description": "Description"}
+
+_ROLES = ("web", "db", "cache", "queue", "worker", "proxy")
+_OS_FAMILIES = ("Debian", "RedHat", "Alpine")
+_FIRST_ADDRESS = ipaddress.ip_address("10.0.0.1")
+
+
+def synthetic_inventory(hosts: int, groups: int = 20, vars_per_host: int = 20, seed: int = 0) -> dict:
+    """One inventory of `hosts` hosts, each in `all`, a role group and one of `groups` other groups.
+
+    Every host has the schema_mapping vars plus `vars_per_host` more: scalars, a list and a nested dict, so the
+    YAML and JSON dumps have the kind of work a real inventory gives them.
+    """
+    rng = random.Random(seed)  # noqa: S311 Benchmark data, not crypto
+    group_names = [f"group{index:03d}" for index in range(groups)]
+
+    host_dict = {}
+    for index in range(hosts):
+        role = _ROLES[index % len(_ROLES)]
+        host_vars: dict = {
+            "ansible_host": str(_FIRST_ADDRESS + index),
+            "os_family": rng.choice(_OS_FAMILIES),
+            "role": role,
+            "description": f"{role} server {index}\nin rack {index // 40}",
+        }
+        for var in range(vars_per_host):
+            match var % 4:
+                case 0:
+                    host_vars[f"setting_{var}"] = rng.randint(0, 65535)
+                case 1:
+                    host_vars[f"setting_{var}"] = f"value-{rng.getrandbits(32):08x}"
+                case 2:
+                    host_vars[f"setting_{var}"] = [f"item{item}" for item in range(rng.randint(1, 5))]
+                case _:
+                    host_vars[f"setting_{var}"] = {"enabled": rng.random() < 0.5, "limit": rng.randint(1, 100)}  # noqa: PLR2004
+        host_dict[f"{role}{index:06d}.example.com"] = {
+            "groups": ["all", role, group_names[index % groups]],
+            "vars": host_vars,
+        }
+
+    group_dict = {"all": {"ntp_server": "ntp.example.com"}}
+    group_dict.update({role: {"role_owner": f"team-{role}"} for role in _ROLES})
+    group_dict.update({group: {"datacenter": group} for group in group_names})
+
+    return {
+        "url": "https://example.com/inventory.yml",
+        "base_url": "https://example.com/",
+        "hosts": host_dict,
+        "groups": group_dict,
+    }
+
+
+def synthetic_repo(  # noqa: PLR0913 The shape of the repo, each defaulted
+    hosts: int,
+    groups: int = 20,
+    vars_per_file: int = 20,
+    missing_vars: float = 0.0,
+    seed: int = 0,
+    *,
+    manifest: bool = False,
+) -> dict[str, bytes]:
+    """The files of an inventory repo with synthetic_inventory's hosts and groups, as {path: body}.
+
+    inventory/main.yml lists each group's hosts, with ansible_host inline under `all`. Every other host var is in
+    inventory/host_vars/<host>.yml and every group var in inventory/group_vars/<group>.yml, except that a
+    `missing_vars` fraction of hosts and groups have no vars file, and 404 as they would from a real repo. With
+    manifest, the repo also publishes a cmdb.VARS_MANIFEST listing the vars files there are.
+    """
+    import yaml  # noqa: PLC0415 Only the build benchmark needs the repo as files
+
+    inventory = synthetic_inventory(hosts, groups, vars_per_file, seed)
+    rng = random.Random(seed)  # noqa: S311 Benchmark data, not crypto
+    files = {}
+
+    members: dict[str, dict] = defaultdict(dict)
+    for host, host_data in inventory["hosts"].items():
+        host_vars = dict(host_data["vars"])
+        inline = {"ansible_host": host_vars.pop("ansible_host")}
+        for group in host_data["groups"]:
+            members[group][host] = inline if group == "all" else None
+        if rng.random() >= missing_vars:
+            files[f"inventory/host_vars/{host}.yml"] = yaml.safe_dump(host_vars, explicit_start=True).encode()
+
+    for group, group_vars in inventory["groups"].items():
+        if rng.random() >= missing_vars:
+            files[f"inventory/group_vars/{group}.yml"] = yaml.safe_dump(group_vars, explicit_start=True).encode()
+
+    main = {group: {"hosts": members[group]} for group in inventory["groups"]}
+    files["inventory/main.yml"] = yaml.safe_dump(main, explicit_start=True).encode()
+    if manifest:
+        from ansibleinventorycmdb.cmdb import VARS_MANIFEST  # noqa: PLC0415
+
+        files[VARS_MANIFEST] = "".join(f"{path}\n" for path in files if "_vars/" in path).encode()
+    return files
+
+
+def synthetic_config(name: str = "synthetic") -> dict[str, Inventory]:
+    """Config.cmdb for synthetic_inventory: its schema_mapping, under `name`."""
+    from ansibleinventorycmdb.config import Inventory  # noqa: PLC0415 Keeps pydantic out of the cold start benchmark
+
+    return {name: Inventory(inventory_url="https://example.com/inventory.yml", schema_mapping=SCHEMA_MAPPING)}
@@ -4,8 +4,9 @@
 #
 # `npm run dev` does two checks in one: pywrangler sync resolves [project.dependencies] against the Pyodide
 # index (a dependency with no wasm wheel fails here), then workerd boots the bundle, which runs entry.py's
-# module-level config parse and every import. 404 is the right answer to an untokened /refresh, so it means the
-# whole chain came up. Anything else, or nothing at all, is a failure.
+# module-level config load. 404 is the right answer to an untokened /refresh, so it means the whole chain came
+# up. Anything else, or nothing at all, is a failure. The build's own imports are deferred to its handler, which
+# an untokened request never reaches, so this doesn't exercise those.
 set -euo pipefail
 cd "$(dirname "${BASH_SOURCE[0]}")/.."
 
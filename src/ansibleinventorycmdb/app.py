@@ -4,15 +4,18 @@ from __future__ import annotations
 
 import asyncio
 import contextlib
+import os
 from typing import TYPE_CHECKING
 
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
 
 from .cmdb import AnsibleCMDB
-from .config import Config, get_instance_path, load_config
+from .config import Config, LoggingConfig, get_instance_path, load_config
 from .constants import PROGRAM_NAME_WITH_VERSION, PROGRAM_VERSION
-from .logger import LoggingConfig, get_logger, setup_logger
+from .logger import get_logger, setup_logger
+from .profiling import PROFILE_REQUESTS_ENV_VAR, request_sampler
+from .reload import watch_config
 from .routes import HTMLError, html_error_handler, refresh_cmdb, router
 from .site import STATIC_DIR
 
@@ -24,14 +27,18 @@ _logger = get_logger(__name__)
 
 @contextlib.asynccontextmanager
 async def lifespan(app: FastAPI) -> AsyncIterator[None]:
-    """Run the background refresh task for the life of the server."""
-    task = asyncio.create_task(refresh_cmdb(app.state.cmdb))
+    """Run the background refresh task, and the config file watch if there's a file, for the life of the server."""
+    tasks = [asyncio.create_task(refresh_cmdb(app.state.cmdb))]
+    if app.state.watch_config:
+        tasks.append(asyncio.create_task(watch_config(app)))
     try:
         yield
     finally:
-        task.cancel()
-        with contextlib.suppress(asyncio.CancelledError):
-            await task
+        for task in tasks:
+            task.cancel()
+        for task in tasks:
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
 
 
 def create_app(config: Config | None = None, instance_path: str | None = None) -> FastAPI:
@@ -39,6 +46,7 @@ def create_app(config: Config | None = None, instance_path: str | None = None) -
     instance_path = instance_path or get_instance_path()
 
     setup_logger(LoggingConfig())  # Setup logger with defaults so config loading gets logged
+    watch = config is None  # A config passed in, as the tests do, has no file to watch
     config = config or load_config(instance_path)
     setup_logger(config.logging)  # Setup logger with the real config
 
@@ -49,7 +57,13 @@ def create_app(config: Config | None = None, instance_path: str | None = None) -
 
     app.state.config = config
     app.state.instance_path = instance_path
-    app.state.cmdb = AnsibleCMDB(config.cmdb, instance_path)
+    app.state.watch_config = watch  # Reloaded from its file on change, see reload.py
+    app.state.cmdb = AnsibleCMDB(config.cmdb, instance_path, track_changes=True)
+
+    # Only installed when asked for, so requests pay nothing for it otherwise. See profiling.py.
+    if profile_rate := float(os.environ.get(PROFILE_REQUESTS_ENV_VAR) or 0):
+        _logger.warning("Profiling %s of requests into %s", profile_rate, instance_path)
+        app.middleware("http")(request_sampler(profile_rate, instance_path))
 
     app.mount("/static", StaticFiles(directory=STATIC_DIR), name="static")
     app.include_router(router)
@@ -0,0 +1,140 @@
+"""Sync the rendered site into an R2 bucket, uploading only what changed.
+
+The Worker used to PUT every object on every run, which spent most of a run's wall time, and its R2 operation
+budget, uploading bytes the bucket already had. Instead a manifest of every object's hash is kept in the bucket
+itself, at MANIFEST_NAME, and a run compares against it: changed and new objects are uploaded, unchanged ones
+skipped, and objects the run no longer produces are deleted.
+
+The hash covers an object's Content-Type and Content-Encoding as well as its body, since those are stored with it
+and a change to either needs a new PUT just as much.
+
+The manifest is written last, and on every run, so its upload time is when the last run finished (see the
+Worker's /status). A run that fails partway leaves the old manifest in place, and that no longer describes the
+bucket: an object it uploaded before failing may since have gone back to the content the old manifest lists, and
+would be skipped as unchanged while the bucket kept the failed run's copy. So every run puts INCOMPLETE_NAME in
+the bucket before it uploads anything, and deletes it after writing the manifest. A run that finds it there
+ignores the manifest and uploads everything, once.
+
+Only what a manifest lists is ever deleted as stale, so a run with no manifest to go on (the first into a bucket,
+including one published to before there were manifests, or one after a failed run) lists the bucket instead, once,
+and deletes whatever is in it that the run didn't produce. Keys starting with a dot are left alone: they're this
+module's own, and the Worker's metrics, never pages. Everything else in the bucket is taken to be the site's, so
+don't share one (or an S3 prefix) with anything else.
+
+The bucket is anything with R2's binding methods (`get`, `put`, `delete` and `list`): the Worker's binding,
+s3.S3Bucket for any S3-compatible endpoint, or the stand-in the tests use. Uploads run concurrently, see
+publish.publish.
+"""
+
+from __future__ import annotations
+
+import json
+from typing import TYPE_CHECKING, Any
+
+from .logger import get_logger
+from .manifest import MANIFEST_NAME, content_hash, dump_manifest
+from .publish import Sink, join_body
+
+if TYPE_CHECKING:
+    from .publish import Body
+
+logger = get_logger(__name__)
+
+# R2 deletes up to this many keys in one call.
+DELETE_BATCH = 1000
+# In the bucket while a run is syncing into it, see the module docstring. Not in the manifest, so never stale.
+INCOMPLETE_NAME = ".manifest.incomplete"
+
+
+def object_hash(body: bytes, content_type: str, content_encoding: str) -> str:
+    """The hash an object is recorded under: its body and the metadata stored with it."""
+    return content_hash(b"\0".join((content_type.encode(), content_encoding.encode(), body)))
+
+
+async def read_bucket_manifest(bucket: Any) -> dict[str, str]:  # noqa: ANN401 A JS binding, or a stand-in for one
+    """The manifest the last run left in the bucket. {} if there isn't one, which makes this run upload everything."""
+    manifest_object = await bucket.get(MANIFEST_NAME)
+    if manifest_object is None:
+        return {}
+    try:
+        return json.loads(await manifest_object.text())
+    except ValueError:
+        logger.warning("Unreadable %s in the bucket, uploading everything", MANIFEST_NAME)
+        return {}
+
+
+async def list_bucket(bucket: Any) -> set[str]:  # noqa: ANN401 A JS binding, or a stand-in for one
+    """Every key in the bucket but the dotted ones, a page of R2's list() at a time."""
+    keys: set[str] = set()
+    listing = await bucket.list()
+    while True:
+        keys.update(item.key for item in listing.objects if not item.key.startswith("."))
+        if not listing.truncated:
+            return keys
+        listing = await bucket.list(cursor=listing.cursor)
+
+
+class BucketSink(Sink):
+    """An R2 bucket binding, or anything shaped like one such as s3.S3Bucket, synced against its manifest."""
+
+    content_encoded = True  # Stored gzipped, with Content-Encoding set, so the bucket serves them as they are
+
+    def __init__(self, bucket: Any) -> None:  # noqa: ANN401 A JS binding, or a stand-in for one
+        """Sync into bucket, which needs R2's get, put, delete and list."""
+        self.bucket = bucket
+        self.previous: dict[str, str] = {}
+        self.manifest: dict[str, str] = {}
+        self.counts = {"uploaded": 0, "unchanged": 0, "deleted": 0}
+
+    async def open(self) -> None:
+        """Read the last run's manifest, unless it didn't finish, and mark this one as under way.
+
+        Without one, every key already in the bucket is taken as stale unless this run produces it, with no hash,
+        so that it's uploaded again. See the module docstring.
+        """
+        if await self.bucket.get(INCOMPLETE_NAME) is not None:
+            logger.warning("The last sync didn't finish, so %s can't be trusted: uploading everything", MANIFEST_NAME)
+        else:
+            self.previous = await read_bucket_manifest(self.bucket)
+        if not self.previous:
+            self.previous = dict.fromkeys(await list_bucket(self.bucket), "")
+            if self.previous:
+                logger.info("No %s to go on: %s objects already in the bucket", MANIFEST_NAME, len(self.previous))
+        await self.bucket.put(INCOMPLETE_NAME, b"", httpMetadata={"contentType": "text/plain"})
+
+    async def put(self, key: str, body: Body, content_type: str, content_encoding: str) -> None:
+        """Upload one object, unless the manifest says the bucket already has it."""
+        data = join_body(body)
+        digest = object_hash(data, content_type, content_encoding)
+        self.manifest[key] = digest
+        if self.previous.get(key) == digest:
+            self.counts["unchanged"] += 1
+            return
+
+        metadata = {"contentType": content_type}
+        if content_encoding:
+            metadata["contentEncoding"] = content_encoding
+        await self.bucket.put(key, data, httpMetadata=metadata)
+        self.counts["uploaded"] += 1
+
+    async def close(self) -> dict[str, int]:
+        """Delete what this run didn't produce, then write the manifest."""
+        try:
+            stale = sorted(self.previous.keys() - self.manifest.keys())
+            for start in range(0, len(stale), DELETE_BATCH):
+                await self.bucket.delete(stale[start : start + DELETE_BATCH])
+            self.counts["deleted"] = len(stale)
+
+            await self.bucket.put(
+                MANIFEST_NAME, dump_manifest(self.manifest), httpMetadata={"contentType": "application/json"}
+            )
+            await self.bucket.delete(INCOMPLETE_NAME)
+        finally:
+            await self.abort()
+        return self.counts
+
+    async def abort(self) -> None:
+        """Close the bucket's own HTTP client, as s3.S3Bucket has. A binding has none. The marker stays, see open()."""
+        aclose = getattr(self.bucket, "aclose", None)
+        if aclose is not None:
+            await aclose()
@@ -0,0 +1,81 @@
+"""Prepare the Worker's bundle ahead of time: validate the config and precompile the templates.
+
+A Worker pays for everything it does on a cold start, and two things dominated that: validating config.yml with
+pydantic, whose import alone is most of the startup, and compiling the Jinja2 templates from source on the first
+render. Neither depends on anything only known at runtime, so `npm run dev` and `npm run deploy` run this first:
+
+- config.yml is validated here and written out as config.json, plain data the Worker reads with json and
+  load_bundled_config. A config error fails the deploy instead of the first cron run.
+- The templates are compiled to Python modules under site.COMPILED_TEMPLATES_DIR, which site.py loads through a
+  jinja2.ModuleLoader rather than parsing the sources. The set is keyed by site.template_key(), so one compiled
+  from stale sources, or by a different Jinja2 than the one rendering, is ignored rather than used.
+
+Importing this module is cheap on purpose, since the Worker imports it for load_bundled_config: everything only
+the bundle step needs is imported inside main().
+
+    python -m ansibleinventorycmdb.bundle [--config src/config.yml] [--out src/config.json]
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import shutil
+from pathlib import Path
+from types import SimpleNamespace
+
+from .logger import get_logger
+
+logger = get_logger(__name__)
+
+# entry.py's directory, where the Worker reads its config from.
+WORKER_DIR = Path(__file__).parent.parent
+
+
+def load_bundled_config(path: Path) -> SimpleNamespace:
+    """Read a config.json written by main(), already validated, as attributes shaped like config.Config.
+
+    `.cmdb[name].inventory_url`, `.cmdb[name].schema_mapping` and `.logging.level` read just as they do on the
+    pydantic models, which is all the Worker and the modules it uses ask of a config.
+    """
+    data = json.loads(path.read_text())
+    return SimpleNamespace(
+        cmdb={name: SimpleNamespace(**inventory) for name, inventory in data["cmdb"].items()},
+        logging=SimpleNamespace(**data["logging"]),
+    )
+
+
+def compile_templates(target_dir: Path) -> Path:
+    """Compile every template into target_dir/<template key>, replacing any sets there. Returns the new set's path."""
+    from jinja2 import Environment, FileSystemLoader  # noqa: PLC0415 Only the bundle step compiles
+
+    from .site import TEMPLATES_DIR, template_key  # noqa: PLC0415
+
+    shutil.rmtree(target_dir, ignore_errors=True)
+    compiled = target_dir / template_key()
+    env = Environment(loader=FileSystemLoader(TEMPLATES_DIR), autoescape=True)  # As site._environment has it
+    env.compile_templates(compiled, zip=None, ignore_errors=False)
+    return compiled
+
+
+def main() -> None:
+    """Validate the config into config.json and precompile the templates, for `npm run bundle`."""
+    import yaml  # noqa: PLC0415 Only the bundle step reads the YAML
+
+    from .config import Config  # noqa: PLC0415 Pulls in pydantic, which the Worker never needs to
+    from .site import COMPILED_TEMPLATES_DIR  # noqa: PLC0415
+
+    parser = argparse.ArgumentParser(description="Prepare the Worker's bundle.")
+    parser.add_argument("--config", type=Path, default=WORKER_DIR / "config.yml", help="config to validate")
+    parser.add_argument("--out", type=Path, default=WORKER_DIR / "config.json", help="where to write it as JSON")
+    args = parser.parse_args()
+
+    config = Config(**(yaml.safe_load(args.config.read_text()) or {}))
+    args.out.write_text(json.dumps(config.model_dump(mode="json"), indent=2) + "\n")
+    compiled = compile_templates(COMPILED_TEMPLATES_DIR)
+
+    print(f"Wrote {args.out} and {compiled}")  # noqa: T201 Output for the npm script
+
+
+if __name__ == "__main__":
+    main()
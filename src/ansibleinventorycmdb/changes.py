@@ -0,0 +1,186 @@
+"""The change feed: which hosts and groups each build added, removed or changed, for consumers to sync deltas.
+
+Without it a consumer can't tell what a build changed, so it downloads the whole inventory every time. Instead, every
+build hashes each host (its groups and vars) and each group (its vars), and diffs the hashes against the last
+build's. Hashes are of canonical JSON, keys sorted, so only a real change to the data changes one. Each
+inventory also gets a Merkle-style digest, one hash over every host's and group's, which changes if and only if
+anything in the inventory did.
+
+The diffs are kept for the last KEEP_CHANGES builds that changed something, per inventory, and
+`/inventory/{name}/changes?since=<generation>` folds the ones after `since` into one list of added, removed and
+changed names. A consumer passes the generation of the last answer it got as the next since. One older than the
+feed goes back, or from another process (generations restart with the process, so pass `epoch` back too), is
+answered with `reset`: fetch the whole inventory again.
+
+Answers are cached per generation, keyed on how many diffs they fold rather than on `since`, so there are at most
+KEEP_CHANGES + 2 of them per inventory. A poller that's up to date gets the same small answer every time, or a 304
+for its ETag.
+
+Recorded in a thread at the end of a build, while routes read it from others, so state is replaced, never changed
+in place. It's recorded just before the build's generation starts, so for a moment the log is a generation ahead
+of what the routes are serving. Every read is bounded by the generation it's asked about, so in that moment it
+answers as of the generation before, the last build's hashes kept alongside for that, and a poll never gets a
+diff under a generation it isn't part of.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import time
+
+from .logger import get_logger
+
+logger = get_logger(__name__)
+
+KEEP_CHANGES = 32  # Builds that changed something, per inventory
+KINDS = ("hosts", "groups")
+
+
+def content_hash(value: object) -> bytes:
+    """A hash of value's content, the same for equal data however its dicts are ordered."""
+    canonical = json.dumps(value, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode()).digest()[:16]  # Half a sha256 is plenty to spot a change
+
+
+def inventory_hashes(inventory_dict: dict) -> dict[str, dict[str, bytes]]:
+    """Every host's and group's content hash, by kind and name."""
+    return {
+        "hosts": {host: content_hash(host_data) for host, host_data in inventory_dict.get("hosts", {}).items()},
+        "groups": {group: content_hash(group_vars) for group, group_vars in inventory_dict.get("groups", {}).items()},
+    }
+
+
+def inventory_digest(hashes: dict[str, dict[str, bytes]]) -> str:
+    """One hash over every host's and group's, as hex."""
+    digest = hashlib.sha256()
+    for kind in KINDS:
+        for name in sorted(hashes[kind]):
+            digest.update(f"{kind}\0{name}\0".encode() + hashes[kind][name])
+    return digest.hexdigest()
+
+
+def _diff(before: dict[str, bytes], after: dict[str, bytes]) -> dict[str, str]:
+    """What happened to each name between two builds' hashes: added, removed or changed. Unchanged ones are left out."""
+    diff = dict.fromkeys(before.keys() - after.keys(), "removed")
+    for name, digest in after.items():
+        if name not in before:
+            diff[name] = "added"
+        elif before[name] != digest:
+            diff[name] = "changed"
+    return diff
+
+
+def changed(answer: dict) -> bool:
+    """Whether a ChangeLog.changes() answer has anything in it. A reset counts, since there's no telling."""
+    return answer["reset"] or any(names for kind in KINDS for names in answer[kind].values())
+
+
+class ChangeLog:
+    """Recent builds' diffs, per inventory, see the module docstring."""
+
+    def __init__(self, keep: int = KEEP_CHANGES) -> None:
+        """A log keeping the last `keep` diffs of each inventory."""
+        self.keep = keep
+        # Tells this process's generations from another's. Seconds are enough: only a restart changes it.
+        self.epoch = str(int(time.time()))
+        # By inventory: {"hashes", "digest", "floor", "entries", "recorded", "before"}. entries is a tuple of
+        # {"generation", "hosts": {name: event}, "groups": {name: event}}, oldest first. floor is the oldest
+        # generation a since can be answered from. recorded is the generation hashes and digest are of, and before
+        # the (hashes, digest) of the one before it, None for the first.
+        self._feeds: dict[str, dict] = {}
+
+    def record(self, generation: int, inventories: dict[str, dict]) -> None:
+        """Hash the inventories a build just built, and keep their diffs against the last build as `generation`."""
+        for name, inventory_dict in inventories.items():
+            hashes = inventory_hashes(inventory_dict)
+            feed = self._feeds.get(name)
+            if feed is None:  # The first build: nothing to diff against, only answerable from here on
+                self._feeds[name] = {
+                    "hashes": hashes,
+                    "digest": inventory_digest(hashes),
+                    "floor": generation,
+                    "entries": (),
+                    "recorded": generation,
+                    "before": None,
+                }
+                continue
+
+            entry = {"generation": generation, **{kind: _diff(feed["hashes"][kind], hashes[kind]) for kind in KINDS}}
+            entries, floor, digest = feed["entries"], feed["floor"], feed["digest"]
+            if any(entry[kind] for kind in KINDS):
+                digest = inventory_digest(hashes)
+                entries = (*entries, entry)
+                if len(entries) > self.keep:
+                    floor = entries[0]["generation"]  # Only a since from here on is still covered
+                    entries = entries[1:]
+                logger.info(
+                    "Inventory %s changed in generation %s: %s hosts, %s groups",
+                    name,
+                    generation,
+                    len(entry["hosts"]),
+                    len(entry["groups"]),
+                )
+            self._feeds[name] = {
+                "hashes": hashes,
+                "digest": digest,
+                "floor": floor,
+                "entries": entries,
+                "recorded": generation,
+                "before": (feed["hashes"], feed["digest"]),
+            }
+
+    def forget(self, name: str) -> None:
+        """Drop an inventory removed from the config."""
+        self._feeds.pop(name, None)
+
+    def span(self, name: str, since: int, generation: int, epoch: str = "") -> int | None:
+        """How many diffs an answer for since folds, None for a reset. Answers with the same span are the same.
+
+        A since from another epoch, or past the current generation, is another process's, so it's a reset too.
+        """
+        return self._span(_as_of(self._feeds.get(name), generation), since, generation, epoch)
+
+    def _span(self, feed: dict | None, since: int, generation: int, epoch: str) -> int | None:
+        """span(), for a feed already looked up, so an answer folds the entries it was keyed on."""
+        if feed is None or (epoch and epoch != self.epoch) or not feed["floor"] <= since <= generation:
+            return None
+        return sum(1 for entry in feed["entries"] if entry["generation"] > since)
+
+    def changes(self, name: str, since: int, generation: int, epoch: str = "") -> dict:
+        """What changed in an inventory after generation since, up to generation, the current one."""
+        # since itself isn't in the answer, only what it spans: the asker knows it, and this way it's the same answer
+        # for every since with the same span.
+        answer = {"inventory": name, "epoch": self.epoch, "generation": generation}
+        feed = _as_of(self._feeds.get(name), generation)
+        span = self._span(feed, since, generation, epoch)
+        if span is None or feed is None:
+            return {**answer, "reset": True, "digest": feed["digest"] if feed else None}
+
+        answer |= {"reset": False, "digest": feed["digest"]}
+        entries = feed["entries"][len(feed["entries"]) - span :]
+        for kind in KINDS:
+            first: dict[str, str] = {}  # What first happened to each name since then
+            for entry in entries:
+                for item, event in entry[kind].items():
+                    first.setdefault(item, event)
+            current = feed["hashes"][kind]
+            # Only where it started and where it is matter: added then changed is added, removed then re-added is
+            # changed, added then removed never happened.
+            answer[kind] = {
+                "added": sorted(item for item, event in first.items() if event == "added" and item in current),
+                "removed": sorted(item for item, event in first.items() if event != "added" and item not in current),
+                "changed": sorted(item for item, event in first.items() if event != "added" and item in current),
+            }
+        return answer
+
+
+def _as_of(feed: dict | None, generation: int) -> dict | None:
+    """A feed as it was at generation: without a build recorded after it, see the module docstring."""
+    if feed is None or feed["recorded"] <= generation:
+        return feed
+    if feed["before"] is None:  # Only built the once, and that's not served yet
+        return None
+    hashes, digest = feed["before"]
+    entries = tuple(entry for entry in feed["entries"] if entry["generation"] <= generation)
+    return {**feed, "hashes": hashes, "digest": digest, "entries": entries}
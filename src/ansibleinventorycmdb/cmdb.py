@@ -4,20 +4,28 @@ from __future__ import annotations
 
 import asyncio
 import contextlib
+import hashlib
 import io
+import json
 import os
-import pickle
 import re
+import time
 import zipfile
 from datetime import UTC, datetime
-from typing import TYPE_CHECKING
+from http import HTTPStatus
+from typing import TYPE_CHECKING, TypeVar
 
 import yaml
 
+from . import metrics, profiling
+from .changes import ChangeLog
 from .logger import get_logger
+from .urlcache import CACHE_DIR, UrlCache, max_bytes_from_env
 
 if TYPE_CHECKING:
-    from collections.abc import AsyncIterator, Awaitable, Callable
+    from collections.abc import AsyncIterator, Awaitable, Callable, Hashable
+
+    import httpx
 
     from .config import Inventory
 
@@ -27,12 +35,67 @@ if TYPE_CHECKING:
 
 logger = get_logger(__name__)
 
+T = TypeVar("T")
+
 REQUEST_TIMEOUT_SECONDS = 5
 CONCURRENT_REQUEST_LIMIT = 10  # Be polite to whatever is hosting the inventory
+# Response validators, and the request headers that send them back, for a Revalidator.
+CONDITIONAL_HEADERS = {"etag": "If-None-Match", "last-modified": "If-Modified-Since"}
 
 # owner/repo, branch and path of a raw.githubusercontent.com URL. A branch containing "/" won't match, and falls
 # back to being fetched a file at a time — the branch and the path would be ambiguous.
 GITHUB_RAW_URL = re.compile(r"https://raw\.githubusercontent\.com/([^/]+/[^/]+)/refs/heads/([^/]+)/(.+)")
+# The same, for an inventory's base URL: owner/repo, branch, and the directory in the repo, if not its root. As
+# ambiguous, so a listing is only believed if the inventory is in it, see _list_vars_files().
+GITHUB_RAW_BASE_URL = re.compile(r"https://raw\.githubusercontent\.com/([^/]+/[^/]+)/refs/heads/([^/]+)(?:/(.+))?")
+# A repo's file listing, from GitHub's git trees API. github_zip_fetcher answers it out of the zip.
+GITHUB_TREE_URL = re.compile(r"https://api\.github\.com/repos/([^/]+/[^/]+)/git/trees/([^/?]+)\?recursive=1")
+
+# Published beside an inventory not on GitHub, to list the vars files that exist. Paths relative to the base URL,
+# one per line, say from `find host_vars group_vars inventory/host_vars inventory/group_vars -name '*.yml'`.
+VARS_MANIFEST = "vars_files.txt"
+# What a path in one has to look like, for at least one of them, for the VARS_MANIFEST to be believed.
+VARS_DIRECTORY = re.compile(r"(?:^|/)(?:host|group)_vars/")
+
+# How far an inventory's build has got, see AnsibleCMDB.phase(). The pages serve an inventory from its skeleton on;
+# the JSON, exports and queries wait until it's ready, since their clients can't tell a var that hasn't loaded yet
+# from one that isn't set.
+PHASE_PENDING = "pending"  # Nothing fetched yet
+PHASE_SKELETON = "skeleton"  # Hosts, their groups and inline vars, from the inventory file alone
+PHASE_READY = "ready"  # Host and group vars files merged in too
+
+
+class NotCachedError(LookupError):
+    """An offline build, see AnsibleCMDB.build(), needed a file that isn't in the URL cache."""
+
+
+async def _offline_fetch_text(url: str) -> str | None:
+    """The fetcher for an offline build, asked for whatever the URL cache doesn't have: there's nowhere else to look."""
+    msg = f"Not in the URL cache: {url}. Build online first, and again after adding an inventory or changing its URL"
+    raise NotCachedError(msg)
+
+
+class OriginError(ConnectionError):
+    """The origin answered, but with a server error or a rate limit, so it can't say whether the file is there."""
+
+
+async def _get(client: httpx.AsyncClient, url: str, headers: dict[str, str] | None = None) -> httpx.Response:
+    """GET url, recording the fetch in the metrics. Raises OriginError for a response that isn't an answer.
+
+    That's a 5xx, or a rate limit: a 429, or the 403 GitHub's API answers with once none of the limit is left.
+    """
+    started = time.perf_counter()
+    try:
+        response = await client.get(url, headers=headers)
+    except Exception:
+        metrics.record_fetch(url, None, 0, started)
+        raise
+    metrics.record_fetch(url, response.status_code, len(response.content), started)
+    rate_limited = response.status_code == HTTPStatus.FORBIDDEN and response.headers.get("x-ratelimit-remaining") == "0"
+    if response.is_server_error or response.status_code == HTTPStatus.TOO_MANY_REQUESTS or rate_limited:
+        msg = f"{url} answered {response.status_code}"
+        raise OriginError(msg)
+    return response
 
 
 @contextlib.asynccontextmanager
@@ -42,26 +105,88 @@ async def httpx_fetcher() -> AsyncIterator[FetchText]:
     httpx is imported here rather than at module level so that importing this module doesn't require it. The
     Cloudflare Worker doesn't use this path — it passes the Workers runtime's own fetch instead, see build().
 
-    follow_redirects is not httpx's default and the raw-file hosts an inventory lives on do redirect. A non-2xx
+    follow_redirects is not httpx's default and the raw-file hosts an inventory lives on do redirect. A 4xx
     response must come back as None rather than raise, so don't add raise_for_status(): a host or group with no vars
-    file 404s on every build, and that's the normal case, not an error.
+    file 404s on every build, and that's the normal case, not an error. A 5xx or a rate limit raises, see _get(): the
+    file may well be there, and taking it for missing would drop whatever it holds from the build.
     """
     import httpx  # noqa: PLC0415 Deferred on purpose, see the docstring
 
     async with httpx.AsyncClient(timeout=REQUEST_TIMEOUT_SECONDS, follow_redirects=True) as client:
 
         async def fetch_text(url: str) -> str | None:
-            response = await client.get(url)
+            response = await _get(client, url)
             return response.text if response.is_success else None
 
         yield fetch_text
 
 
-async def _open_repo_zip(repo: str, branch: str, fetch_bytes: FetchBytes) -> Callable[[str], str | None] | None:
-    """Fetch a GitHub repo as a zip, as a `path in the repo -> file contents` reader. None if it couldn't be read.
+class Revalidator:
+    """A fetcher kept across builds, that can ask whether a file changed since it last fetched it."""
+
+    def __init__(self, client: httpx.AsyncClient) -> None:
+        """A fetcher over client, which it doesn't close."""
+        self._client = client
+        # url: (conditional request headers, hash of the body or None for no file). No bodies: those are in the URL
+        # cache, bounded, and this would otherwise hold a second copy of every file for as long as it's kept.
+        self._seen: dict[str, tuple[dict[str, str], str | None]] = {}
+        self._fresh: dict[str, str | None] = {}  # Bodies changed() got, until the build that follows asks for them
+
+    async def __call__(self, url: str) -> str | None:
+        """Fetch url, as httpx_fetcher's fetcher does."""
+        if url in self._fresh:
+            return self._fresh.pop(url)
+        return self._remember(url, await _get(self._client, url))
+
+    async def changed(self, url: str) -> bool:
+        """Whether url's file changed since this fetcher last fetched it, or it never has. Raises as a fetch does.
+
+        Asked conditionally where the origin gave an ETag or Last-Modified, so an unchanged file is a 304 and no
+        transfer. Otherwise the body is hashed, and compared. A changed body is held for the next call for url, so
+        the rebuild that follows doesn't fetch it twice.
+        """
+        conditional, digest = self._seen.get(url, ({}, None))
+        response = await _get(self._client, url, conditional)
+        if response.status_code == HTTPStatus.NOT_MODIFIED and conditional:
+            return False
+
+        seen = url in self._seen
+        body = self._remember(url, response)
+        if seen and self._seen[url][1] == digest:
+            return False
+        self._fresh[url] = body
+        return True
+
+    def _remember(self, url: str, response: httpx.Response) -> str | None:
+        """Keep what changed() needs to ask about a response's URL again, and return its body, as a fetch does."""
+        validators = {
+            request_header: response.headers[response_header]
+            for response_header, request_header in CONDITIONAL_HEADERS.items()
+            if response_header in response.headers
+        }
+        if not response.is_success:
+            self._seen[url] = (validators, None)
+            return None
+        self._seen[url] = (validators, hashlib.sha256(response.content).hexdigest())
+        return response.text
+
+
+@contextlib.asynccontextmanager
+async def revalidating_fetcher() -> AsyncIterator[Revalidator]:
+    """A Revalidator over its own httpx client, for AnsibleCMDB.revalidate(). See httpx_fetcher for the client."""
+    import httpx  # noqa: PLC0415 Deferred, as in httpx_fetcher
+
+    async with httpx.AsyncClient(timeout=REQUEST_TIMEOUT_SECONDS, follow_redirects=True) as client:
+        yield Revalidator(client)
 
-    Files are read out of the archive on demand rather than up front, since a repo holds far more yaml than one
-    build looks at.
+
+async def _open_repo_zip(
+    repo: str, branch: str, fetch_bytes: FetchBytes
+) -> tuple[Callable[[str], str | None], list[str]] | None:
+    """Fetch a GitHub repo as a zip. None if it couldn't be read.
+
+    Returns a `path in the repo -> file contents` reader, and the paths of every file in the repo. Files are read out
+    of the archive on demand rather than up front, since a repo holds far more yaml than one build looks at.
     """
     url = f"https://codeload.github.com/{repo}/zip/refs/heads/{branch}"
     logger.info("Fetching repo archive: %s", url)
@@ -86,7 +211,13 @@ async def _open_repo_zip(repo: str, branch: str, fetch_bytes: FetchBytes) -> Cal
         except KeyError:  # No such file in the repo, same as the 404 a per-file fetch would have got
             return None
 
-    return read
+    paths = [name.split("/", 1)[1] for name in archive.namelist() if "/" in name and not name.endswith("/")]
+    return read, paths
+
+
+def _tree_listing(paths: list[str]) -> str:
+    """A repo's paths as the git trees API lists them, with only the fields _list_vars_files reads."""
+    return json.dumps({"tree": [{"path": path, "type": "blob"} for path in paths], "truncated": False})
 
 
 def github_zip_fetcher(fetch_bytes: FetchBytes) -> FetchText:
@@ -98,119 +229,369 @@ def github_zip_fetcher(fetch_bytes: FetchBytes) -> FetchText:
     R2 puts) come out of a separate 1000 budget, so they are not the problem here.
 
     Anything that isn't a GitHub raw URL, and anything from a repo whose zip couldn't be read, is fetched
-    normally. A path that isn't in the zip returns None, which is what a missing vars file already looks like.
+    normally. A path that isn't in the zip returns None, which is what a missing vars file already looks like. The
+    repo's listing from the git trees API, which AnsibleCMDB asks for to skip probing vars files that don't exist,
+    comes out of the zip too, so it costs nothing either.
     """
-    readers: dict[str, Callable[[str], str | None] | None] = {}
+    repos: dict[str, tuple[Callable[[str], str | None], list[str]] | None] = {}
+
+    async def open_repo(repo: str, branch: str) -> tuple[Callable[[str], str | None], list[str]] | None:
+        key = f"{repo}/{branch}"
+        if key not in repos:  # Cached even when it's None, so a broken zip isn't re-fetched per file
+            repos[key] = await _open_repo_zip(repo, branch, fetch_bytes)
+        return repos[key]
 
     async def fetch_url(url: str) -> str | None:
         body = await fetch_bytes(url)
         return body.decode() if body is not None else None
 
     async def fetch_text(url: str) -> str | None:
+        if tree := GITHUB_TREE_URL.fullmatch(url):
+            opened = await open_repo(*tree.groups())
+            return _tree_listing(opened[1]) if opened else await fetch_url(url)
+
         match = GITHUB_RAW_URL.fullmatch(url)
         if not match:
             return await fetch_url(url)
 
         repo, branch, path = match.groups()
-        key = f"{repo}/{branch}"
-        if key not in readers:  # Cached even when it's None, so a broken zip isn't re-fetched per file
-            readers[key] = await _open_repo_zip(repo, branch, fetch_bytes)
-
-        reader = readers[key]
-        return reader(path) if reader else await fetch_url(url)
+        opened = await open_repo(repo, branch)
+        return opened[0](path) if opened else await fetch_url(url)
 
     return fetch_text
 
 
+def _unbuilt(inventory: Inventory) -> dict:
+    """An inventory's entry in AnsibleCMDB.inventories, before a build adds its hosts and groups."""
+    return {"url": inventory.inventory_url, "base_url": re.sub(r"/inventory.*", "", inventory.inventory_url)}
+
+
 class AnsibleCMDB:
     """Ansible CMDB object."""
 
-    def __init__(self, inventories: dict[str, Inventory], instance_path: str | None = None) -> None:
+    def __init__(
+        self, inventories: dict[str, Inventory], instance_path: str | None = None, *, track_changes: bool = False
+    ) -> None:
         """Initialise the Ansible CMDB object.
 
         Args:
             inventories: The inventories to build, from Config.cmdb.
             instance_path: Where to keep the URL cache and the CMDB dump. None disables both, for environments
                 with no writable filesystem, such as a Cloudflare Worker.
+            track_changes: Keep a change feed of what each build changed, see changes.py. For the web app, which
+                serves it; a one-off render has no earlier build to diff against.
         """
         self._instance_path = instance_path
         self._dump_file = os.path.join(instance_path, "cmdb_dump.yml") if instance_path else ""
-        self._cache_file = os.path.join(instance_path, "url_cache.pkl") if instance_path else ""
         self.inventories: dict[str, dict] = {}
-        self.url_cache: dict = {}
+        self.phases: dict[str, str] = {}  # By inventory name, see phase()
+        self.url_cache = UrlCache(
+            os.path.join(instance_path, CACHE_DIR) if instance_path else None, max_bytes_from_env()
+        )
         self.ready = False
         self.refresh_required = False
         self.built_at = ""  # Set by build(), see there for why it isn't a module-level constant
+        self.generation = 0  # Bumped by every build, so anything derived from the inventories knows when it's stale
+        self._derived: dict = {}  # See cached()
+        self.changes = ChangeLog() if track_changes else None
+        self._vars_files: dict[str, frozenset[str] | None] = {}  # By base URL, see _list_vars_files()
+        self._failed_urls: set[str] = set()  # Those the last build couldn't fetch, see _get_yaml()
+        self._asked: set[str] = set()  # Every URL the last full build asked for, see revalidate()
         # Recreated per build, since an asyncio primitive binds to the loop that first awaits it.
         self._request_limit = asyncio.Semaphore(CONCURRENT_REQUEST_LIMIT)
+        # Held by whatever is building, so the refresh task and a config reload take turns. Not recreated: a lock
+        # only binds to a loop once contended, and builds from different loops (the tests' asyncio.run) never are.
+        self._building = asyncio.Lock()
 
         for inventory_name, inventory in inventories.items():
-            self.inventories[inventory_name] = {
-                "url": inventory.inventory_url,
-                "base_url": re.sub(r"/inventory.*", "", inventory.inventory_url),
-            }
-
-        self._load_url_cache()
+            self.inventories[inventory_name] = _unbuilt(inventory)
+            self.phases[inventory_name] = PHASE_PENDING
 
-    def _load_url_cache(self) -> None:
-        """Setup the URL cache."""
-        if self._instance_path and os.path.isfile(self._cache_file):
-            with open(self._cache_file, "rb") as cache_file:
-                logger.info(f"Loaded URL cache file: {self._cache_file}")
-                self.url_cache = pickle.load(cache_file)
-                self.refresh_required = True
+        if self.url_cache.on_disk():
+            # Built from what an earlier process fetched, so the first build is quick but may be stale
+            logger.info("Found a URL cache on disk in: %s", instance_path)
+            self.refresh_required = True
 
     def _write_output(self) -> None:
-        """Write the URL cache and the CMDB dump to disk.
-
-        Called once per build. Fetches run concurrently, so a per-fetch cache write would race itself.
-        """
-        with open(self._cache_file, "wb") as cache_file:
-            pickle.dump(self.url_cache, cache_file, pickle.HIGHEST_PROTOCOL)
-
+        """Write the CMDB dump to disk. The URL cache writes its own, as it goes."""
         with open(self._dump_file, "w") as dump_file:
             yaml.dump(self.inventories, dump_file, explicit_start=True)
 
     async def refresh(self, fetch_text: FetchText | None = None) -> None:
         """Refresh the CMDB data. See build() for fetch_text."""
         logger.info("Refreshing CMDB")
-        self.url_cache = {}
-        await self.build(fetch_text)
+        async with self._building:
+            # Fetched into a new snapshot, so the last one is still there for --offline if this build doesn't finish
+            await self.url_cache.begin_snapshot()
+            try:
+                await self._profiled_build(fetch_text, self.inventories)
+            except BaseException:
+                await self.url_cache.abandon_snapshot()
+                raise
+            await self.url_cache.commit_snapshot(keep=self._failed_urls)
         logger.info("CMDB refresh complete")
         self.refresh_required = False
 
-    async def build(self, fetch_text: FetchText | None = None) -> None:
+    async def revalidate(self, fetcher: Revalidator) -> bool:
+        """Rebuild if any file the last build asked for changed at its origin. Returns whether there was a rebuild.
+
+        For keeping a CMDB current by polling, as site.watch() does. Each file is asked about conditionally, see
+        Revalidator.changed(), so while nothing changes nothing is parsed or built, and the URL cache is left as it
+        is. Only the changed files are dropped from it, for the rebuild to fetch again. A file the origin couldn't
+        answer for is taken as unchanged, keeping the copy the last build used.
+        """
+        async with self._building:
+            urls = sorted(self._asked)
+
+            async def changed(url: str) -> bool:
+                try:
+                    async with self._request_limit:
+                        return await fetcher.changed(url)
+                except Exception as e:  # noqa: BLE001 The origin failing is no reason to drop what was built
+                    logger.warning("Could not revalidate %s, keeping what was built from it: %s", url, e)
+                    return False
+
+            changed_urls = [
+                url
+                for url, is_changed in zip(urls, await asyncio.gather(*map(changed, urls)), strict=True)
+                if is_changed
+            ]
+            if not changed_urls:
+                logger.info("None of the %s files the CMDB was built from changed", len(urls))
+                return False
+
+            logger.info("%s of the %s files the CMDB was built from changed, rebuilding", len(changed_urls), len(urls))
+            for url in changed_urls:
+                await self.url_cache.forget(url)
+            await self._profiled_build(fetcher, self.inventories)
+        return True
+
+    async def build(self, fetch_text: FetchText | None = None, *, offline: bool = False) -> None:
         """Build the CMDB.
 
         Args:
             fetch_text: How to fetch a URL, as `url -> body or None`. Defaults to httpx. The Cloudflare Worker
                 passes the Workers runtime's `fetch` instead — that's the path known to work there, and it keeps
                 the Worker from depending on how Pyodide patches an HTTP client.
+            offline: Build from the URL cache on disk alone, with no network access, to re-render after a template
+                or schema_mapping change. Every file the last online build asked for is cached, the 404s and the
+                vars file listings included, so anything missing means the cache is from another config: that
+                raises NotCachedError rather than build an inventory with holes in it.
+
+        Raises:
+            NotCachedError: Offline, for the first file the cache doesn't have, or if there is no cache.
+        """
+        if offline:
+            if not self.url_cache.on_disk():
+                msg = f"No URL cache to build offline from in: {self._instance_path}. Build online first"
+                raise NotCachedError(msg)
+            fetch_text = _offline_fetch_text
+        async with self._building:
+            await self._profiled_build(fetch_text, self.inventories)
+
+    async def reconfigure(self, inventories: dict[str, Inventory], fetch_text: FetchText | None = None) -> list[str]:
+        """Bring the CMDB in line with a changed Config.cmdb, rebuilding only the inventories that need it.
+
+        Removed inventories go at once. Added ones are served from their skeleton on, as at startup. Those whose
+        URL changed are built into new dicts that replace the served ones when done, so until then the old version
+        keeps serving. Built from the URL cache where it has the files, as build() is at startup. Anything else, such as
+        a new schema_mapping, only changes how the data is presented, so it starts a new generation to drop what
+        was rendered from the old config, and fetches nothing. Returns the names rebuilt.
+        """
+        async with self._building:
+            for name in self.inventories.keys() - inventories.keys():
+                logger.info("Inventory %s removed from the config", name)
+                del self.inventories[name]
+                del self.phases[name]
+                if self.changes is not None:
+                    self.changes.forget(name)
+
+            rebuild = {
+                name: _unbuilt(inventory)
+                for name, inventory in inventories.items()
+                if self.inventories.get(name, {}).get("url") != inventory.inventory_url
+            }
+            for name in rebuild.keys() - self.inventories.keys():  # Listed, as loading, until its skeleton is in
+                self._publish(name, rebuild[name], PHASE_PENDING)
+            if rebuild:
+                logger.info("Rebuilding changed inventories: %s", ", ".join(rebuild))
+                await self._profiled_build(fetch_text, rebuild)
+            else:
+                self._new_generation()
+                logger.info("Config changed, no inventory to rebuild, generation %s", self.generation)
+        return list(rebuild)
+
+    async def _profiled_build(self, fetch_text: FetchText | None, inventories: dict[str, dict]) -> None:
+        """_build(), profiled if that was asked for, see profiling.py. Call with self._building held."""
+        if profiling.take_build_request():
+            async with profiling.profiled(self._instance_path, "build"):
+                await self._build(fetch_text, inventories)
+        else:
+            await self._build(fetch_text, inventories)
+
+    async def _build(self, fetch_text: FetchText | None, inventories: dict[str, dict]) -> None:
+        """Build inventories, all of self.inventories or new ones to add to it, and start a new generation.
+
+        Each inventory is published to self.inventories as it's built, see _build_inventory(), so the generation
+        only changes here, once they all have been.
         """
         logger.info("Building CMDB")
         self._request_limit = asyncio.Semaphore(CONCURRENT_REQUEST_LIMIT)
+        started = time.perf_counter()
+        self._failed_urls = set()
+        if inventories is self.inventories:
+            self._asked = set()
 
         if fetch_text is None:
             async with httpx_fetcher() as default_fetch_text:
-                await self._build_inventories(default_fetch_text)
+                await self._build_inventories(default_fetch_text, inventories)
         else:
-            await self._build_inventories(fetch_text)
+            await self._build_inventories(fetch_text, inventories)
 
-        if self._instance_path:
+        # Offline, the dump would be rewritten from the same files, at most of an offline build's cost
+        if self._instance_path and fetch_text is not _offline_fetch_text:
+            write_started = time.perf_counter()
             await asyncio.to_thread(self._write_output)  # Blocking IO, keep it off the event loop
+            metrics.BUILD_PHASE_SECONDS.observe(time.perf_counter() - write_started, "write_output")
+
+        if self.changes is not None:
+            # Recorded before the new generation starts, so no answer for it is rendered from the last build's feed.
+            # Until it does, the log answers as of the current one, see changes.py.
+            # In a thread, since hashing every host is CPU bound: about a third of a second for 20,000 of them.
+            built = {name: self.inventories[name] for name in inventories}
+            await asyncio.to_thread(self.changes.record, self.generation + 1, built)
 
         # Stamped here rather than at import: on a deployed Worker the clock reads 0 until the isolate has done
         # I/O, so anything captured at module scope renders as 1970-01-01. By now the fetches have happened.
         self.built_at = datetime.now(tz=UTC).strftime("%Y-%m-%d %H:%M:%S UTC")
-
-        logger.info("CMDB built")
+        self._new_generation()
+        metrics.BUILD_PHASE_SECONDS.observe(time.perf_counter() - started, "total")
+
+        logger.info("CMDB built, generation %s", self.generation)
+        logger.info(
+            "URL cache: %(entries)s entries, %(bytes)s of %(max_bytes)s bytes in memory, "
+            "%(evictions)s evicted, %(disk_reads)s read back from disk",
+            self.url_cache.stats(),
+        )
         self.ready = True
 
-    async def _build_inventories(self, fetch_text: FetchText) -> None:
-        """Fetch and populate the hosts and groups of every inventory."""
-        for inventory_tmp_dict in self.inventories.values():
-            inventory_tmp_dict["hosts"] = await self._build_cmdb_hosts(inventory_tmp_dict, fetch_text)
-            inventory_tmp_dict["groups"] = await self._build_cmdb_groups(inventory_tmp_dict, fetch_text)
+    def config_changed(self) -> None:
+        """Start a new generation for a config just swapped in, as nothing rendered from the old one still applies.
+
+        Not waiting on a build in progress, see reload.apply_config(): until it's done, reconfigure() can't start.
+        """
+        self._new_generation()
+        logger.info("Config changed, generation %s", self.generation)
+
+    def _new_generation(self) -> None:
+        """Start a new generation, dropping everything cached() for the last one."""
+        self.generation += 1
+        self._derived = {}
+        metrics.BUILD_GENERATION.set(self.generation)
+
+    async def _build_inventories(self, fetch_text: FetchText, inventories: dict[str, dict]) -> None:
+        """Build every inventory at once, so a slow one holds up only itself. Fetches share the request limit."""
+        await asyncio.gather(
+            *[self._build_inventory(name, inventory_dict, fetch_text) for name, inventory_dict in inventories.items()]
+        )
+
+    async def _build_inventory(self, name: str, inventory_dict: dict, fetch_text: FetchText) -> None:
+        """Build one inventory in two phases, publishing it to self.inventories after each.
+
+        The skeleton needs only the inventory file, so it's published one fetch in, while the vars files are listed.
+        The vars files are then fetched, and merged into new host and group dicts rather than the published ones,
+        which a request may be reading. An inventory already served complete, as on a refresh, isn't set back to
+        its skeleton: it keeps serving the last build until this one is done, or for good if a fetch failed.
+        """
+        base_url = inventory_dict["base_url"]
+        (skeleton_hosts, skeleton_groups), self._vars_files[base_url] = await asyncio.gather(
+            self._build_skeleton(name, inventory_dict, fetch_text),
+            self._list_vars_files(inventory_dict, fetch_text),
+        )
+
+        started = time.perf_counter()
+        host_vars, group_vars = await asyncio.gather(
+            asyncio.gather(*[self._get_host_vars(host, base_url, fetch_text) for host in skeleton_hosts]),
+            asyncio.gather(*[self._get_group_vars(group, base_url, fetch_text) for group in skeleton_groups]),
+        )
+        # Inline vars from the inventory file win over the vars files, as in Ansible
+        hosts = {
+            host: {"groups": host_data["groups"], "vars": {**file_vars, **host_data["vars"]}}
+            for (host, host_data), file_vars in zip(skeleton_hosts.items(), host_vars, strict=True)
+        }
+        groups = dict(zip(skeleton_groups, group_vars, strict=True))
+        failed = [url for url in self._failed_urls if url == inventory_dict["url"] or url.startswith(f"{base_url}/")]
+        if failed and self.phases.get(name) == PHASE_READY:
+            # Built from a failed fetch, a host or the whole inventory would look removed. An origin having a bad
+            # moment is no reason to take them away, so the last build stays, and the change feed sees nothing.
+            logger.warning("Could not fetch %s files of inventory %s, still serving its last build", len(failed), name)
+            return
+        self._publish(name, {**inventory_dict, "hosts": hosts, "groups": groups}, PHASE_READY)
+        metrics.BUILD_PHASE_SECONDS.observe(time.perf_counter() - started, "vars")
+
+    async def _build_skeleton(self, name: str, inventory_dict: dict, fetch_text: FetchText) -> tuple[dict, dict]:
+        """An inventory's hosts, with their groups and inline vars, and its groups, with no vars yet.
+
+        Published as the inventory's skeleton unless it's already served complete, see _build_inventory().
+        """
+        started = time.perf_counter()
+        inventory_yaml = await self._get_yaml(inventory_dict["url"], fetch_text)
+
+        hosts: dict = {}
+        groups: dict = {}
+        if self._usable_inventory(inventory_yaml, inventory_dict["url"]):
+            for group in inventory_yaml:
+                for host in inventory_yaml[group]["hosts"]:
+                    hosts[host] = {"groups": [], "vars": {}}
+
+            for host, host_data in hosts.items():
+                host_data["groups"] = self._get_groups_of_host(host, inventory_yaml)
+                self._set_host_vars_from_inventory(host, hosts, inventory_yaml)
+
+            groups = {group: {} for group in inventory_yaml}
+
+        if self.phases.get(name) != PHASE_READY:
+            self._publish(name, {**inventory_dict, "hosts": hosts, "groups": groups}, PHASE_SKELETON)
+            logger.info("Inventory %s skeleton built, %s hosts, fetching their vars", name, len(hosts))
+        metrics.BUILD_PHASE_SECONDS.observe(time.perf_counter() - started, "skeleton")
+        return hosts, groups
+
+    def _publish(self, name: str, inventory_dict: dict, phase: str) -> None:
+        """Serve an inventory as built so far, dropping anything cached() from what it replaces."""
+        self.inventories[name] = inventory_dict
+        self.phases[name] = phase
+        self._derived = {}
+
+    def phase(self, inventory: str) -> str | None:
+        """How far an inventory's build has got, one of the PHASE_* constants. None for one not in the config."""
+        return self.phases.get(inventory)
+
+    def complete(self) -> bool:
+        """Whether every inventory is built in full.
+
+        Unlike ready, which only says the first build has finished, this goes False again while a reload builds an
+        added inventory.
+        """
+        return all(phase == PHASE_READY for phase in self.phases.values())
+
+    def cached(self, key: Hashable, compute: Callable[[], T]) -> T:
+        """Memoise something derived from the inventories, for as long as this generation is the current one.
+
+        For work that depends only on the built data, such as a rendered page and its compressed variants, so
+        it is done once per build rather than once per request. Thread-safe enough for the app's sync routes: two
+        racing callers both compute, and one result wins. A value computed across the end of a build is stored in
+        the dict that build threw away, so it can't outlive the data it came from.
+
+        Nothing is stored while an inventory is part built, since what it's derived from is about to change, so
+        until then every call computes.
+        """
+        derived = self._derived
+        if key in derived:
+            return derived[key]
+        value = compute()
+        if self.complete():
+            derived[key] = value
+        return value
 
     def get_inventories(self) -> dict:
         """Get the inventories."""
@@ -237,49 +618,6 @@ class AnsibleCMDB:
         except KeyError:
             return {}
 
-    async def _build_cmdb_groups(self, inventory_dict: dict, fetch_text: FetchText) -> dict:
-        """Build the CMDB groups from the inventory."""
-        inventory_yaml = await self._get_yaml(inventory_dict["url"], fetch_text)
-
-        if not self._usable_inventory(inventory_yaml, inventory_dict["url"]):
-            return {}
-
-        groups: dict = {group: {} for group in inventory_yaml}
-
-        await asyncio.gather(
-            *[
-                self._set_group_vars(group, group_vars, inventory_dict["base_url"], fetch_text)
-                for group, group_vars in groups.items()
-            ]
-        )
-
-        return groups
-
-    async def _build_cmdb_hosts(self, inventory_dict: dict, fetch_text: FetchText) -> dict:
-        """Build the CMDB hosts from the inventory."""
-        inventory_yaml = await self._get_yaml(inventory_dict["url"], fetch_text)
-
-        if not self._usable_inventory(inventory_yaml, inventory_dict["url"]):
-            return {}
-
-        hosts: dict = {}
-        for group in inventory_yaml:
-            for host in inventory_yaml[group]["hosts"]:
-                hosts[host] = {"groups": [], "vars": {}}
-
-        for host, host_data in hosts.items():
-            host_data["groups"] = self._get_groups_of_host(host, inventory_yaml)
-
-        await asyncio.gather(
-            *[self._set_host_vars(host, hosts[host]["vars"], inventory_dict["base_url"], fetch_text) for host in hosts]
-        )
-
-        # Get the inline vars for each host
-        for host in hosts:
-            self._set_host_vars_from_inventory(host, hosts, inventory_yaml)
-
-        return hosts
-
     def _usable_inventory(self, inventory_yaml: dict, url: str) -> bool:
         """Whether a fetched inventory can be walked as `{group: {"hosts": {...}}}`.
 
@@ -306,55 +644,154 @@ class AnsibleCMDB:
         """Get the groups of a host."""
         return [group for group in inventory_yaml if host in inventory_yaml[group]["hosts"]]
 
-    async def _set_group_vars(self, group: str, group_vars: dict, base_url: str, fetch_text: FetchText) -> None:
+    async def _get_group_vars(self, group: str, base_url: str, fetch_text: FetchText) -> dict:
         """Get the vars of a group. Fetched in order, the inventory/ path overrides the top level one."""
+        group_vars: dict = {}
         group_var_urls = [
             f"{base_url}/group_vars/{group}.yml",
             f"{base_url}/inventory/group_vars/{group}.yml",
         ]
 
-        for group_var_url in group_var_urls:
+        for group_var_url in self._existing(base_url, group_var_urls):
             group_yaml = await self._get_yaml(group_var_url, fetch_text)
 
             if group_yaml:
                 group_vars.update(dict(group_yaml.items()))
 
-    async def _set_host_vars(self, host: str, host_vars: dict, base_url: str, fetch_text: FetchText) -> None:
+        return group_vars
+
+    async def _get_host_vars(self, host: str, base_url: str, fetch_text: FetchText) -> dict:
         """Get the vars of a host. Fetched in order, the inventory/ path overrides the top level one."""
+        host_vars: dict = {}
         host_var_urls = [
             f"{base_url}/host_vars/{host}.yml",
             f"{base_url}/inventory/host_vars/{host}.yml",
         ]
 
-        for host_var_url in host_var_urls:
+        for host_var_url in self._existing(base_url, host_var_urls):
             host_yaml = await self._get_yaml(host_var_url, fetch_text)
 
             if host_yaml:
                 host_vars.update(dict(host_yaml.items()))
 
-    async def _get_yaml(self, url: str, fetch_text: FetchText) -> dict:
-        """Get a yaml file from a URL."""
-        if url not in self.url_cache:
-            logger.debug(f"Getting URL: {url}")
+        return host_vars
+
+    async def _list_vars_files(self, inventory_dict: dict, fetch_text: FetchText) -> frozenset[str] | None:
+        """Which files exist under an inventory's base URL, relative to it, or None if there's no telling.
+
+        Every host and group is probed for a vars file at two paths, and most of those probes 404. A listing lets
+        _get_host_vars and _get_group_vars ask only for files that exist, one request in place of all the misses.
+        A repo on GitHub is listed by the git trees API, anything else by a VARS_MANIFEST published beside it.
+        Without either, or if the listing can't be read, every path is probed as before.
+        """
+        base_url = inventory_dict["base_url"]
+        if github := GITHUB_RAW_BASE_URL.fullmatch(base_url):
+            repo, branch, directory = github.groups()
+            listing_url = f"https://api.github.com/repos/{repo}/git/trees/{branch}?recursive=1"
+        else:
+            directory = None
+            listing_url = f"{base_url}/{VARS_MANIFEST}"
+
+        # Cached like the vars files, so an offline build knows which ones it asked for. The whole repo's paths, as
+        # two inventories in one repo share the listing.
+        self._asked.add(listing_url)
+        listing = await self.url_cache.get(listing_url)
+        if listing is None:
             try:
                 async with self._request_limit:
-                    body = await fetch_text(url)
-
-                if body is None:
-                    return {}
+                    body = await fetch_text(listing_url)
+            except NotCachedError:
+                raise
+            except Exception as e:  # noqa: BLE001 Without a listing the build still works, it just probes
+                # GitHub rate limits the trees API to 60 requests an hour without a token, so this is a 403 or a 429
+                # more often than the origin being down. Either way it passes: use the last listing and ask again
+                # next build, rather than cache having none.
+                listing = await self.url_cache.previous(listing_url)
+                instead = "using the last one" if listing else "probing for every vars file"
+                logger.warning("Could not fetch the listing at %s, %s: %s", listing_url, instead, e)
+                if listing is None:
+                    return None
+            else:
+                listing = {"paths": self._read_listing(listing_url, body, github=github is not None)}
+            await self.url_cache.put(listing_url, listing)
+        paths = listing["paths"]
+        if paths is None:
+            return None
 
-                temp_yaml = yaml.safe_load(body)
+        if directory:  # A base URL below the repo's root: paths relative to that
+            paths = [path.removeprefix(f"{directory}/") for path in paths if path.startswith(f"{directory}/")]
+        if github and inventory_dict["url"].removeprefix(f"{base_url}/") not in paths:
+            # The branch is taken to be the first path segment after refs/heads/, and a branch named release/1.2
+            # isn't: this would be another ref's listing, or another directory's. Only the right one has the
+            # inventory in it.
+            logger.info("%s doesn't list the inventory, probing for every vars file", listing_url)
+            return None
+        logger.info("Listed %s files at %s, fetching only the vars files among them", len(paths), listing_url)
+        return frozenset(path for path in paths if path and not path.startswith("#"))
 
-            except TimeoutError:
-                logger.warning("Timeout getting URL: %s", url)
-                temp_yaml = {"error": True, "message": "Timeout error", "exception": "TimeoutError"}
-            except Exception as e:  # noqa: BLE001 One bad inventory URL shouldn't take down the whole CMDB
-                logger.warning("Unhandled exception getting URL %s: %s", url, e)
-                temp_yaml = {"error": True, "message": "Unhandled exception", "exception": str(e)}
+    def _read_listing(self, listing_url: str, body: str | None, *, github: bool) -> list[str] | None:
+        """The paths in a fetched listing, see _list_vars_files(), or None if there isn't a usable one."""
+        if body is None:
+            logger.debug("No listing at %s, probing for every vars file", listing_url)
+            return None
+        if github:
+            try:
+                tree = json.loads(body)
+                if tree["truncated"]:  # Past the API's limit, the listing is incomplete
+                    logger.info("Listing at %s is truncated, probing for every vars file", listing_url)
+                    return None
+                return [entry["path"] for entry in tree["tree"] if entry["type"] == "blob"]
+            except (ValueError, KeyError, TypeError) as e:
+                logger.warning("Could not read the listing at %s, probing for every vars file: %s", listing_url, e)
+                return None
+
+        paths = [line.strip().removeprefix("./") for line in body.splitlines()]
+        # A host that answers any path with a 200, an SPA fallback or a login page say, would otherwise pass off
+        # its HTML as a listing with no vars files in it, and every one would silently go unfetched.
+        if "<" in body or not any(VARS_DIRECTORY.search(path) for path in paths):
+            logger.warning("%s doesn't look like a list of vars files, probing for every one", listing_url)
+            return None
+        return paths
 
-            self.url_cache[url] = temp_yaml
+    def _existing(self, base_url: str, urls: list[str]) -> list[str]:
+        """The vars file URLs worth fetching: those in the inventory's listing, or all of them without one."""
+        vars_files = self._vars_files.get(base_url)
+        if vars_files is None:
+            return urls
+        return [url for url in urls if url.removeprefix(f"{base_url}/") in vars_files]
 
+    async def _get_yaml(self, url: str, fetch_text: FetchText) -> dict:
+        """Get a yaml file from the URL cache, or failing that from its URL."""
+        self._asked.add(url)
+        cached = await self.url_cache.get(url)
+        if cached is not None:
+            logger.trace("Using cached URL: %s", url)
+            return cached
+
+        logger.debug("Getting URL: %s", url)
+        try:
+            async with self._request_limit:
+                body = await fetch_text(url)
+
+            if body is None:  # Cached too, as empty, so an offline build can tell it was asked for and wasn't there
+                temp_yaml = {}
+            else:
+                parse_started = time.perf_counter()
+                temp_yaml = yaml.safe_load(body) or {}  # An empty file is None, which would read as not cached
+                metrics.YAML_PARSE_SECONDS.observe(time.perf_counter() - parse_started)
+
+        except NotCachedError:
+            raise
+        except TimeoutError:
+            logger.warning("Timeout getting URL: %s", url)
+            temp_yaml = {"error": True, "message": "Timeout error", "exception": "TimeoutError"}
+        except Exception as e:  # noqa: BLE001 One bad inventory URL shouldn't take down the whole CMDB
+            logger.warning("Unhandled exception getting URL %s: %s", url, e)
+            temp_yaml = {"error": True, "message": "Unhandled exception", "exception": str(e)}
         else:
-            logger.trace(f"Using cached URL: {url}")
+            await self.url_cache.put(url, temp_yaml)
+            return temp_yaml
 
-        return self.url_cache[url]
+        # Not cached: the next build asks again, rather than building from a failure that has likely passed
+        self._failed_urls.add(url)
+        return temp_yaml
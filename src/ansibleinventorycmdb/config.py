@@ -5,13 +5,27 @@ import os
 import yaml
 from pydantic import BaseModel, ConfigDict, Field
 
-from .logger import LoggingConfig, get_logger
+from .logger import get_logger
 
 logger = get_logger(__name__)
 
 DEFAULT_INVENTORY_URL = "https://raw.githubusercontent.com/kism/ansible-playbooks/refs/heads/main/inventory/main.yml"
 
 
+class LoggingConfig(BaseModel):
+    """Logging configuration, path is a file to log to, empty means console only.
+
+    queue hands records to a background thread that does the writing, so that neither the console nor the file's
+    writes and rotations hold up the event loop. Ignored in the Worker, where there are no threads.
+    """
+
+    model_config = ConfigDict(extra="forbid")
+
+    level: str = "INFO"
+    path: str = ""
+    queue: bool = True
+
+
 class Inventory(BaseModel):
     """One ansible inventory to present as a CMDB."""
 
@@ -61,8 +75,7 @@ def load_config(instance_path: str) -> Config:
     for path in paths:
         if os.path.isfile(path):
             logger.info("Loading config from: %s", path)
-            with open(path, encoding="utf8") as yaml_file:
-                return Config(**(yaml.safe_load(yaml_file) or {}))
+            return read_config(path)
         logger.info("No config file found at: %s", path)
 
     config = Config()
@@ -71,6 +84,12 @@ def load_config(instance_path: str) -> Config:
     return config
 
 
+def read_config(path: str) -> Config:
+    """Read and validate one config file. Raises OSError, yaml.YAMLError or pydantic.ValidationError."""
+    with open(path, encoding="utf8") as yaml_file:
+        return Config(**(yaml.safe_load(yaml_file) or {}))
+
+
 def _write_config(config: Config, path: str) -> None:
     """Write a config out as yaml. Only ever used to materialise the defaults."""
     try:
@@ -0,0 +1,86 @@
+"""Compress a rendered object once, and pick the variant a client will accept.
+
+Inventory pages and group JSON are large and very repetitive, so they compress ten to one. Compressing per request
+would burn that saving on CPU instead, so every mode compresses once per build: the app caches the variants for
+the life of a generation, and the static site writes them out next to, or in place of, the plain object.
+"""
+
+from __future__ import annotations
+
+import gzip
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from collections.abc import Container
+
+try:
+    from compression import zstd  # Python 3.14+. Pyodide and 3.13 don't have it, and only get gzip
+except ImportError:  # pragma: no cover Depends on the interpreter, not on anything a test can set
+    zstd = None
+
+GZIP_LEVEL = 9  # Paid once per build rather than per request, so take the smallest output
+ZSTD_LEVEL = 12  # Not the maximum: past this it gets much slower for very little, even paid once
+
+# Below this the headers cost more than compression saves.
+MIN_COMPRESS_BYTES = 512
+
+# Fonts and PNGs are already compressed. Everything else in static/ is text, bar favicon.ico, which is a bitmap.
+COMPRESSIBLE_CONTENT_TYPES = ("text/", "application/json", "application/manifest+json", "image/x-icon")
+
+# Server preference when a client accepts several encodings at the same q-value. Most preferred first.
+ENCODING_PREFERENCE = ("zstd", "gzip")
+
+
+def is_compressible(content_type: str) -> bool:
+    """Whether an object of this content type is worth compressing."""
+    return content_type.startswith(COMPRESSIBLE_CONTENT_TYPES)
+
+
+def gzip_compress(body: bytes) -> bytes:
+    """Gzip a body reproducibly. mtime=0, so the same input always gives the same bytes."""
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def compress(body: bytes) -> dict[str, bytes]:
+    """Every encoding of a body worth serving, as `Content-Encoding -> bytes`. Always includes 'identity'."""
+    variants = {"identity": body}
+    if len(body) < MIN_COMPRESS_BYTES:
+        return variants
+
+    variants["gzip"] = gzip_compress(body)
+    if zstd is not None:
+        variants["zstd"] = zstd.compress(body, level=ZSTD_LEVEL)
+    return variants
+
+
+def negotiate(accept_encoding: str | None, available: Container[str]) -> str:
+    """Pick the encoding to send from an Accept-Encoding header. 'identity' unless a compressed one is accepted.
+
+    Follows the q-values, including `*` and `q=0` to refuse one. Identity is always the fallback, even where the
+    header refuses it: a 406 is no more useful to a client that forgot to accept identity than the plain body.
+    """
+    if not accept_encoding:
+        return "identity"
+
+    weights: dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        weight = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        weights[name.strip().lower()] = weight
+
+    wildcard = weights.get("*", 0.0)
+    best, best_weight = "identity", 0.0
+    for encoding in ENCODING_PREFERENCE:
+        if encoding not in available:
+            continue
+        weight = weights.get(encoding, wildcard)
+        if weight > best_weight:
+            best, best_weight = encoding, weight
+
+    return best
@@ -0,0 +1,104 @@
+"""Bulk export of a whole inventory, as NDJSON or CSV, produced one host at a time.
+
+For syncing the CMDB into something else. Both formats are generated row by row from the built inventory, so
+memory stays flat however many hosts there are, and the app streams them out as they are made rather than
+building one document first. Rows are batched into chunks of EXPORT_CHUNK_BYTES, since a write per host would
+cost more than the serialisation.
+"""
+
+from __future__ import annotations
+
+import csv
+import io
+import json
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Iterator
+
+    from .config import Inventory
+
+NDJSON_CONTENT_TYPE = "application/x-ndjson"
+CSV_CONTENT_TYPE = "text/csv; charset=utf-8"
+
+EXPORT_CHUNK_BYTES = 64 * 1024
+
+# The CSV's first column, and the key NDJSON records name the host by.
+HOST_FIELD = "host"
+
+
+def _chunked(rows: Iterable[str]) -> Iterator[bytes]:
+    """Join rows into chunks of about EXPORT_CHUNK_BYTES. The first row goes out alone, so it arrives at once."""
+    chunk: list[str] = []
+    size = 0
+    first = True
+    for row in rows:
+        chunk.append(row)
+        size += len(row)
+        if first or size >= EXPORT_CHUNK_BYTES:
+            yield "".join(chunk).encode()
+            chunk, size, first = [], 0, False
+    if chunk:
+        yield "".join(chunk).encode()
+
+
+def iter_ndjson(hosts: dict) -> Iterator[bytes]:
+    """One JSON object per line per host: `{"host": ..., "groups": [...], "vars": {...}}`."""
+    return _chunked(
+        json.dumps({HOST_FIELD: host, "groups": host_data.get("groups", []), "vars": host_data["vars"]}, default=str)
+        + "\n"
+        for host, host_data in hosts.items()
+    )
+
+
+def csv_cell(value: object) -> str:
+    """A var's value as a CSV cell: empty when missing, JSON for lists and dicts, otherwise its text."""
+    if value is None:
+        return ""
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, default=str)
+    return str(value)
+
+
+def iter_csv(hosts: dict, fields: list[str]) -> Iterator[bytes]:
+    """A header row, then one row per host: its name, then each field's value."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def take() -> str:
+        """What the writer has written since the last take, leaving the buffer empty."""
+        row = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return row
+
+    def rows() -> Iterator[str]:
+        writer.writerow([HOST_FIELD, *fields])
+        yield take()
+        for host, host_data in hosts.items():
+            writer.writerow([host, *(csv_cell(host_data["vars"].get(field)) for field in fields)])
+            yield take()
+
+    return _chunked(rows())
+
+
+def csv_fields(schema_mapping: dict[str, str], fields: str = "") -> list[str]:
+    """The CSV's columns: the comma-separated `fields` if given, otherwise the inventory's schema_mapping vars."""
+    if fields:
+        return [field.strip() for field in fields.split(",") if field.strip()]
+    return list(schema_mapping)
+
+
+def export_objects(inventories: dict, cmdb_config: dict[str, Inventory]) -> Iterator[tuple[str, Iterator[bytes], str]]:
+    """Yield (key, chunks, content type) for every inventory's `export.ndjson` and `export.csv`, at the app's keys.
+
+    Chunks rather than bodies, so a writer can stream them to disk without holding a whole export at once.
+    """
+    for name, inventory_dict in inventories.items():
+        hosts = inventory_dict.get("hosts", {})
+        yield f"inventory/{name}/export.ndjson", iter_ndjson(hosts), NDJSON_CONTENT_TYPE
+        yield (
+            f"inventory/{name}/export.csv",
+            iter_csv(hosts, csv_fields(dict(cmdb_config[name].schema_mapping))),
+            CSV_CONTENT_TYPE,
+        )
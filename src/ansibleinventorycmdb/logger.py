@@ -1,11 +1,20 @@
 """Setup the logger functionality for ansibleinventorycmdb."""
 
+from __future__ import annotations
+
+import atexit
 import logging
+import queue
+import sys
 import typing
-from logging.handlers import RotatingFileHandler
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from typing import cast
 
-from pydantic import BaseModel, ConfigDict
+if typing.TYPE_CHECKING:
+    # The model lives with the rest of the config, so that logging, which every module imports, doesn't need
+    # pydantic. The Worker sets up logging from its bundled config without it. Still importable from here, through
+    # __getattr__ below, which only imports it when asked for.
+    from .config import LoggingConfig
 
 LOG_LEVELS = [
     "TRACE",
@@ -17,6 +26,7 @@ LOG_LEVELS = [
 ]  # Valid str logging levels.
 LOG_FORMAT = "%(asctime)s:%(levelname)s:%(name)s:%(message)s"  # This is the logging message format that I like.
 TRACE_LEVEL_NUM = 5
+QUEUED_HANDLER_TYPES = (logging.StreamHandler, RotatingFileHandler)  # What _add_console/file_handler add
 
 
 class CustomLogger(logging.Logger):
@@ -33,13 +43,15 @@ logging.addLevelName(TRACE_LEVEL_NUM, "TRACE")
 logging.setLoggerClass(CustomLogger)
 
 
-class LoggingConfig(BaseModel):
-    """Logging configuration, path is a file to log to, empty means console only."""
+def __getattr__(name: str) -> typing.Any:  # noqa: ANN401 Module-level __getattr__ returns whatever the attribute is
+    """Resolve `LoggingConfig` on first access, so importing this module doesn't import pydantic."""
+    if name == "LoggingConfig":
+        from .config import LoggingConfig  # noqa: PLC0415 That's the point, the import is deferred
 
-    model_config = ConfigDict(extra="forbid")
+        return LoggingConfig
 
-    level: str = "INFO"
-    path: str = ""
+    msg = f"module {__name__!r} has no attribute {name!r}"
+    raise AttributeError(msg)
 
 
 # This is where we log to in this module, following the standard of every module.
@@ -51,17 +63,23 @@ logger = cast("CustomLogger", logging.getLogger(__name__))
 # root_logger : root,
 # logger      : root, ansibleinventorycmdb, ansibleinventorycmdb.module_name,
 
+# With logging_conf.queue, the root logger's only handler is a QueueHandler. It puts each record on a queue for a
+# QueueListener thread, which passes it to the console and file handlers, so their writes (and the file's rotations)
+# happen off the event loop. Each setup_logger takes the pipeline down and puts it back up around its changes.
+
 
 def setup_logger(logging_conf: LoggingConfig, in_logger: logging.Logger | None = None) -> None:
     """Setup the logger, set configuration per logging_conf.
 
     Args:
-        logging_conf: The logging configuration.
+        logging_conf: The logging configuration, or anything with its `level` and `path`.
         in_logger: Logger to configure, useful for testing.
     """
     if not in_logger:  # in_logger should only exist when testing with PyTest.
         in_logger = logging.getLogger()  # Get the root logger
 
+    _remove_queue(in_logger)  # Back to handlers on the logger itself, to check and add to
+
     # If the logger doesn't have a console handler (root logger doesn't by default)
     if not _has_console_handler(in_logger):
         _add_console_handler(in_logger)
@@ -72,6 +90,11 @@ def setup_logger(logging_conf: LoggingConfig, in_logger: logging.Logger | None =
     if not _has_file_handler(in_logger) and logging_conf.path != "":
         _add_file_handler(in_logger, logging_conf.path)
 
+    # Pyodide, in the Worker, can't start a thread. Without queue in the config (a bundled config from an older
+    # version, say), log directly.
+    if getattr(logging_conf, "queue", False) and sys.platform != "emscripten":
+        _add_queue(in_logger)
+
     # Configure modules that are external and have their own loggers
     logging.getLogger("uvicorn").setLevel(logging.INFO)  # Web server, info has useful info.
     logging.getLogger("uvicorn.access").setLevel(logging.INFO)  # Logs incoming requests.
@@ -138,3 +161,45 @@ def _add_file_handler(in_logger: logging.Logger, log_path: str) -> None:
     file_handler.setFormatter(formatter)
     in_logger.addHandler(file_handler)
     logger.info("Logging to file: %s", log_path)
+
+
+class _InProcessQueueHandler(QueueHandler):
+    """A QueueHandler that leaves formatting to the listener's thread too.
+
+    QueueHandler.prepare formats each record on the logging thread, so that it pickles for a queue to another
+    process. This queue never leaves the process, so the listener's handlers can format the record as they would
+    have attached to the logger. Its args are formatted a moment later than they would have been, so mutating an
+    argument right after logging it could show in the message.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """The record as it is."""
+        return record
+
+
+def _add_queue(in_logger: logging.Logger) -> None:
+    """Move the console and file handlers behind a QueueHandler, served by a QueueListener thread.
+
+    Only handlers of the types this module adds: others, like pytest's capture handlers, are left on the logger.
+    """
+    handlers = [handler for handler in in_logger.handlers if type(handler) in QUEUED_HANDLER_TYPES]
+    for handler in handlers:
+        in_logger.removeHandler(handler)
+
+    queue_handler = _InProcessQueueHandler(queue.SimpleQueue())
+    # Each handler still filters by its own level, as it did when attached to the logger.
+    queue_handler.listener = QueueListener(queue_handler.queue, *handlers, respect_handler_level=True)
+    queue_handler.listener.start()
+    atexit.register(queue_handler.listener.stop)  # Drains the queue, so the last records before exit are written
+    in_logger.addHandler(queue_handler)
+
+
+def _remove_queue(in_logger: logging.Logger) -> None:
+    """Undo _add_queue: stop the listener, once it has written everything queued, and put its handlers back."""
+    for handler in in_logger.handlers[:]:
+        if isinstance(handler, QueueHandler) and handler.listener:
+            handler.listener.stop()
+            atexit.unregister(handler.listener.stop)
+            in_logger.removeHandler(handler)
+            for listened in handler.listener.handlers:
+                in_logger.addHandler(listened)
@@ -0,0 +1,206 @@
+"""Incremental, atomic writes of the static site to a directory.
+
+Every object's content hash is recorded in a manifest, kept in the site itself as MANIFEST_NAME. A run writes a
+whole new release of the site beside the old one, hardlinking every object whose hash hasn't changed rather than
+writing it again, so its inode and mtime survive and rsync or a CDN sync sees only what really changed. Objects
+the run doesn't produce are simply not carried over.
+
+The output directory is a symlink to the current release, and publishing a release is one rename of a new symlink
+over it, so a reader sees either the whole old site or the whole new one. The release before is kept until the
+next publish, for readers still partway through it; anything older is removed.
+
+    site/ -> .site.releases/1760000000000000000
+    .site.releases/1759990000000000000/   the previous release
+    .site.releases/1760000000000000000/   the current release, with .manifest.json
+
+A plain directory is only taken over if it is empty or has a manifest, so is a site this wrote: on the first
+publish it is moved into the releases directory and a symlink put in its place, the one moment it is missing. Any
+other directory, a web root say, is refused rather than moved, since it would be pruned as an old release on the
+next publish. And a taken-over release holding a file its manifest doesn't list is never pruned.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from typing import TYPE_CHECKING, Self
+
+from .logger import get_logger
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterable
+    from pathlib import Path
+    from types import TracebackType
+
+logger = get_logger(__name__)
+
+MANIFEST_NAME = ".manifest.json"
+
+
+def content_hash(body: bytes) -> str:
+    """The hash an object is recorded under in a manifest."""
+    return hashlib.sha256(body).hexdigest()
+
+
+def dump_manifest(manifest: dict[str, str]) -> bytes:
+    """A manifest as the JSON it is stored as, keys sorted so an unchanged site gives an unchanged manifest."""
+    return json.dumps(manifest, indent=0, sort_keys=True).encode()
+
+
+def read_manifest(site_dir: Path) -> dict[str, str]:
+    """The manifest of a site written by SiteWriter. {} when there is no site there."""
+    try:
+        return json.loads((site_dir / MANIFEST_NAME).read_bytes())
+    except FileNotFoundError:
+        return {}
+
+
+def only_site(site_dir: Path) -> bool:
+    """Whether every file in a directory is in its manifest: nothing but a site SiteWriter wrote, safe to remove."""
+    listed = {MANIFEST_NAME, *read_manifest(site_dir)}
+    return (site_dir / MANIFEST_NAME).is_file() and all(
+        path.relative_to(site_dir).as_posix() in listed for path in site_dir.rglob("*") if not path.is_dir()
+    )
+
+
+class SiteWriter:
+    """Write a new release of the site in out_dir, then publish it. Use as a context manager.
+
+    Nothing under out_dir changes until publish(). Leaving the context without publishing, on an exception
+    say, removes the half-written release and leaves the current one as it was.
+    """
+
+    def __init__(self, out_dir: Path) -> None:
+        """Start a new release beside the current one, comparing against the current one's manifest.
+
+        Raises:
+            FileExistsError: out_dir is a directory with something in it but no manifest, so not a site this wrote.
+        """
+        out_dir = out_dir.absolute()
+        if (
+            out_dir.is_dir()
+            and not out_dir.is_symlink()
+            and not (out_dir / MANIFEST_NAME).is_file()
+            and any(out_dir.iterdir())
+        ):
+            msg = f"{out_dir} has files in it but no {MANIFEST_NAME}, so isn't a site this wrote. Not replacing it"
+            raise FileExistsError(msg)
+        self.out_dir = out_dir
+        self.releases_dir = out_dir.with_name(f".{out_dir.name}.releases")
+        self.release_dir = self.releases_dir / str(time.time_ns())
+
+        # Resolved now, so the current release is the one compared against however long writing takes.
+        self.current_dir = out_dir.resolve()
+        self.previous = read_manifest(self.current_dir)
+        self.manifest: dict[str, str] = {}
+        self.counts = {"written": 0, "skipped": 0, "deleted": 0}
+        self.published = False
+        self._lock = threading.Lock()  # write() may be called from several threads, see publish.DirectorySink
+
+    def __enter__(self) -> Self:
+        """Create the release directory."""
+        self.release_dir.mkdir(parents=True)
+        return self
+
+    def __exit__(
+        self, exc_type: type[BaseException] | None, exc: BaseException | None, traceback: TracebackType | None
+    ) -> None:
+        """Remove the release if it was never published."""
+        if not self.published:
+            shutil.rmtree(self.release_dir, ignore_errors=True)
+
+    def write(self, key: str, body: bytes) -> None:
+        """Add one object to the release, linking the current release's copy if it is unchanged."""
+        digest = content_hash(body)
+        self.manifest[key] = digest
+        path = self.release_dir / key
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        if self.previous.get(key) == digest and self._link_previous(key, path):
+            self._count("skipped")
+            return
+
+        path.write_bytes(body)
+        self._count("written")
+
+    def write_chunks(self, key: str, chunks: Iterable[bytes]) -> None:
+        """Add one object, streamed to disk a chunk at a time. Only once it's written is it known to be unchanged."""
+        digest = hashlib.sha256()
+        path = self.release_dir / key
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with path.open("wb") as object_file:
+            for chunk in chunks:
+                digest.update(chunk)
+                object_file.write(chunk)
+
+        self.manifest[key] = digest.hexdigest()
+        if self.previous.get(key) == self.manifest[key] and self._link_previous(key, path):
+            self._count("skipped")
+            return
+
+        self._count("written")
+
+    def carry_over(self, keep: Callable[[str], bool]) -> None:
+        """Link every object of the current release that this one didn't write, and keep() approves, into this one.
+
+        For a release that only wrote what changed, see site.py's incremental render: the rest comes from the
+        current release as it was. Counted as skipped, like any other object that didn't need writing.
+        """
+        for key, digest in self.previous.items():
+            if key in self.manifest or not keep(key):
+                continue
+            path = self.release_dir / key
+            path.parent.mkdir(parents=True, exist_ok=True)
+            if self._link_previous(key, path):
+                self.manifest[key] = digest
+                self._count("skipped")
+            else:
+                logger.warning("Can't carry %s over from the current release, it's gone from disk", key)
+
+    def _count(self, outcome: str) -> None:
+        with self._lock:
+            self.counts[outcome] += 1
+
+    def _link_previous(self, key: str, path: Path) -> bool:
+        """Hardlink the current release's copy of an object into the new release, over anything already there.
+
+        False, leaving path alone, if the current release doesn't have it after all.
+        """
+        link = path.with_name(f"{path.name}.link")
+        try:
+            os.link(self.current_dir / key, link)
+        except FileNotFoundError:  # Deleted by hand, so the manifest is wrong about it
+            return False
+        link.replace(path)
+        return True
+
+    def publish(self) -> dict[str, int]:
+        """Write the manifest and flip out_dir over to the new release. Returns counts written, skipped, deleted."""
+        (self.release_dir / MANIFEST_NAME).write_bytes(dump_manifest(self.manifest))
+        self.counts["deleted"] = len(self.previous.keys() - self.manifest.keys())
+
+        if self.out_dir.is_dir() and not self.out_dir.is_symlink():
+            # A plain directory can't be renamed over, so it becomes a release itself first.
+            self.current_dir = self.releases_dir / f"{time.time_ns()}-legacy"
+            self.out_dir.rename(self.current_dir)
+
+        new_link = self.out_dir.with_name(f".{self.out_dir.name}.link")
+        new_link.unlink(missing_ok=True)
+        new_link.symlink_to(self.release_dir.relative_to(self.out_dir.parent), target_is_directory=True)
+        new_link.replace(self.out_dir)
+        self.published = True
+
+        keep = {self.release_dir.name, self.current_dir.name}
+        for release in self.releases_dir.iterdir():
+            if release.name in keep:
+                continue
+            if release.name.endswith("-legacy") and not only_site(release):
+                logger.warning("Not removing %s, it has files that aren't part of the site", release)
+                continue
+            shutil.rmtree(release, ignore_errors=True)
+
+        return self.counts
@@ -0,0 +1,202 @@
+"""Counters, gauges and histograms for the fetch and build path, exported in Prometheus' text format.
+
+The app serves them at /metrics, and the Cloudflare Worker stores a snapshot() of each build's alongside the site
+for its /status. Hand-rolled rather than prometheus_client, for the same reason s3.py signs its own requests: three
+metric types are little code, and every dependency of the package is one the Worker has to find on Pyodide's index.
+
+Recording is a dict lookup and an add, cheap enough to leave on for every fetch. Nothing is locked: every metric
+here is recorded from the event loop's thread, where fetches and builds run. Label values are positional, in the
+order the metric was declared with, and are kept to low-cardinality things: an origin's host, never a whole URL.
+"""
+
+from __future__ import annotations
+
+import bisect
+import time
+from urllib.parse import urlsplit
+
+# Prometheus' default buckets: from 5ms, for a cached read, to 10s, past a fetch's timeout.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0)
+
+EXPOSITION_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value: str) -> str:
+    """A label value as the text format needs it quoted."""
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if value == int(value) else repr(value)
+
+
+class Metric:
+    """One metric, and its value for every combination of label values seen so far."""
+
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labels: tuple[str, ...] = ()) -> None:
+        """Declare a metric and register it with REGISTRY."""
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._values: dict[tuple[str, ...], float] = {}
+        REGISTRY.register(self)
+
+    def _label_text(self, label_values: tuple[str, ...], extra: str = "") -> str:
+        pairs = [f'{label}="{_escape(value)}"' for label, value in zip(self.labels, label_values, strict=True)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def samples(self) -> list[str]:
+        """The metric's sample lines in the text format."""
+        return [f"{self.name}{self._label_text(key)} {_format_value(value)}" for key, value in self._values.items()]
+
+    def snapshot(self) -> dict:
+        """The metric's values as JSON-able data, keyed by `label=value,...` (empty for a metric without labels)."""
+        return {
+            ",".join(f"{label}={value}" for label, value in zip(self.labels, key, strict=True)): value
+            for key, value in self._values.items()
+        }
+
+    def reset(self) -> None:
+        """Forget every value."""
+        self._values = {}
+
+
+class Counter(Metric):
+    """A count that only goes up. Name it `..._total`."""
+
+    type_name = "counter"
+
+    def inc(self, *label_values: str, amount: float = 1) -> None:
+        """Add amount, 1 by default."""
+        self._values[label_values] = self._values.get(label_values, 0) + amount
+
+
+class Gauge(Metric):
+    """A value that is set, rather than added to."""
+
+    type_name = "gauge"
+
+    def set(self, value: float, *label_values: str) -> None:
+        """Set the value."""
+        self._values[label_values] = value
+
+
+class Histogram(Metric):
+    """Observations counted into buckets by upper bound, plus their count and sum."""
+
+    type_name = "histogram"
+
+    def __init__(
+        self, name: str, documentation: str, labels: tuple[str, ...] = (), buckets: tuple[float, ...] = DEFAULT_BUCKETS
+    ) -> None:
+        """Declare a histogram with the given bucket upper bounds, in increasing order. +Inf is implied."""
+        self.buckets = buckets
+        self._observations: dict[tuple[str, ...], list[float]] = {}
+        super().__init__(name, documentation, labels)
+
+    def observe(self, value: float, *label_values: str) -> None:
+        """Record one observation."""
+        observations = self._observations.get(label_values)
+        if observations is None:
+            # Per-bucket counts (not yet cumulative), then the +Inf bucket, the sum, and the count
+            observations = self._observations[label_values] = [0] * (len(self.buckets) + 3)
+        observations[bisect.bisect_left(self.buckets, value)] += 1
+        observations[-2] += value
+        observations[-1] += 1
+
+    def samples(self) -> list[str]:
+        """Cumulative buckets, then the sum and count, for every combination of labels."""
+        lines = []
+        for key, observations in self._observations.items():
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), observations, strict=False):
+                cumulative += count
+                le = bound if isinstance(bound, str) else _format_value(bound)
+                lines.append(f"{self.name}_bucket{self._label_text(key, f'le="{le}"')} {cumulative}")
+            lines.append(f"{self.name}_sum{self._label_text(key)} {_format_value(observations[-2])}")
+            lines.append(f"{self.name}_count{self._label_text(key)} {observations[-1]}")
+        return lines
+
+    def snapshot(self) -> dict:
+        """Each combination of labels' count and sum, which is what a status page wants of a histogram."""
+        return {
+            ",".join(f"{label}={value}" for label, value in zip(self.labels, key, strict=True)): {
+                "count": observations[-1],
+                "sum": observations[-2],
+            }
+            for key, observations in self._observations.items()
+        }
+
+    def reset(self) -> None:
+        """Forget every observation."""
+        self._observations = {}
+
+
+class Registry:
+    """Every declared metric, in the order declared."""
+
+    def __init__(self) -> None:
+        """Start empty."""
+        self.metrics: dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> None:
+        """Add a metric. Names are unique."""
+        if metric.name in self.metrics:
+            msg = f"Metric {metric.name} is already registered"
+            raise ValueError(msg)
+        self.metrics[metric.name] = metric
+
+    def exposition(self) -> str:
+        """Every metric in the Prometheus text format, for /metrics."""
+        lines = []
+        for metric in self.metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type_name}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> dict[str, dict]:
+        """Every metric that has a value, as JSON-able data. See Metric.snapshot."""
+        return {name: values for name, metric in self.metrics.items() if (values := metric.snapshot())}
+
+    def reset(self) -> None:
+        """Forget every value, for a process that reports on one build at a time, like the Worker."""
+        for metric in self.metrics.values():
+            metric.reset()
+
+
+REGISTRY = Registry()
+
+FETCH_REQUESTS = Counter(
+    "aic_fetch_requests_total", "Inventory fetches, by origin and status class.", ("origin", "status_class")
+)
+FETCH_BYTES = Counter("aic_fetch_bytes_total", "Bytes of inventory fetched, by origin.", ("origin",))
+FETCH_SECONDS = Histogram("aic_fetch_duration_seconds", "Time to fetch one URL, by origin.", ("origin",))
+URL_CACHE = Counter(
+    "aic_url_cache_total", "Inventory URLs looked up in the URL cache, by hit, disk (read back) or miss.", ("result",)
+)
+URL_CACHE_BYTES = Gauge("aic_url_cache_bytes", "Approximate size of the URL cache's entries in memory.")
+URL_CACHE_EVICTIONS = Counter("aic_url_cache_evictions_total", "URL cache entries evicted from memory.")
+YAML_PARSE_SECONDS = Histogram("aic_yaml_parse_seconds", "Time to parse one fetched YAML file.")
+BUILD_PHASE_SECONDS = Histogram(
+    "aic_build_phase_seconds",
+    "Time spent in each phase of a CMDB build.",
+    ("phase",),
+    buckets=(*DEFAULT_BUCKETS, 30, 60),
+)
+BUILD_GENERATION = Gauge("aic_build_generation", "The generation of the last completed CMDB build.")
+
+
+def record_fetch(url: str, status: int | None, size: int, started: float) -> None:
+    """Record one fetch: its origin, status class (None for no response at all), size, and time since started.
+
+    started is a time.perf_counter() reading from just before the request.
+    """
+    origin = urlsplit(url).netloc
+    FETCH_REQUESTS.inc(origin, "error" if status is None else f"{status // 100}xx")
+    FETCH_BYTES.inc(origin, amount=size)
+    FETCH_SECONDS.observe(time.perf_counter() - started, origin)
@@ -0,0 +1,172 @@
+"""Opt-in profiling of builds and requests under cProfile and tracemalloc, saved to the instance path.
+
+For when a build gets slow and the question is where the time goes: the network, yaml.safe_load, the host and
+group loops or rendering. Three ways in, all off by default:
+
+- `AIC_PROFILE=build` profiles every build.
+- `AIC_PROFILE_REQUESTS=0.01` profiles that fraction of the app's requests.
+- `POST /admin/profile` profiles the next build, see routes.py. It and the download routes need
+  `Authorization: Bearer $AIC_ADMIN_TOKEN`, and don't exist without it.
+
+Each profile is saved under `<instance path>/profiles/` as `<name>.pstats`, for pstats or snakeviz, and
+`<name>.txt`, the functions with the most cumulative and own time, and the lines whose allocations during the
+profile were still holding the most memory at its end. Only the newest KEEP_PROFILES are kept. The Worker has no
+instance path, so never profiles.
+
+Off costs nothing measurable: a build checks a flag and an environment variable, and the request sampler is only
+installed when AIC_PROFILE_REQUESTS is set. cProfile and tracemalloc are imported on first use. Both are
+process-wide, and since Python 3.12 cProfile sees every thread, so a profile includes whatever else ran meanwhile,
+and only one runs at a time: a block that would overlap another runs unprofiled.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import os
+import random
+import re
+import threading
+from datetime import UTC, datetime
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from .logger import get_logger
+
+if TYPE_CHECKING:
+    import cProfile
+    import tracemalloc
+    from collections.abc import AsyncIterator, Awaitable, Callable
+
+    from fastapi import Request, Response
+
+logger = get_logger(__name__)
+
+PROFILE_ENV_VAR = "AIC_PROFILE"
+PROFILE_REQUESTS_ENV_VAR = "AIC_PROFILE_REQUESTS"
+ADMIN_TOKEN_ENV_VAR = "AIC_ADMIN_TOKEN"  # noqa: S105 The variable name, not a secret
+
+PROFILES_DIR = "profiles"
+KEEP_PROFILES = 20
+TOP_ENTRIES = 40  # Functions and allocation sites listed in each .txt report
+
+# What a profile is saved as, and all the download route will serve.
+PROFILE_FILE_RE = re.compile(r"[\w.-]+\.(pstats|txt)")
+
+_profiling = threading.Lock()  # Held while a profile runs
+_profile_next_build = False
+
+
+def profile_next_build() -> None:
+    """Profile the next build, once."""
+    global _profile_next_build  # noqa: PLW0603 One flag for the process, like cProfile itself
+    _profile_next_build = True
+
+
+def take_build_request() -> bool:
+    """Whether this build should be profiled. Clears a profile_next_build() request."""
+    global _profile_next_build  # noqa: PLW0603
+    wanted = _profile_next_build or os.environ.get(PROFILE_ENV_VAR) == "build"
+    _profile_next_build = False
+    return wanted
+
+
+def profiles_dir(instance_path: str) -> Path:
+    """Where profiles are saved."""
+    return Path(instance_path) / PROFILES_DIR
+
+
+@contextlib.asynccontextmanager
+async def profiled(instance_path: str | None, label: str) -> AsyncIterator[None]:
+    """Run the block under cProfile and tracemalloc, and save what they found as `<timestamp>-<label>`.
+
+    Runs it unprofiled if there's no instance path to save to, or another profile is running. Saved in a thread:
+    the snapshot, the stats and the writes take long enough that on the event loop they'd hold up every request.
+    """
+    if not instance_path or not _profiling.acquire(blocking=False):
+        yield
+        return
+
+    import cProfile  # noqa: PLC0415 Only loaded once something is profiled
+    import tracemalloc  # noqa: PLC0415
+
+    already_tracing = tracemalloc.is_tracing()  # Started with -X tracemalloc, say; leave it running
+    if not already_tracing:
+        tracemalloc.start()
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        try:
+            await asyncio.to_thread(
+                _finish, profiles_dir(instance_path), label, profiler, stop_tracing=not already_tracing
+            )
+        finally:
+            _profiling.release()  # Only now: the next profile can't start tracemalloc until this one has stopped it
+
+
+def _finish(directory: Path, label: str, profiler: cProfile.Profile, *, stop_tracing: bool) -> None:
+    """Take the memory snapshot, stop tracemalloc if the profile started it, and save the profile."""
+    import tracemalloc  # noqa: PLC0415
+
+    snapshot = tracemalloc.take_snapshot()
+    if stop_tracing:
+        tracemalloc.stop()
+    _save(directory, label, profiler, snapshot)
+
+
+def _save(directory: Path, label: str, profiler: cProfile.Profile, snapshot: tracemalloc.Snapshot) -> None:
+    """Write the .pstats and .txt for one profile, then drop all but the newest KEEP_PROFILES."""
+    import io  # noqa: PLC0415
+    import pstats  # noqa: PLC0415
+
+    directory.mkdir(parents=True, exist_ok=True)
+    name = f"{datetime.now(UTC):%Y%m%dT%H%M%S%fZ}-{re.sub(r'[^\w.]+', '-', label).strip('-')[:60]}"
+    profiler.dump_stats(directory / f"{name}.pstats")
+
+    report = io.StringIO()
+    stats = pstats.Stats(profiler, stream=report).strip_dirs()
+    for sort in ("cumulative", "tottime"):
+        report.write(f"==== Top {TOP_ENTRIES} functions by {sort} time\n")
+        stats.sort_stats(sort).print_stats(TOP_ENTRIES)
+    report.write(f"==== Top {TOP_ENTRIES} lines by memory they allocated that was still held at the end\n")
+    for statistic in snapshot.statistics("lineno")[:TOP_ENTRIES]:
+        report.write(f"{statistic}\n")
+    (directory / f"{name}.txt").write_text(report.getvalue())
+    logger.info("Saved profile %s to %s", name, directory)
+
+    for stale in list_profiles(str(directory.parent))[KEEP_PROFILES:]:
+        for path in directory.glob(f"{stale}.*"):
+            path.unlink()
+
+
+def list_profiles(instance_path: str) -> list[str]:
+    """The saved profiles' names, newest first. Each has a .pstats and a .txt."""
+    directory = profiles_dir(instance_path)
+    if not directory.is_dir():
+        return []
+    return sorted({path.stem for path in directory.glob("*.pstats")}, reverse=True)
+
+
+def profile_file(instance_path: str, filename: str) -> Path | None:
+    """A saved profile's .pstats or .txt, or None if filename isn't one. Never anything outside the directory."""
+    path = profiles_dir(instance_path) / filename
+    if not PROFILE_FILE_RE.fullmatch(filename) or not path.is_file():
+        return None
+    return path
+
+
+def request_sampler(
+    rate: float, instance_path: str
+) -> Callable[[Request, Callable[[Request], Awaitable[Response]]], Awaitable[Response]]:
+    """An HTTP middleware that profiles `rate` of requests, for FastAPI's app.middleware("http")."""
+
+    async def sample(request: Request, call_next: Callable[[Request], Awaitable[Response]]) -> Response:
+        if random.random() >= rate:  # noqa: S311 Sampling, not crypto
+            return await call_next(request)
+        async with profiled(instance_path, f"request-{request.method}-{request.url.path}"):
+            return await call_next(request)
+
+    return sample
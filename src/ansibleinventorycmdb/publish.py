@@ -0,0 +1,220 @@
+"""Publish the rendered site to a sink: a directory, an R2 or S3-compatible bucket, or a tar or zip archive.
+
+render_site is a generator, and what consumes it used to be a loop that wrote one object and then rendered the
+next, so rendering and I/O never overlapped. publish() hands objects to a fixed number of writer tasks through a
+bounded queue instead: rendering carries on while earlier objects are written, and when every writer is busy and
+the queue is full, rendering waits, so a slow sink can't make the whole site pile up in memory.
+
+A sink is written to by several writers at once, so its put() may be called concurrently. Each sink keeps its own
+tally of what it did, returned by close(), since "written" means something different to a bucket that skips
+unchanged objects than to an archive that writes everything.
+
+Objects are (key, body, Content-Type, Content-Encoding). A body is bytes, or for the exports an iterable of chunks,
+which the directory sink streams to disk and every other sink joins.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import io
+import sys
+import tarfile
+import time
+import zipfile
+from pathlib import Path
+from typing import TYPE_CHECKING, BinaryIO
+
+from .manifest import SiteWriter
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterable
+
+# A body is bytes, or for the exports chunks of them. The aliases are evaluated lazily, so Iterable needn't exist.
+type Body = bytes | Iterable[bytes]
+type SiteObject = tuple[str, Body, str, str]  # key, body, Content-Type, Content-Encoding
+
+# Objects being written at once. Enough to hide a bucket's per-request latency without tripping its rate limits.
+DEFAULT_CONCURRENCY = 8
+
+ARCHIVE_SUFFIXES = {".tar": "tar", ".tar.gz": "tar.gz", ".tgz": "tar.gz", ".zip": "zip"}
+
+
+def join_body(body: Body) -> bytes:
+    """A body as bytes, joining it if it came as chunks."""
+    return body if isinstance(body, bytes) else b"".join(body)
+
+
+class Sink:
+    """Somewhere to publish the site. Subclasses implement put, and open, close and abort where they need to."""
+
+    # Whether the sink wants its objects as content_encoded gives them: stored compressed, with a Content-Encoding.
+    content_encoded = False
+
+    async def open(self) -> None:
+        """Get ready to take objects."""
+
+    async def put(self, key: str, body: Body, content_type: str, content_encoding: str) -> None:
+        """Store one object. May be called by several writers at once."""
+        raise NotImplementedError
+
+    async def close(self) -> dict[str, int]:
+        """Finish publishing, once every object is stored. Returns counts of what was done, for the log."""
+        return {}
+
+    async def abort(self) -> None:
+        """Give up after a failure, leaving whatever was published before as it was, where the sink can."""
+
+
+async def publish(objects: Iterable[SiteObject], sink: Sink, concurrency: int = DEFAULT_CONCURRENCY) -> dict[str, int]:
+    """Write every object to the sink with up to `concurrency` writers, then close it. Returns the sink's counts.
+
+    The first object a writer fails on cancels the rest and aborts the sink, then raises.
+    """
+    concurrency = max(concurrency, 1)
+    queue: asyncio.Queue[SiteObject | None] = asyncio.Queue(maxsize=concurrency)
+
+    async def writer() -> None:
+        while (item := await queue.get()) is not None:
+            await sink.put(*item)
+
+    await sink.open()
+    try:
+        async with asyncio.TaskGroup() as group:
+            for _ in range(concurrency):
+                group.create_task(writer())
+            for item in objects:
+                await queue.put(item)  # Waits here while every writer is busy and the queue is full
+            for _ in range(concurrency):
+                await queue.put(None)
+    except BaseException:
+        await sink.abort()
+        raise
+    return await sink.close()
+
+
+class DirectorySink(Sink):
+    """A directory, written incrementally and published atomically by manifest.SiteWriter.
+
+    Files are written from worker threads, so disk I/O overlaps with rendering in this one.
+    """
+
+    def __init__(self, out_dir: Path, carry_over: Callable[[str], bool] | None = None) -> None:
+        """Publish to out_dir, which becomes a symlink to the new release.
+
+        With carry_over, the objects were only those that changed: every other object of the current release
+        that carry_over(key) approves is linked into the new one, see SiteWriter.carry_over.
+        """
+        self.writer = SiteWriter(out_dir)
+        self.carry_over = carry_over
+
+    async def open(self) -> None:
+        """Start the new release."""
+        self.writer.__enter__()
+
+    async def put(
+        self,
+        key: str,
+        body: Body,
+        content_type: str,  # noqa: ARG002 A directory has nowhere to keep metadata
+        content_encoding: str,  # noqa: ARG002
+    ) -> None:
+        """Write one file to the new release, in a thread."""
+        if isinstance(body, bytes):
+            await asyncio.to_thread(self.writer.write, key, body)
+        else:
+            await asyncio.to_thread(self.writer.write_chunks, key, body)
+
+    async def close(self) -> dict[str, int]:
+        """Publish the release."""
+        try:
+            if self.carry_over is not None:
+                await asyncio.to_thread(self.writer.carry_over, self.carry_over)
+            return self.writer.publish()
+        finally:
+            self.writer.__exit__(None, None, None)
+
+    async def abort(self) -> None:
+        """Remove the half-written release."""
+        self.writer.__exit__(None, None, None)
+
+
+class ArchiveSink(Sink):
+    """A tar, gzipped tar or zip archive, written to a file or to a stream such as stdout.
+
+    Written in stream mode, so the target needn't be seekable. Entries go in the order objects arrive, since put
+    never awaits and so each one completes before the next writer gets a turn.
+    """
+
+    def __init__(self, target: Path | BinaryIO, archive_format: str) -> None:
+        """Write an archive_format ("tar", "tar.gz" or "zip") archive to a path, or to an open binary stream."""
+        self.target = target
+        self.archive_format = archive_format
+        self.counts = {"written": 0}
+        self._file: BinaryIO | None = None
+        self._archive: tarfile.TarFile | zipfile.ZipFile | None = None
+        self._mtime = int(time.time())  # One timestamp for every entry
+
+    async def open(self) -> None:
+        """Open the archive."""
+        self._file = self.target.open("wb") if isinstance(self.target, Path) else self.target
+        if self.archive_format == "zip":
+            self._archive = zipfile.ZipFile(self._file, "w", compression=zipfile.ZIP_DEFLATED)
+        else:
+            mode = "w|gz" if self.archive_format == "tar.gz" else "w|"
+            self._archive = tarfile.open(fileobj=self._file, mode=mode)  # noqa: SIM115 Closed by close()
+
+    async def put(
+        self,
+        key: str,
+        body: Body,
+        content_type: str,  # noqa: ARG002 An archive entry has nowhere to keep metadata
+        content_encoding: str,  # noqa: ARG002
+    ) -> None:
+        """Add one entry."""
+        data = join_body(body)
+        if isinstance(self._archive, zipfile.ZipFile):
+            info = zipfile.ZipInfo(key, date_time=time.localtime(self._mtime)[:6])
+            info.compress_type = zipfile.ZIP_DEFLATED
+            self._archive.writestr(info, data)
+        elif self._archive is not None:
+            info = tarfile.TarInfo(key)
+            info.size = len(data)
+            info.mtime = self._mtime
+            self._archive.addfile(info, io.BytesIO(data))
+        self.counts["written"] += 1
+
+    async def close(self) -> dict[str, int]:
+        """Finish the archive, and close the file if this opened it."""
+        await self.abort()
+        return self.counts
+
+    async def abort(self) -> None:
+        """Close what's open. A partial archive is left behind: a stream can't take back what it sent."""
+        if self._archive is not None:
+            self._archive.close()
+            self._archive = None
+        if self._file is not None and isinstance(self.target, Path):
+            self._file.close()
+        self._file = None
+
+
+def sink_for(destination: str) -> Sink:
+    """The sink a CLI destination names.
+
+    `-` is a tar stream on stdout, a path ending .tar, .tar.gz, .tgz or .zip an archive, `s3://bucket/prefix` an
+    S3-compatible bucket (see s3.S3Bucket.from_env), and anything else a directory.
+    """
+    if destination == "-":
+        return ArchiveSink(sys.stdout.buffer, "tar")
+
+    if destination.startswith("s3://"):
+        from .bucket import BucketSink  # noqa: PLC0415 Only for the S3 destination
+        from .s3 import S3Bucket  # noqa: PLC0415
+
+        return BucketSink(S3Bucket.from_env(destination))
+
+    path = Path(destination)
+    for suffix, archive_format in ARCHIVE_SUFFIXES.items():
+        if path.name.endswith(suffix):
+            return ArchiveSink(path, archive_format)
+    return DirectorySink(path)
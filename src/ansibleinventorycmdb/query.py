@@ -0,0 +1,115 @@
+"""Filter an inventory's hosts on their vars, from a columnar index rather than a scan.
+
+For each var name the index holds the set of hosts that have it, and for each scalar value of it the set of hosts
+with that value. Built once per generation (see AnsibleCMDB.cached), so a query only intersects sets: `==` and
+existence clauses cost the size of the smallest set involved, not hosts times vars.
+
+A clause is one of:
+
+    os_family==Debian     the var equals this value
+    os_family!=Debian     the var is missing, or has some other value
+    backup_enabled        the var exists, whatever its value
+    !backup_enabled       the var doesn't exist
+
+Values compare as text, the way they'd be written in YAML: `port==22`, `enabled==true`, `x==null`. Only
+scalars can be matched on; a var holding a list or a dict still counts for existence.
+"""
+
+from __future__ import annotations
+
+# Tried before the bare `key` and `!key` forms, so `a!=b` isn't read as the negated var name `a!=b`.
+_OPERATORS = ("==", "!=")
+
+
+class QueryError(ValueError):
+    """A where clause that can't be parsed. The message is shown to the caller."""
+
+
+def canonical(value: object) -> str | None:
+    """A scalar as the text a clause would compare it to. None for a list or a dict, which has no such text."""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if value is None:
+        return "null"
+    if isinstance(value, (dict, list)):
+        return None
+    return str(value)
+
+
+def parse_clause(clause: str) -> tuple[str, str, str]:
+    """Split a where clause into (var name, operator, value). The operator is "==", "!=", "exists" or "missing"."""
+    for operator in _OPERATORS:
+        key, found, value = clause.partition(operator)
+        if found:
+            break
+    else:
+        key, operator, value = clause.removeprefix("!"), "missing" if clause.startswith("!") else "exists", ""
+
+    key = key.strip()
+    if not key:
+        msg = f"Can't parse where clause '{clause}', expected key==value, key!=value, key or !key"
+        raise QueryError(msg)
+    return key, operator, value.strip()
+
+
+class VarIndex:
+    """Per var name, the hosts that have it and the hosts with each of its scalar values."""
+
+    def __init__(self, hosts: dict) -> None:
+        """Index the hosts of one inventory, `{host: {"groups": [...], "vars": {...}}}`."""
+        self.hosts = hosts
+        self.position = {host: index for index, host in enumerate(hosts)}  # To hand matches back in order
+        self.has: dict[str, set[str]] = {}
+        self.values: dict[str, dict[str, set[str]]] = {}
+
+        for host, host_data in hosts.items():
+            for key, value in host_data["vars"].items():
+                self.has.setdefault(key, set()).add(host)
+                text = canonical(value)
+                if text is not None:
+                    self.values.setdefault(key, {}).setdefault(text, set()).add(host)
+
+    def _hosts_where(self, key: str, operator: str, value: str) -> tuple[set[str], bool]:
+        """The hosts a clause selects, and whether the clause includes (True) or excludes (False) them."""
+        if operator == "exists":
+            return self.has.get(key, set()), True
+        if operator == "missing":
+            return self.has.get(key, set()), False
+        equal = self.values.get(key, {}).get(value, set())
+        return equal, operator == "=="
+
+    def select(self, clauses: list[str]) -> list[str]:
+        """The hosts matching every clause, in inventory order.
+
+        Inclusive clauses are intersected smallest first, then exclusions subtracted. Only a query made of
+        nothing but exclusions has to start from every host.
+        """
+        include: list[set[str]] = []
+        exclude: list[set[str]] = []
+        for clause in clauses:
+            hosts, inclusive = self._hosts_where(*parse_clause(clause))
+            (include if inclusive else exclude).append(hosts)
+
+        if include:
+            include.sort(key=len)
+            matches = set(include[0])
+            for hosts in include[1:]:
+                matches &= hosts
+        else:
+            matches = set(self.hosts)
+
+        for hosts in exclude:
+            matches -= hosts
+
+        return sorted(matches, key=self.position.__getitem__)
+
+    def project(self, hosts: list[str], fields: list[str] | None) -> dict[str, dict]:
+        """Map each host to its vars, or only to the named ones when fields are given."""
+        if fields is None:
+            return {host: self.hosts[host]["vars"] for host in hosts}
+
+        projected = {}
+        for host in hosts:
+            host_vars = self.hosts[host]["vars"]
+            projected[host] = {field: host_vars[field] for field in fields if field in host_vars}
+        return projected
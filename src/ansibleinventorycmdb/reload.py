@@ -0,0 +1,93 @@
+"""Reload config.yml while the app runs, rebuilding only the inventories the change affects.
+
+A restart throws the built CMDB away and pays a full cold build for what is often one new inventory or a renamed
+column. Instead, watch_config runs beside the refresh task and checks the active config file, the first of
+config.get_config_paths() that exists, every CONFIG_POLL_SECONDS. Polled rather than watched through inotify or
+the like: one stat() every few seconds costs nothing, and needs no dependency. A change, or a different file taking
+precedence, is read and validated like the config at startup. If it doesn't validate, the app keeps running on the
+config it has and logs why.
+
+A valid config replaces app.state.config, which the routes read schema_mapping from per request, and
+AnsibleCMDB.reconfigure rebuilds the inventories that were added or point somewhere new. Logging config is read
+at startup only; changing it still needs a restart.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import os
+from typing import TYPE_CHECKING
+
+import yaml
+from pydantic import ValidationError
+
+from .config import get_config_paths, read_config
+from .logger import get_logger
+
+if TYPE_CHECKING:
+    from fastapi import FastAPI
+
+    from .config import Config
+
+logger = get_logger(__name__)
+
+CONFIG_POLL_SECONDS = 5.0
+
+
+def config_stamp(instance_path: str) -> tuple[str, int, int] | None:
+    """The active config file, with its mtime and size, so an edit or another file taking over reads as a change."""
+    for path in get_config_paths(instance_path):
+        with contextlib.suppress(FileNotFoundError, NotADirectoryError):
+            stat = os.stat(path)
+            return path, stat.st_mtime_ns, stat.st_size
+    return None
+
+
+async def apply_config(app: FastAPI, config: Config) -> None:
+    """Switch the app to a new, already validated, config."""
+    current: Config = app.state.config
+    if config.logging != current.logging:
+        logger.warning("The logging config changed, restart to apply it")
+
+    app.state.config = config
+    # Rendered from the old config, so dropped now, not once reconfigure() gets the CMDB from a refresh in progress
+    app.state.cmdb.config_changed()
+    if config.cmdb == current.cmdb:
+        logger.info("Config reloaded, no inventory changed")
+        return
+
+    rebuilt = await app.state.cmdb.reconfigure(config.cmdb)
+    logger.info("Config reloaded, rebuilt %s of %s inventories", len(rebuilt), len(config.cmdb))
+
+
+async def watch_config(app: FastAPI) -> None:
+    """Reload the config whenever its file changes, for the life of the app.
+
+    Runs as a background task, so it logs its own failures, and one failed reload doesn't stop the next.
+    """
+    instance_path: str = app.state.instance_path
+    seen = config_stamp(instance_path)
+    try:
+        while True:
+            await asyncio.sleep(CONFIG_POLL_SECONDS)
+            stamp = config_stamp(instance_path)
+            if stamp is None or stamp == seen:  # Unchanged, or gone: keep what's running
+                continue
+            seen = stamp
+
+            path = stamp[0]
+            try:
+                config = await asyncio.to_thread(read_config, path)
+            except (OSError, yaml.YAMLError, ValidationError) as exc:
+                logger.error("Not reloading the config from %s, keeping the running one: %s", path, exc)  # noqa: TRY400 The reason is the message, not the traceback
+                continue
+
+            logger.info("Config file changed, reloading: %s", path)
+            try:
+                await apply_config(app, config)
+            except Exception:
+                logger.exception("Applying the reloaded config failed")
+    except asyncio.CancelledError:
+        logger.info("Config watch cancelled")
+        raise
@@ -1,17 +1,49 @@
 """Routes, templates and the CMDB refresh loop."""
 
 import asyncio
+import hmac
+import json
+import os
+from collections.abc import Callable
 from http import HTTPStatus
 from typing import Annotated
 
-from fastapi import APIRouter, Depends, HTTPException, Request
-from fastapi.responses import HTMLResponse
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import FileResponse, HTMLResponse, StreamingResponse
 from fastapi.templating import Jinja2Templates
 
-from .cmdb import AnsibleCMDB
+from . import profiling
+from .cmdb import PHASE_PENDING, PHASE_READY, AnsibleCMDB
 from .constants import PROGRAM_REPO_URL, PROGRAM_VERSION, version_string
+from .encoding import compress, negotiate
+from .export import CSV_CONTENT_TYPE, NDJSON_CONTENT_TYPE, csv_fields, iter_csv, iter_ndjson
 from .logger import get_logger
-from .site import TEMPLATES_DIR, dump_vars, group_hosts, group_list
+from .metrics import EXPOSITION_CONTENT_TYPE, REGISTRY
+from .query import QueryError, VarIndex
+from .search import DEFAULT_RESULTS, SearchIndex
+from .site import (
+    HTML_CONTENT_TYPE,
+    JSON_CONTENT_TYPE,
+    TEMPLATES_DIR,
+    VAR_CONTENT_TYPE,
+    dump_ansible_inventory,
+    dump_group_json,
+    dump_host_json,
+    dump_inventory_json,
+    dump_var,
+    group_list,
+    vars_context,
+)
+from .table import (
+    DEFAULT_PER_PAGE,
+    HOST_COLUMN,
+    FilteredViews,
+    default_sort,
+    filter_text,
+    paginate,
+    query_string,
+    sort_index,
+)
 
 logger = get_logger(__name__)
 
@@ -68,6 +100,41 @@ CMDB = Annotated[AnsibleCMDB, Depends(get_cmdb)]
 CMDBJson = Annotated[AnsibleCMDB, Depends(get_cmdb_json)]
 
 
+def built_inventory(cmdb: AnsibleCMDB, inventory: str) -> dict:
+    """An inventory for the JSON routes, or the HTTPException saying why it can't be served.
+
+    Only once it's complete: unlike the pages, which say what's still loading, JSON served from a skeleton would
+    read as hosts that have no vars.
+    """
+    phase = cmdb.phase(inventory)
+    if phase is None:
+        raise HTTPException(HTTPStatus.NOT_FOUND, f"Inventory '{inventory}' not found")
+    if phase != PHASE_READY:
+        raise HTTPException(HTTPStatus.SERVICE_UNAVAILABLE, f"Inventory '{inventory}' not ready")
+    return cmdb.get_inventory(inventory)
+
+
+def render_page(template: str, context: dict) -> bytes:
+    """Render a template with the app's link style, as bytes for encoded_response."""
+    return templates.get_template(template).render(root_href=ROOT_HREF, page_suffix=PAGE_SUFFIX, **context).encode()
+
+
+def encoded_response(request: Request, cmdb: AnsibleCMDB, render: Callable[[], bytes], media_type: str) -> Response:
+    """Serve a built page or document, rendered and compressed once per CMDB generation.
+
+    Keyed on the path, so only call this for things that exist: a cache entry per made-up URL would let anyone
+    grow it without bound. Vary is set on every variant, compressed or not, or a shared cache would hand a gzip
+    body to a client that never asked for one.
+    """
+    variants = cmdb.cached(("response", request.url.path), lambda: compress(render()))
+    encoding = negotiate(request.headers.get("accept-encoding"), variants)
+
+    headers = {"Vary": "Accept-Encoding"}
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    return Response(variants[encoding], media_type=media_type, headers=headers)
+
+
 async def refresh_cmdb(cmdb: AnsibleCMDB) -> None:
     """Build the CMDB, then refresh it every REFRESH_INTERVAL_SECONDS.
 
@@ -96,123 +163,389 @@ async def refresh_cmdb(cmdb: AnsibleCMDB) -> None:
 
 
 @router.get("/", response_class=HTMLResponse)
-def home(request: Request, cmdb: CMDB) -> HTMLResponse:
+def home(request: Request, cmdb: CMDB) -> Response:
     """Home webpage, lists the inventories."""
-    return templates.TemplateResponse(
-        request,
-        "home.html.j2",
-        {
-            "inventories": cmdb.get_inventories(),
-            "root_href": ROOT_HREF,
-            "page_suffix": PAGE_SUFFIX,
-            "program_version": version_string(),
-            "program_repo_url": PROGRAM_REPO_URL,
-            "generated_at": cmdb.built_at,
-        },
-    )
+    context = {
+        "inventories": cmdb.get_inventories(),
+        "program_version": version_string(),
+        "program_repo_url": PROGRAM_REPO_URL,
+        "generated_at": cmdb.built_at,
+        "phases": cmdb.phases,
+    }
+    if not cmdb.complete():  # Still building, so nothing worth caching
+        return HTMLResponse(render_page("home.html.j2", context))
 
+    return encoded_response(request, cmdb, lambda: render_page("home.html.j2", context), HTML_CONTENT_TYPE)
 
-@router.get("/inventory/{inventory}", response_class=HTMLResponse)
-def inventory(request: Request, inventory: str, cmdb: CMDB) -> HTMLResponse:
-    """Table of every host in an inventory."""
-    if not cmdb.ready:
-        inventory_dict: dict = {"hosts": {}, "groups": {}}
-        schema_mapping = {"": "CMDB NOT LOADED, please wait a moment and refresh"}
-    else:
-        inventory_dict = cmdb.get_inventory(inventory)
-        if inventory_dict == {}:
-            msg = f"Inventory '{inventory}' not found"
-            raise HTMLError(msg, HTTPStatus.NOT_FOUND)
-        try:
-            schema_mapping = dict(request.app.state.config.cmdb[inventory].schema_mapping)
-        except KeyError:
-            msg = f"Inventory '{inventory}' found, but inventory schema not found"
-            raise HTMLError(msg, HTTPStatus.NOT_FOUND) from None
 
-    return templates.TemplateResponse(
-        request,
-        "inventory.html.j2",
-        {
+@router.get("/inventory/{inventory}", response_class=HTMLResponse)
+def inventory(  # noqa: PLR0913 The query parameters are the table's controls
+    request: Request,
+    inventory: str,
+    cmdb: CMDB,
+    *,
+    page: int = 1,
+    per_page: int = DEFAULT_PER_PAGE,
+    sort: str = "",
+    q: str = "",
+) -> Response:
+    """One page of the table of hosts in an inventory, sorted on any column and filtered by ?q=.
+
+    Sort orders, and the hosts recent filters matched, are built once per generation, so a request only slices
+    them. The default view, with no query string, is also cached rendered and compressed; any other view is
+    rendered per request, but only ever per_page rows of it. An inventory with only its skeleton built is served
+    as far as it goes, vars files still to come, and not cached.
+    """
+    if cmdb.phase(inventory) == PHASE_PENDING:
+        context = {
             "inventory_name": inventory,
-            "inventory_dict": inventory_dict,
-            "schema_mapping": schema_mapping,
-            "groups": group_list(inventory_dict),
-            "root_href": ROOT_HREF,
-            "page_suffix": PAGE_SUFFIX,
+            "schema_mapping": {"": "CMDB NOT LOADED, please wait a moment and refresh"},
+            "rows": [],
+            "groups": [],
+        }
+        return HTMLResponse(render_page("inventory.html.j2", context))
+
+    inventory_dict = cmdb.get_inventory(inventory)
+    if inventory_dict == {}:
+        msg = f"Inventory '{inventory}' not found"
+        raise HTMLError(msg, HTTPStatus.NOT_FOUND)
+    loading = cmdb.phase(inventory) != PHASE_READY
+    try:
+        schema_mapping = dict(request.app.state.config.cmdb[inventory].schema_mapping)
+    except KeyError:
+        msg = f"Inventory '{inventory}' found, but inventory schema not found"
+        raise HTMLError(msg, HTTPStatus.NOT_FOUND) from None
+
+    hosts: dict = inventory_dict.get("hosts", {})
+    sort = sort or default_sort(schema_mapping)
+    column = sort.removeprefix("-")
+    # Checked rather than sorted on regardless, since each column's order is cached for the generation.
+    if column and column != HOST_COLUMN and column not in schema_mapping:
+        msg = f"Can't sort on '{column}', it isn't a column of this inventory"
+        raise HTMLError(msg, HTTPStatus.BAD_REQUEST)
+
+    def ordered() -> list[str]:
+        order = sort_index(hosts, column) if column else list(hosts)
+        return order[::-1] if sort.startswith("-") else order
+
+    order = cmdb.cached(("sort", inventory, sort), ordered)
+    if q:
+        views = cmdb.cached(("filtered", inventory), lambda: FilteredViews(filter_text(hosts, schema_mapping)))
+        order = views.get(sort, q, order)
+
+    page, pages, per_page = paginate(len(order), page, per_page)
+    start = (page - 1) * per_page
+    rows = [(host, hosts[host]) for host in order[start : start + per_page]]
+
+    def sort_link(key: str) -> str:
+        """Sort on a column, or reverse it if the table is already sorted on it ascending."""
+        return query_string(f"-{key}" if sort == key else key, q, 1, per_page)
+
+    context = {
+        "inventory_name": inventory,
+        "schema_mapping": schema_mapping,
+        "rows": rows,
+        "groups": group_list(inventory_dict),
+        "host_column": HOST_COLUMN,
+        "loading": loading,
+        "table": {
+            "sort": sort,
+            "q": q,
+            "page": page,
+            "pages": pages,
+            "total": len(order),
+            "first": start + 1 if rows else 0,
+            "last": start + len(rows),
+            "prev": query_string(sort, q, page - 1, per_page) if page > 1 else "",
+            "next": query_string(sort, q, page + 1, per_page) if page < pages else "",
+            "sort_links": {key: sort_link(key) for key in [*schema_mapping, HOST_COLUMN]},
         },
-    )
+    }
+    if request.url.query or loading:  # Unbounded in number, or about to change, so not cached
+        return HTMLResponse(render_page("inventory.html.j2", context))
+
+    return encoded_response(request, cmdb, lambda: render_page("inventory.html.j2", context), HTML_CONTENT_TYPE)
 
 
 @router.get("/inventory/{inventory}/host/{host}", response_class=HTMLResponse)
-def host(request: Request, inventory: str, host: str, cmdb: CMDB) -> HTMLResponse:
-    """Page of a single host's vars."""
-    if not cmdb.ready:
-        host_nice_vars = "CMDB not ready, please wait a moment and refresh."
-    else:
-        host_vars = cmdb.get_host(inventory, host)
-        if "vars" not in host_vars:
-            msg = f"Host '{host}' not found"
-            raise HTMLError(msg, HTTPStatus.NOT_FOUND)
-
-        host_nice_vars = dump_vars(host_vars["vars"])
+def host(request: Request, inventory: str, host: str, cmdb: CMDB) -> Response:
+    """Page of a single host's vars. While its inventory is a skeleton, only the inline ones."""
+    context = {"__inventory": inventory, "__thing": "host_vars", "__host": host}
 
-    return templates.TemplateResponse(
-        request,
-        "vars.html.j2",
-        {
-            "__inventory": inventory,
-            "__thing": "host_vars",
-            "__host": host,
-            "__vars": host_nice_vars,
-            "root_href": ROOT_HREF,
-            "page_suffix": PAGE_SUFFIX,
-        },
-    )
+    if cmdb.phase(inventory) == PHASE_PENDING:
+        context["__vars"] = "CMDB not ready, please wait a moment and refresh."
+        return HTMLResponse(render_page("vars.html.j2", context))
+
+    host_vars = cmdb.get_host(inventory, host)
+    if "vars" not in host_vars:
+        msg = f"Host '{host}' not found"
+        raise HTMLError(msg, HTTPStatus.NOT_FOUND)
+
+    loading = cmdb.phase(inventory) != PHASE_READY
+
+    def render() -> bytes:
+        return render_page("vars.html.j2", {**context, **vars_context(host_vars["vars"]), "loading": loading})
+
+    if loading:  # About to change, so not cached
+        return HTMLResponse(render())
+
+    return encoded_response(request, cmdb, render, HTML_CONTENT_TYPE)
 
 
 @router.get("/inventory/{inventory}/group/{group}", response_class=HTMLResponse)
-def group(request: Request, inventory: str, group: str, cmdb: CMDB) -> HTMLResponse:
-    """Page of a single group's vars."""
-    if not cmdb.ready:
-        group_nice_vars = "CMDB not ready, please wait a moment and refresh."
-        status = HTTPStatus.TOO_EARLY
-    else:
-        group_nice_vars = dump_vars(cmdb.get_group(inventory, group))
-        status = HTTPStatus.OK
+def group(request: Request, inventory: str, group: str, cmdb: CMDB) -> Response:
+    """Page of a single group's vars. Empty, and saying so, while its inventory is a skeleton."""
+    context = {"__inventory": inventory, "__thing": "group_vars", "__host": group}
 
-    return templates.TemplateResponse(
-        request,
-        "vars.html.j2",
-        {
-            "__inventory": inventory,
-            "__thing": "group_vars",
-            "__host": group,
-            "__vars": group_nice_vars,
-            "root_href": ROOT_HREF,
-            "page_suffix": PAGE_SUFFIX,
-        },
-        status_code=status,
-    )
+    if cmdb.phase(inventory) == PHASE_PENDING:
+        context["__vars"] = "CMDB not ready, please wait a moment and refresh."
+        return HTMLResponse(render_page("vars.html.j2", context), status_code=HTTPStatus.TOO_EARLY)
+
+    group_vars = cmdb.get_group(inventory, group)
+    loading = cmdb.phase(inventory) != PHASE_READY
+
+    def render() -> bytes:
+        return render_page("vars.html.j2", {**context, **vars_context(group_vars), "loading": loading})
+
+    # An unknown group renders as an empty one, which is cheap and not worth a cache entry per made-up name. A
+    # group still loading is about to change.
+    if loading or group not in cmdb.get_inventory(inventory).get("groups", {}):
+        return HTMLResponse(render())
+
+    return encoded_response(request, cmdb, render, HTML_CONTENT_TYPE)
 
 
 @router.get("/inventory/{inventory}/group/{group}/json")
-def group_json(inventory: str, group: str, cmdb: CMDBJson) -> dict:
-    """Map hostnames to their vars for every host in a group."""
-    if not cmdb.ready:
-        raise HTTPException(HTTPStatus.SERVICE_UNAVAILABLE, "CMDB not ready")
+def group_json(request: Request, inventory: str, group: str, cmdb: CMDBJson) -> Response:
+    """Map hostnames to their vars for every host in a group.
 
-    inventory_dict = cmdb.get_inventory(inventory)
-    if inventory_dict == {}:
-        raise HTTPException(HTTPStatus.NOT_FOUND, f"Inventory '{inventory}' not found")
+    Like every JSON document here, serialised once per generation by site.py and served as those bytes, the same
+    ones the static site writes. Returning the dict would have FastAPI walk and re-encode it on every request.
+    """
+    inventory_dict = built_inventory(cmdb, inventory)
 
-    hosts = group_hosts(inventory_dict, group)
-    if hosts is None:
+    if group != "all" and group not in inventory_dict.get("groups", {}):
         raise HTTPException(HTTPStatus.NOT_FOUND, f"Group '{group}' not found")
 
-    return hosts
+    return encoded_response(request, cmdb, lambda: dump_group_json(inventory_dict, group) or b"{}", JSON_CONTENT_TYPE)
+
+
+@router.get("/inventory/{inventory}/json")
+def inventory_json(request: Request, inventory: str, cmdb: CMDBJson) -> Response:
+    """A whole inventory: its source URLs, every host's groups and vars, and every group's vars."""
+    inventory_dict = built_inventory(cmdb, inventory)
+
+    return encoded_response(request, cmdb, lambda: dump_inventory_json(inventory_dict), JSON_CONTENT_TYPE)
+
+
+@router.get("/inventory/{inventory}/ansible/json")
+def ansible_inventory(request: Request, inventory: str, cmdb: CMDBJson) -> Response:
+    """The inventory as Ansible dynamic inventory `--list` JSON, `_meta.hostvars` included.
+
+    Built and compressed once per generation, so any number of concurrent playbook runs polling it cost one
+    cached response each rather than a fetch of the whole inventory repo per controller.
+    """
+    inventory_dict = built_inventory(cmdb, inventory)
+
+    return encoded_response(request, cmdb, lambda: dump_ansible_inventory(inventory_dict), JSON_CONTENT_TYPE)
+
+
+@router.get("/inventory/{inventory}/host/{host}/json")
+def host_json(request: Request, inventory: str, host: str, cmdb: CMDBJson) -> Response:
+    """A single host's groups and vars."""
+    built_inventory(cmdb, inventory)  # For its 404 or 503
+    host_data = cmdb.get_host(inventory, host)
+    if "vars" not in host_data:
+        raise HTTPException(HTTPStatus.NOT_FOUND, f"Host '{host}' not found")
+
+    return encoded_response(request, cmdb, lambda: dump_host_json(host_data), JSON_CONTENT_TYPE)
+
+
+def var_response(request: Request, cmdb: AnsibleCMDB, inventory: str, var_dict: dict, var: str) -> Response:
+    """One var as YAML, or the HTTPException saying why it can't be served, for host_var and group_var.
+
+    Served from a skeleton on, as the pages that link it are, since those collapse oversized inline vars too. Not
+    cached until the inventory is ready, when the var may yet change.
+    """
+    phase = cmdb.phase(inventory)
+    if phase is None:
+        raise HTTPException(HTTPStatus.NOT_FOUND, f"Inventory '{inventory}' not found")
+    if phase == PHASE_PENDING:
+        raise HTTPException(HTTPStatus.SERVICE_UNAVAILABLE, f"Inventory '{inventory}' not ready")
+    if var not in var_dict:
+        raise HTTPException(HTTPStatus.NOT_FOUND, f"No var '{var}'")
+
+    if phase != PHASE_READY:
+        return Response(dump_var(var, var_dict[var]), media_type=VAR_CONTENT_TYPE)
+    return encoded_response(request, cmdb, lambda: dump_var(var, var_dict[var]), VAR_CONTENT_TYPE)
+
+
+@router.get("/inventory/{inventory}/host/{host}/var/{var}")
+def host_var(request: Request, inventory: str, host: str, var: str, cmdb: CMDBJson) -> Response:
+    """One of a host's vars, as YAML, for the host page to link when it's too large to show there."""
+    return var_response(request, cmdb, inventory, cmdb.get_host(inventory, host).get("vars", {}), var)
+
+
+@router.get("/inventory/{inventory}/group/{group}/var/{var}")
+def group_var(request: Request, inventory: str, group: str, var: str, cmdb: CMDBJson) -> Response:
+    """One of a group's vars, as YAML, as host_var."""
+    return var_response(request, cmdb, inventory, cmdb.get_group(inventory, group), var)
+
+
+@router.get("/inventory/{inventory}/changes")
+def changes(request: Request, inventory: str, since: int, cmdb: CMDBJson, epoch: str = "") -> Response:
+    """The hosts and groups added, removed or changed in an inventory after generation since, see changes.py.
+
+    Built once per generation for each span of diffs, however many pollers ask. The ETag names that span, so an up
+    to date poller sending If-None-Match gets a 304 with no body.
+    """
+    built_inventory(cmdb, inventory)  # For its 404 or 503
+    change_log = cmdb.changes
+    if change_log is None:
+        raise HTTPException(HTTPStatus.NOT_FOUND, "No change feed")
+
+    generation = cmdb.generation
+    span = change_log.span(inventory, since, generation, epoch)
+    etag = f'"{change_log.epoch}-{generation}-{"reset" if span is None else span}"'
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=HTTPStatus.NOT_MODIFIED, headers={"ETag": etag})
+
+    def render() -> bytes:
+        return json.dumps(change_log.changes(inventory, since, generation, epoch)).encode()
+
+    body = cmdb.cached(("changes", inventory, generation, span), render)
+    return Response(body, media_type=JSON_CONTENT_TYPE, headers={"ETag": etag})
+
+
+def _export_hosts(cmdb: AnsibleCMDB, inventory: str) -> dict:
+    """The hosts of an inventory to export, or the HTTPException saying why there aren't any."""
+    inventory_dict = built_inventory(cmdb, inventory)
+
+    # The dict this generation built. A refresh builds a new one rather than changing it, so a long download
+    # carries on from a consistent snapshot even if a build finishes part way through.
+    return inventory_dict.get("hosts", {})
+
+
+@router.get("/inventory/{inventory}/export.ndjson")
+def export_ndjson(inventory: str, cmdb: CMDBJson) -> StreamingResponse:
+    """Every host as a line of JSON, `{"host", "groups", "vars"}`, streamed as it is serialised."""
+    return StreamingResponse(iter_ndjson(_export_hosts(cmdb, inventory)), media_type=NDJSON_CONTENT_TYPE)
+
+
+@router.get("/inventory/{inventory}/export.csv")
+def export_csv(request: Request, inventory: str, cmdb: CMDBJson, fields: str = "") -> StreamingResponse:
+    """Every host as a CSV row, with the schema_mapping vars as columns, or the comma-separated ?fields=."""
+    hosts = _export_hosts(cmdb, inventory)
+    inventory_config = request.app.state.config.cmdb.get(inventory)
+    schema_mapping = dict(inventory_config.schema_mapping) if inventory_config else {}
+    return StreamingResponse(iter_csv(hosts, csv_fields(schema_mapping, fields)), media_type=CSV_CONTENT_TYPE)
+
+
+@router.get("/inventory/{inventory}/hosts")
+def hosts_query(
+    inventory: str,
+    cmdb: CMDBJson,
+    where: Annotated[list[str] | None, Query()] = None,
+    fields: str = "",
+) -> Response:
+    """Hosts whose vars match every ?where= clause, mapped to their vars, or to just the comma-separated ?fields=.
+
+    Answered from the generation's columnar VarIndex, see query.py for the clause syntax. Serialised directly,
+    since only the matching hosts and projected fields are in the result; not cached, as queries are unbounded.
+    """
+    inventory_dict = built_inventory(cmdb, inventory)
+
+    index = cmdb.cached(("var_index", inventory), lambda: VarIndex(inventory_dict.get("hosts", {})))
+    try:
+        hosts = index.select(where or [])
+    except QueryError as exc:
+        raise HTTPException(HTTPStatus.BAD_REQUEST, str(exc)) from None
+
+    projection = [field.strip() for field in fields.split(",") if field.strip()] if fields else None
+    body = json.dumps(index.project(hosts, projection), default=str).encode()
+    return Response(body, media_type=JSON_CONTENT_TYPE)
+
+
+def get_search_index(cmdb: AnsibleCMDB) -> SearchIndex:
+    """The generation's search index, built by whichever request needs it first."""
+    return cmdb.cached("search_index", lambda: SearchIndex(cmdb.get_inventories()))
+
+
+@router.get("/search")
+def search(q: str, cmdb: CMDBJson, limit: int = DEFAULT_RESULTS) -> dict:
+    """Hosts and groups whose name, var names or var values match every term of q, each by prefix."""
+    if not cmdb.complete():  # The index covers every inventory, and is only worth building once, for all of them
+        raise HTTPException(HTTPStatus.SERVICE_UNAVAILABLE, "CMDB not ready")
+
+    total, docs = get_search_index(cmdb).search(q, limit)
+    return {
+        "query": q,
+        "total": total,
+        "results": [
+            {**doc, "url": f"/inventory/{doc['inventory']}/{doc['type']}/{doc['name']}{PAGE_SUFFIX}"} for doc in docs
+        ],
+    }
+
+
+@router.get("/search/{key:path}")
+def search_shard(request: Request, key: str, cmdb: CMDBJson) -> Response:
+    """The search index as the static site's JSON shards, so static/search.js works against the app as well."""
+    if not cmdb.complete():
+        raise HTTPException(HTTPStatus.SERVICE_UNAVAILABLE, "CMDB not ready")
+
+    objects = cmdb.cached("search_shards", lambda: get_search_index(cmdb).shards())
+    if key not in objects:
+        raise HTTPException(HTTPStatus.NOT_FOUND, f"No search object '{key}'")
+
+    return encoded_response(request, cmdb, lambda: objects[key], JSON_CONTENT_TYPE)
 
 
 @router.get("/health")
-def health() -> dict:
-    """Health check endpoint."""
-    return {"version": PROGRAM_VERSION}
+def health(request: Request) -> dict:
+    """Health check endpoint, with the URL cache's size and evictions once there is a CMDB to have one."""
+    # Checked while the app starts too, before the CMDB is on app.state, and that's no reason to fail
+    cmdb: AnsibleCMDB | None = getattr(request.app.state, "cmdb", None)
+    if cmdb is None:
+        return {"version": PROGRAM_VERSION}
+    return {"version": PROGRAM_VERSION, "url_cache": cmdb.url_cache.stats()}
+
+
+@router.get("/metrics")
+def prometheus_metrics() -> Response:
+    """Fetch and build metrics in the Prometheus text format, see metrics.py."""
+    return Response(REGISTRY.exposition(), media_type=EXPOSITION_CONTENT_TYPE)
+
+
+def require_admin(request: Request) -> None:
+    """Let a request through only with `Authorization: Bearer $AIC_ADMIN_TOKEN`.
+
+    Fails closed, as the Worker's /refresh does: with no token configured the admin routes don't exist. Anything
+    else is the same 404 as a path that doesn't exist, so nothing hints they are there.
+    """
+    expected = os.environ.get(profiling.ADMIN_TOKEN_ENV_VAR)
+    presented = request.headers.get("authorization") or ""
+    if not expected or not hmac.compare_digest(presented.encode(), f"Bearer {expected}".encode()):
+        raise HTTPException(HTTPStatus.NOT_FOUND, "Not Found")
+
+
+@router.post("/admin/profile", dependencies=[Depends(require_admin)])
+def profile_build() -> dict:
+    """Profile the next build under cProfile and tracemalloc, see profiling.py."""
+    profiling.profile_next_build()
+    return {"profiling": "next build"}
+
+
+@router.get("/admin/profiles", dependencies=[Depends(require_admin)])
+def profiles(request: Request) -> dict:
+    """The saved profiles, newest first, each downloadable as .pstats and .txt."""
+    return {"profiles": profiling.list_profiles(request.app.state.instance_path)}
+
+
+@router.get("/admin/profiles/{filename}", dependencies=[Depends(require_admin)])
+def profile_download(request: Request, filename: str) -> FileResponse:
+    """Download one saved profile's .pstats or .txt."""
+    path = profiling.profile_file(request.app.state.instance_path, filename)
+    if path is None:
+        raise HTTPException(HTTPStatus.NOT_FOUND, f"Profile '{filename}' not found")
+    media_type = "text/plain; charset=utf-8" if path.suffix == ".txt" else "application/octet-stream"
+    return FileResponse(path, media_type=media_type, filename=filename)
@@ -0,0 +1,228 @@
+"""An S3-compatible bucket with the R2 binding's interface, so bucket.BucketSink can publish to one from the CLI.
+
+For R2 outside the Worker (through its S3 API), MinIO, AWS and the like. Requests are signed with AWS Signature
+Version 4 here rather than through boto3, which would be a large dependency for four calls. Path-style URLs
+(`<endpoint>/<bucket>/<key>`), which every S3-compatible store accepts.
+"""
+
+from __future__ import annotations
+
+import datetime as dt
+import hashlib
+import hmac
+import os
+from typing import Self
+from urllib.parse import quote, urlparse
+from xml.etree import ElementTree as ET
+
+import httpx
+
+# Configuration for `s3://` destinations, read from the environment so credentials stay off the command line.
+S3_ENDPOINT_ENV_VAR = "AIC_S3_ENDPOINT"
+S3_ACCESS_KEY_ENV_VAR = "AWS_ACCESS_KEY_ID"
+S3_SECRET_KEY_ENV_VAR = "AWS_SECRET_ACCESS_KEY"  # noqa: S105 The variable name, not a secret
+S3_REGION_ENV_VAR = "AWS_REGION"
+DEFAULT_REGION = "auto"  # What R2 expects; AWS needs the bucket's real region
+
+_SERVICE = "s3"
+_XMLNS = "{http://s3.amazonaws.com/doc/2006-03-01/}"
+
+
+def _hmac(key: bytes, message: str) -> bytes:
+    return hmac.new(key, message.encode(), hashlib.sha256).digest()
+
+
+class S3Object:
+    """A fetched object, with the R2 binding's text() for reading it."""
+
+    def __init__(self, body: bytes) -> None:
+        """Hold a fetched body."""
+        self.body = body
+
+    async def text(self) -> str:
+        """The body as text."""
+        return self.body.decode()
+
+
+class S3ListedObject:
+    """A key from a listing, as the R2 binding's list() has them."""
+
+    def __init__(self, key: str) -> None:
+        """Hold a listed key."""
+        self.key = key
+
+
+class S3Listing:
+    """A page of a bucket listing, shaped like the R2 binding's: objects, and a cursor to the next if truncated."""
+
+    def __init__(self, keys: list[str], cursor: str | None) -> None:
+        """Hold a page of keys, and the continuation token for the next page if there is one."""
+        self.objects = [S3ListedObject(key) for key in keys]
+        self.truncated = cursor is not None
+        self.cursor = cursor
+
+
+class S3Bucket:
+    """One bucket on an S3-compatible endpoint, optionally under a key prefix. Async, like the R2 binding."""
+
+    def __init__(  # noqa: PLR0913 Each is a separate piece of S3 configuration
+        self,
+        endpoint: str,
+        bucket: str,
+        access_key: str,
+        secret_key: str,
+        *,
+        region: str = DEFAULT_REGION,
+        prefix: str = "",
+        client: httpx.AsyncClient | None = None,
+    ) -> None:
+        """Address a bucket. Every key is stored under prefix. Without a client, it makes one, closed by aclose()."""
+        self.endpoint = endpoint.rstrip("/")
+        self.bucket = bucket
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.region = region
+        self.prefix = prefix
+        self._owns_client = client is None
+        self.client = client or httpx.AsyncClient(timeout=60)
+
+    async def aclose(self) -> None:
+        """Close the HTTP client, if this made it. One passed in is the caller's to close."""
+        if self._owns_client:
+            await self.client.aclose()
+
+    @classmethod
+    def from_env(cls, url: str) -> Self:
+        """The bucket an `s3://bucket/prefix` URL names, with the endpoint and credentials from the environment."""
+        parsed = urlparse(url)
+        try:
+            endpoint = os.environ[S3_ENDPOINT_ENV_VAR]
+            access_key = os.environ[S3_ACCESS_KEY_ENV_VAR]
+            secret_key = os.environ[S3_SECRET_KEY_ENV_VAR]
+        except KeyError as exc:
+            msg = f"{exc.args[0]} must be set to publish to {url}"
+            raise ValueError(msg) from None
+
+        prefix = parsed.path.strip("/")
+        return cls(
+            endpoint,
+            parsed.netloc,
+            access_key,
+            secret_key,
+            region=os.environ.get(S3_REGION_ENV_VAR, DEFAULT_REGION),
+            prefix=f"{prefix}/" if prefix else "",
+        )
+
+    def _url_path(self, key: str) -> str:
+        return quote(f"/{self.bucket}/{self.prefix}{key}", safe="/~")
+
+    def _signed_headers(  # noqa: PLR0913 Each is a separate part of the request
+        self,
+        method: str,
+        path: str,
+        body: bytes,
+        headers: dict[str, str],
+        *,
+        now: dt.datetime | None = None,
+        query: str = "",
+    ) -> dict[str, str]:
+        """The headers plus the ones Signature Version 4 adds: x-amz-date, x-amz-content-sha256 and Authorization."""
+        now = now or dt.datetime.now(dt.UTC)
+        amz_date = now.strftime("%Y%m%dT%H%M%SZ")
+        scope = f"{now:%Y%m%d}/{self.region}/{_SERVICE}/aws4_request"
+
+        signed = {
+            **{name.lower(): value.strip() for name, value in headers.items()},
+            "host": urlparse(self.endpoint).netloc,
+            "x-amz-content-sha256": hashlib.sha256(body).hexdigest(),
+            "x-amz-date": amz_date,
+        }
+        names = sorted(signed)
+        canonical_request = "\n".join(
+            [
+                method,
+                path,
+                query,
+                *(f"{name}:{signed[name]}" for name in names),
+                "",
+                ";".join(names),
+                signed["x-amz-content-sha256"],
+            ]
+        )
+        string_to_sign = "\n".join(
+            ["AWS4-HMAC-SHA256", amz_date, scope, hashlib.sha256(canonical_request.encode()).hexdigest()]
+        )
+
+        key = f"AWS4{self.secret_key}".encode()
+        for part in (f"{now:%Y%m%d}", self.region, _SERVICE, "aws4_request"):
+            key = _hmac(key, part)
+        signature = hmac.new(key, string_to_sign.encode(), hashlib.sha256).hexdigest()
+
+        signed["authorization"] = (
+            f"AWS4-HMAC-SHA256 Credential={self.access_key}/{scope}, "
+            f"SignedHeaders={';'.join(names)}, Signature={signature}"
+        )
+        del signed["host"]  # httpx sets it, from the same URL
+        return signed
+
+    async def _request(
+        self,
+        method: str,
+        path: str,
+        body: bytes = b"",
+        headers: dict[str, str] | None = None,
+        params: dict[str, str] | None = None,
+    ) -> httpx.Response:
+        """Send a signed request for path, which is already URL-encoded, with params as its query string."""
+        # Encoded and sorted here, as the signature needs it, and sent exactly as signed.
+        query = "&".join(
+            f"{quote(name, safe='-_.~')}={quote(value, safe='-_.~')}" for name, value in sorted((params or {}).items())
+        )
+        return await self.client.request(
+            method,
+            f"{self.endpoint}{path}{'?' if query else ''}{query}",
+            content=body,
+            headers=self._signed_headers(method, path, body, headers or {}, query=query),
+        )
+
+    async def get(self, key: str) -> S3Object | None:
+        """The object at key, or None if there isn't one."""
+        response = await self._request("GET", self._url_path(key))
+        if response.status_code == httpx.codes.NOT_FOUND:
+            return None
+        response.raise_for_status()
+        return S3Object(response.content)
+
+    async def put(self, key: str, body: bytes, httpMetadata: dict[str, str] | None = None) -> None:  # noqa: N803 Named as in the R2 binding
+        """Store an object, with the Content-Type and Content-Encoding from httpMetadata."""
+        metadata = httpMetadata or {}
+        headers = {}
+        if "contentType" in metadata:
+            headers["Content-Type"] = metadata["contentType"]
+        if "contentEncoding" in metadata:
+            headers["Content-Encoding"] = metadata["contentEncoding"]
+        response = await self._request("PUT", self._url_path(key), body, headers)
+        response.raise_for_status()
+
+    async def delete(self, keys: str | list[str]) -> None:
+        """Delete one key, or each of a list of them. Deleting a key that isn't there is not an error."""
+        for key in [keys] if isinstance(keys, str) else keys:
+            response = await self._request("DELETE", self._url_path(key))
+            if response.status_code != httpx.codes.NOT_FOUND:
+                response.raise_for_status()
+
+    async def list(self, cursor: str | None = None) -> S3Listing:
+        """A page of the keys under the prefix, without it, from cursor on. ListObjectsV2, so up to 1000 of them."""
+        params = {"list-type": "2", "prefix": self.prefix}
+        if cursor is not None:
+            params["continuation-token"] = cursor
+        response = await self._request("GET", quote(f"/{self.bucket}/"), params=params)
+        response.raise_for_status()
+
+        root = ET.fromstring(response.content)  # noqa: S314 From the configured endpoint, over the signed request
+        keys = [element.text or "" for element in root.iter(f"{_XMLNS}Key")]
+        truncated = root.findtext(f"{_XMLNS}IsTruncated") == "true"
+        return S3Listing(
+            [key.removeprefix(self.prefix) for key in keys],
+            root.findtext(f"{_XMLNS}NextContinuationToken") if truncated else None,
+        )
@@ -0,0 +1,129 @@
+"""Full-text search over the hosts and groups of every inventory, their var names and their values.
+
+An inverted index, built once per generation: every token maps to the documents (hosts and groups) it appears
+in. The vocabulary is kept sorted, so a search term matches every token it is a prefix of with two bisects,
+which is what lets a partial IP ("10.0.1") or hostname ("web0") find something.
+
+The app queries it in memory. The static site gets it as JSON shards, split on each token's first two
+characters, so static/search.js only downloads the shard a term falls in rather than the whole index.
+"""
+
+from __future__ import annotations
+
+import bisect
+import json
+import re
+
+MAX_RESULTS = 500
+DEFAULT_RESULTS = 50
+
+# Anything that isn't a letter or a digit separates the parts of a token: the labels of a hostname, the octets
+# of an IP, the words of a var name. Plus the leading and trailing punctuation stripped from a whole word.
+_SEPARATORS = re.compile(r"[\W_]+")
+_STRIP = "\"'`,;:()[]{}<>"
+
+# Sorts after every character a token can contain, for the upper bound of a prefix range.
+_MAX_CHAR = "\U0010ffff"
+
+
+def tokenize(text: str) -> set[str]:
+    """The tokens of a name or value: each whole word, its parts, and, for dotted names, every dotted suffix.
+
+    So `web01.prod.example.com` is findable as itself, as `web01` or `prod`, and as `example.com`; `10.0.1.5/24`
+    as itself and, by prefix, as `10.0.1`.
+    """
+    tokens: set[str] = set()
+    for word in text.lower().split():
+        whole = word.strip(_STRIP)
+        if not whole:
+            continue
+        tokens.add(whole)
+        tokens.update(part for part in _SEPARATORS.split(whole) if part)
+
+        labels = whole.split(".")
+        tokens.update(".".join(labels[index:]) for index in range(1, len(labels)) if all(labels[index:]))
+    return tokens
+
+
+def _scalars(value: object) -> list[str]:
+    """Every scalar in a var's value, nested dicts and lists included, as text. Dict keys count too."""
+    if isinstance(value, dict):
+        return [text for key, item in value.items() for text in [str(key), *_scalars(item)]]
+    if isinstance(value, list):
+        return [text for item in value for text in _scalars(item)]
+    return [] if value is None else [str(value)]
+
+
+def shard_name(token: str) -> str:
+    """The shard a token is stored in: its first two characters, hex encoded so any character is a safe key."""
+    return token[:2].encode().hex()
+
+
+class SearchIndex:
+    """Token -> document index over every host and group of every inventory."""
+
+    def __init__(self, inventories: dict) -> None:
+        """Index AnsibleCMDB.inventories. A document is `{"type", "inventory", "name"}`; its id its list index."""
+        self.docs: list[dict[str, str]] = []
+        postings: dict[str, list[int]] = {}
+
+        def add(doc_type: str, inventory: str, name: str, var_dict: dict) -> None:
+            doc_id = len(self.docs)
+            self.docs.append({"type": doc_type, "inventory": inventory, "name": name})
+            tokens = tokenize(name)
+            for key, value in var_dict.items():
+                tokens |= tokenize(str(key))
+                for text in _scalars(value):
+                    tokens |= tokenize(text)
+            for token in tokens:
+                postings.setdefault(token, []).append(doc_id)
+
+        for inventory, inventory_dict in inventories.items():
+            for host, host_data in inventory_dict.get("hosts", {}).items():
+                add("host", inventory, host, host_data["vars"])
+            for group, group_vars in inventory_dict.get("groups", {}).items():
+                add("group", inventory, group, group_vars)
+
+        # Doc ids are appended in increasing order, so every posting list is already sorted.
+        self.tokens = sorted(postings)
+        self.postings = [postings[token] for token in self.tokens]
+
+    def _matching(self, term: str) -> set[int]:
+        """Every document with a token that starts with term."""
+        start = bisect.bisect_left(self.tokens, term)
+        end = bisect.bisect_left(self.tokens, term + _MAX_CHAR, lo=start)
+        return {doc_id for posting in self.postings[start:end] for doc_id in posting}
+
+    def search(self, query: str, limit: int = DEFAULT_RESULTS) -> tuple[int, list[dict[str, str]]]:
+        """Documents matching every term of a query, by prefix. Returns (total matches, the first `limit`)."""
+        terms = sorted({word.strip(_STRIP) for word in query.lower().split()} - {""}, key=len, reverse=True)
+        if not terms:
+            return 0, []
+
+        # Longest term first, since it usually matches least and so makes every intersection after it cheaper.
+        matches = self._matching(terms[0])
+        for term in terms[1:]:
+            if not matches:
+                break
+            matches &= self._matching(term)
+
+        limit = min(max(limit, 0), MAX_RESULTS)
+        return len(matches), [self.docs[doc_id] for doc_id in sorted(matches)[:limit]]
+
+    def shards(self) -> dict[str, bytes]:
+        """The index as JSON objects for a static host: `index.json`, `docs.json`, and one `shard/<name>.json` each.
+
+        index.json lists the shards that exist, so the client can tell an empty one from a missing one, and find
+        every shard a one-character term spans.
+        """
+        by_shard: dict[str, dict[str, list[int]]] = {}
+        for token, posting in zip(self.tokens, self.postings, strict=True):
+            by_shard.setdefault(shard_name(token), {})[token] = posting
+
+        objects = {
+            "index.json": json.dumps({"shards": sorted(by_shard)}).encode(),
+            "docs.json": json.dumps([[doc["type"], doc["inventory"], doc["name"]] for doc in self.docs]).encode(),
+        }
+        for name, tokens in sorted(by_shard.items()):
+            objects[f"shard/{name}.json"] = json.dumps(tokens, separators=(",", ":")).encode()
+        return objects
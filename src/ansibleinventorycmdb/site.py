@@ -10,29 +10,58 @@ serves the same links the web app does. The one exception is `/`, which no objec
 
 from __future__ import annotations
 
+import argparse
+import asyncio
+import collections
+import contextlib
+import functools
+import hashlib
+import itertools
 import json
-import sys
+import os
+import re
 from pathlib import Path
 from typing import TYPE_CHECKING
 
-import yaml
-from jinja2 import Environment, FileSystemLoader
-
+from .changes import changed
 from .constants import PROGRAM_REPO_URL, version_string
+from .encoding import gzip_compress, is_compressible
+from .export import export_objects
 from .logger import get_logger
+from .publish import DEFAULT_CONCURRENCY, DirectorySink, publish, sink_for
+from .search import SearchIndex
 
 if TYPE_CHECKING:
-    from collections.abc import Iterator
+    from collections.abc import Awaitable, Callable, Collection, Iterable, Iterator
+
+    import yaml
+    from jinja2 import Environment
 
+    from .cmdb import AnsibleCMDB
     from .config import Inventory
+    from .publish import SiteObject
 
 logger = get_logger(__name__)
 
 TEMPLATES_DIR = Path(__file__).parent / "templates"
+# Templates compiled to Python modules by bundle.py, one set per template_key().
+COMPILED_TEMPLATES_DIR = Path(__file__).parent / "compiled_templates"
 STATIC_DIR = Path(__file__).parent / "static"
 
 HTML_CONTENT_TYPE = "text/html; charset=utf-8"
 JSON_CONTENT_TYPE = "application/json"
+GZIP_CONTENT_TYPE = "application/gzip"
+
+# A var's page shows it inline only up to these, and otherwise collapses it and links it on its own at
+# .../var/<name>, see collapsed_vars(). A certificate or a long rule list would otherwise make the page megabytes,
+# and dumping it as YAML is most of what rendering a page costs. Sizes are of the var's JSON, measured in C and
+# close enough to its YAML's.
+VAR_INLINE_BYTES = 8 * 1024  # Any var larger than this
+PAGE_VARS_BYTES = 64 * 1024  # All the vars shown on one page: the largest are collapsed until they fit
+VAR_CONTENT_TYPE = "text/plain; charset=utf-8"  # YAML, shown in the browser rather than downloaded
+# Only a var named as Ansible allows is collapsed: its name goes into an object key and a URL as it is. Anything
+# else, "../x" or a YAML int key say, is shown inline however large.
+LINKABLE_VAR_NAME = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
 
 # Only the extensions that actually live in static/. stdlib mimetypes doesn't know woff2 or webmanifest.
 CONTENT_TYPES = {
@@ -51,7 +80,46 @@ CONTENT_TYPES = {
 STATIC_ROOT_HREF = "/index.html"
 STATIC_PAGE_SUFFIX = "/index.html"
 
-_env = Environment(loader=FileSystemLoader(TEMPLATES_DIR), autoescape=True)
+# Hosts per task when rendering across processes. Small enough to keep every process busy to the end, big enough
+# that sending a task and its results back costs little next to rendering it.
+RENDER_CHUNK_HOSTS = 250
+# Tasks in flight per process. Each holds its rendered objects until they're taken, so this bounds how much of the
+# site sits in memory ahead of a slow sink, while keeping a task queued for every process as one finishes.
+RENDER_TASKS_PER_JOB = 2
+
+# Seconds between rebuilds of `ansibleinventorycmdb-generate --watch`.
+WATCH_INTERVAL_SECONDS = 300
+
+
+def template_key() -> str:
+    """Identifies the templates as they are now, and the Jinja2 that would compile them.
+
+    Names a set of compiled templates. Compiled code is only valid for the Jinja2 version that wrote it, and only
+    current for the sources it was compiled from, so a set under any other key is never loaded.
+    """
+    import jinja2  # noqa: PLC0415 Deferred with the rest of Jinja2, see _environment
+
+    digest = hashlib.sha256(jinja2.__version__.encode())
+    for path in sorted(TEMPLATES_DIR.glob("*.j2")):
+        digest.update(b"\0" + path.name.encode() + b"\0" + path.read_bytes())
+    return digest.hexdigest()[:16]
+
+
+@functools.cache
+def _environment() -> Environment:
+    """The Jinja2 environment for the static site, built on the first render rather than at import.
+
+    Loads the templates bundle.py precompiled when there is a set for template_key(), since compiling them from
+    source is most of a first render and a Worker pays for that on every cold start. Otherwise compiles from
+    source, as the app and a CLI run from a checkout normally do.
+    """
+    from jinja2 import Environment, FileSystemLoader, ModuleLoader  # noqa: PLC0415 Not needed until a render
+
+    compiled = COMPILED_TEMPLATES_DIR / template_key()
+    if compiled.is_dir():
+        logger.debug("Loading precompiled templates from %s", compiled)
+        return Environment(loader=ModuleLoader(compiled), autoescape=True)
+    return Environment(loader=FileSystemLoader(TEMPLATES_DIR), autoescape=True)
 
 
 def str_presenter(dumper: yaml.representer.SafeRepresenter, data: str) -> yaml.nodes.ScalarNode:
@@ -61,19 +129,76 @@ def str_presenter(dumper: yaml.representer.SafeRepresenter, data: str) -> yaml.n
     return dumper.represent_scalar("tag:yaml.org,2002:str", data)
 
 
-yaml.add_representer(str, str_presenter)
-yaml.representer.SafeRepresenter.add_representer(str, str_presenter)  # Use with safe
+@functools.cache
+def _vars_dumper() -> type[yaml.SafeDumper]:
+    """The dumper for dump_vars, which writes multi-line strings with str_presenter. Built on first use.
+
+    A subclass with its own representer, rather than yaml.add_representer at import, which needed PyYAML loaded
+    just to import this module, and changed how every other yaml.dump in the process wrote strings.
+    """
+    import yaml  # noqa: PLC0415 Not needed until a page is rendered
+
+    class VarsDumper(yaml.SafeDumper):
+        pass
+
+    VarsDumper.add_representer(str, str_presenter)
+    return VarsDumper
 
 
 def dump_vars(var_dict: dict) -> str:
     """Dump vars as yaml, alphabetically, with an empty dict rendering as just '---'."""
+    import yaml  # noqa: PLC0415 See _vars_dumper
+
     alphabetical_var_dict = dict(sorted(var_dict.items(), key=lambda item: str(item[0])))
-    nice_vars = yaml.dump(alphabetical_var_dict, explicit_start=True, default_flow_style=False, width=1000)
+    nice_vars = yaml.dump(
+        alphabetical_var_dict, Dumper=_vars_dumper(), explicit_start=True, default_flow_style=False, width=1000
+    )
     if nice_vars.strip() == "--- {}":
         nice_vars = "---"
     return nice_vars
 
 
+def collapsed_vars(var_dict: dict) -> dict[str, int]:
+    """The vars too large to show on their page, see VAR_INLINE_BYTES, by name, with their sizes."""
+    sizes = {
+        var: len(json.dumps(value, default=str, skipkeys=True))
+        for var, value in var_dict.items()
+        if isinstance(var, str) and LINKABLE_VAR_NAME.fullmatch(var)
+    }
+    collapsed = {var: size for var, size in sizes.items() if size > VAR_INLINE_BYTES}
+    shown = sum(sizes.values()) - sum(collapsed.values())  # Of the linkable vars, the others can't be collapsed
+    for var, size in sorted(sizes.items(), key=lambda item: item[1], reverse=True):
+        if shown <= PAGE_VARS_BYTES:
+            break
+        if var not in collapsed:
+            collapsed[var] = size
+            shown -= size
+    return collapsed
+
+
+def _kib(size: int) -> str:
+    """A size in bytes, for a person: '12.3 KiB'."""
+    return f"{size / 1024:.1f} KiB"
+
+
+def vars_context(var_dict: dict) -> dict:
+    """What vars.html.j2 shows of a host's or group's vars: their YAML, oversized ones collapsed, and links to those."""
+    collapsed = collapsed_vars(var_dict)
+    shown = {
+        var: f"(too large to show here, {_kib(collapsed[var])}, linked below)" if var in collapsed else value
+        for var, value in var_dict.items()
+    }
+    return {
+        "__vars": dump_vars(shown),
+        "large_vars": {var: _kib(size) for var, size in sorted(collapsed.items())},
+    }
+
+
+def dump_var(var: str, value: object) -> bytes:
+    """One var on its own, as collapsed_vars links it: as YAML, the way its page would have shown it."""
+    return dump_vars({var: value}).encode()
+
+
 def group_list(inventory_dict: dict) -> list[str]:
     """List an inventory's groups, 'all' first. Empty when the inventory has no hosts."""
     if not inventory_dict.get("hosts"):
@@ -100,14 +225,72 @@ def group_hosts(inventory_dict: dict, group: str) -> dict | None:
     return hosts
 
 
+def _dump_json(document: object) -> bytes:
+    """Serialise a JSON document the one way both the app and the static site do.
+
+    The app serves these bytes as they are, rather than have FastAPI re-encode a dict per request, so the static
+    object and the route's response are byte for byte the same. str() is for the dates and timestamps
+    yaml.safe_load turns unquoted ones into, which json can't represent.
+    """
+    return json.dumps(document, indent=2, default=str).encode()
+
+
+def dump_group_json(inventory_dict: dict, group: str) -> bytes | None:
+    """A group's hosts and their vars as a JSON document. None means the group doesn't exist."""
+    hosts = group_hosts(inventory_dict, group)
+    if hosts is None:
+        return None
+    return _dump_json(hosts)
+
+
+def dump_host_json(host_data: dict) -> bytes:
+    """A host's groups and vars as a JSON document, `{"groups": [...], "vars": {...}}`."""
+    return _dump_json({"groups": host_data.get("groups", []), "vars": host_data["vars"]})
+
+
+def dump_inventory_json(inventory_dict: dict) -> bytes:
+    """A whole inventory as a JSON document: its source URLs, every host and every group's vars."""
+    return _dump_json({key: inventory_dict.get(key, {}) for key in ("url", "base_url", "hosts", "groups")})
+
+
+def dump_ansible_inventory(inventory_dict: dict) -> bytes:
+    """The inventory in Ansible's dynamic inventory `--list` format, so a playbook run can use it directly.
+
+    Every group with its hosts and vars, `all` with every other group as a child, and each host's vars under
+    `_meta.hostvars`, which stops Ansible calling the script again with `--host` once per host. Host vars are the
+    merged host_vars files and inline vars; Ansible applies the group vars itself, as it would from the repo.
+    """
+    hosts: dict = inventory_dict.get("hosts", {})
+    groups: dict = inventory_dict.get("groups", {})
+
+    members: dict[str, list[str]] = {group: [] for group in groups}
+    for host, host_data in hosts.items():
+        for group in host_data.get("groups", []):
+            members.setdefault(group, []).append(host)
+
+    document: dict = {"_meta": {"hostvars": {host: host_data["vars"] for host, host_data in hosts.items()}}}
+    for group, group_hosts_list in members.items():
+        document[group] = {"hosts": group_hosts_list, "vars": groups.get(group, {})}
+
+    document.setdefault("all", {"hosts": [], "vars": {}})
+    document["all"]["children"] = [group for group in members if group != "all"]
+    return _dump_json(document)
+
+
 def _render(template: str, context: dict) -> bytes:
     """Render a template with the static site's link style."""
-    template_obj = _env.get_template(template)
+    template_obj = _environment().get_template(template)
     return template_obj.render(root_href=STATIC_ROOT_HREF, page_suffix=STATIC_PAGE_SUFFIX, **context).encode()
 
 
-def render_site(
-    inventories: dict, cmdb_config: dict[str, Inventory], built_at: str
+def render_site(  # noqa: PLR0913 All but the first three are opt-in switches
+    inventories: dict,
+    cmdb_config: dict[str, Inventory],
+    built_at: str,
+    *,
+    gzip_siblings: bool = False,
+    jobs: int = 1,
+    changes: dict[str, dict] | None = None,
 ) -> Iterator[tuple[str, bytes, str]]:
     """Yield (object key, body, content type) for every page and static asset of the CMDB.
 
@@ -116,23 +299,77 @@ def render_site(
         cmdb_config: Config.cmdb, for each inventory's schema_mapping.
         built_at: AnsibleCMDB.built_at, shown in the footer. Passed in rather than read from the clock here,
             so it is the time the data was built rather than the time this render happened to run.
+        gzip_siblings: Also yield `<key>.gz` after every compressible object, for a web server that serves
+            pre-compressed files itself (nginx's gzip_static, Caddy's precompressed). Compressed here, once per
+            build, rather than by the web server on every request.
+        jobs: Render in this many processes. Host pages are rendered in chunks of RENDER_CHUNK_HOSTS, and the
+            output is identical to a render in one process, in the same order. Not for the Worker, which
+            can't start processes.
+        changes: Only render what these changes affect, as ChangeLog.changes() answers by inventory, for a
+            release that carries everything else over from the last one. See _render_changes.
     """
-    yield (
-        "index.html",
-        _render(
-            "home.html.j2",
-            {
-                "inventories": inventories,
-                "program_version": version_string(),
-                "program_repo_url": PROGRAM_REPO_URL,
-                "generated_at": built_at,
-            },
-        ),
-        HTML_CONTENT_TYPE,
-    )
+    if changes is None:
+        objects = _render_objects(inventories, cmdb_config, built_at, jobs)
+    else:
+        objects = _render_changes(inventories, cmdb_config, built_at, changes)
+    for key, body, content_type in objects:
+        yield key, body, content_type
+        if gzip_siblings and is_compressible(content_type):
+            yield f"{key}.gz", gzip_compress(body), GZIP_CONTENT_TYPE
 
-    for name, inventory_dict in inventories.items():
-        yield from _render_inventory(name, inventory_dict, dict(cmdb_config[name].schema_mapping))
+
+def content_encoded(objects: Iterable[tuple[str, bytes, str]]) -> Iterator[tuple[str, bytes, str, str]]:
+    """Gzip every compressible object in place, as (key, body, content type, Content-Encoding).
+
+    For an object store such as R2, which has one key per object and serves the Content-Encoding recorded with
+    it. The encoding is "" for an object stored as it is.
+    """
+    for key, body, content_type in objects:
+        if is_compressible(content_type):
+            yield key, gzip_compress(body), content_type, "gzip"
+        else:
+            yield key, body, content_type, ""
+
+
+def _render_objects(
+    inventories: dict, cmdb_config: dict[str, Inventory], built_at: str, jobs: int = 1
+) -> Iterator[tuple[str, bytes, str]]:
+    """Yield every object of the site, uncompressed. See render_site.
+
+    The site is split into tasks (see _render_tasks), run in order here or, with jobs above 1, across a process
+    pool whose results are taken back in the same order. Either way the output is the same objects in the same
+    order, byte for byte. The pool is only given RENDER_TASKS_PER_JOB tasks per process ahead of what has been
+    taken, so rendering waits for publishing rather than running ahead of it.
+    """
+    schema_mappings = {name: dict(cmdb_config[name].schema_mapping) for name in inventories}
+    tasks = _render_tasks(inventories, chunk_hosts=RENDER_CHUNK_HOSTS if jobs > 1 else 0)
+
+    if jobs > 1:
+        import multiprocessing  # noqa: PLC0415 The Worker can't start processes
+        from concurrent.futures import ProcessPoolExecutor  # noqa: PLC0415
+
+        # Each process gets the inventories once, through the initializer, so a task is only a name and a range.
+        # Spawned rather than forked: publish's writer threads are running by now, and forking a threaded process
+        # can deadlock the child.
+        with ProcessPoolExecutor(
+            max_workers=jobs,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_render_worker,
+            initargs=(inventories, schema_mappings, built_at),
+        ) as executor:
+            queued = iter(tasks)
+            window = collections.deque(
+                executor.submit(_run_render_task, task)
+                for task in itertools.islice(queued, jobs * RENDER_TASKS_PER_JOB)
+            )
+            while window:
+                objects = window.popleft().result()
+                if (task := next(queued, None)) is not None:
+                    window.append(executor.submit(_run_render_task, task))
+                yield from objects
+    else:
+        for task in tasks:
+            yield from _render_task(inventories, schema_mappings, built_at, task)
 
     for path in sorted(STATIC_DIR.rglob("*")):
         if path.is_file():
@@ -140,98 +377,363 @@ def render_site(
             yield key, path.read_bytes(), CONTENT_TYPES.get(path.suffix, "application/octet-stream")
 
 
-def _render_inventory(
-    name: str, inventory_dict: dict, schema_mapping: dict[str, str]
+def _render_changes(
+    inventories: dict, cmdb_config: dict[str, Inventory], built_at: str, changes: dict[str, dict]
 ) -> Iterator[tuple[str, bytes, str]]:
-    """Yield the inventory page and every host, group and group json page under it."""
-    groups = group_list(inventory_dict)
+    """Yield only the objects that changes affect. Everything else is as the last render left it.
 
+    A changed host or group changes its own page and JSON, and every inventory-wide object: the inventory page and
+    JSON, and the group JSON, which holds each member's vars. The home page (its footer has the build time) and
+    the search index are rendered again whatever changed. Static assets never change while a process runs.
+    """
+    schema_mappings = {name: dict(cmdb_config[name].schema_mapping) for name in inventories}
+    yield from _render_task(inventories, schema_mappings, built_at, ("home",))
+
+    for name, change in changes.items():
+        if not changed(change):
+            continue
+        inventory_dict = inventories[name]
+        yield from _render_inventory_page(name, inventory_dict, schema_mappings[name])
+
+        hosts = inventory_dict.get("hosts", {})
+        yield from _render_hosts(
+            name, ((host, hosts[host]) for host in [*change["hosts"]["added"], *change["hosts"]["changed"]])
+        )
+        yield from _render_groups(
+            name, inventory_dict, pages={*change["groups"]["added"], *change["groups"]["changed"]}
+        )
+
+    yield from _render_task(inventories, schema_mappings, built_at, ("search",))
+
+
+def carried_over(changes: dict[str, dict]) -> Callable[[str], bool]:
+    """Which objects of the last release, of those _render_changes didn't render again, are still current.
+
+    All but the pages and JSON of removed hosts and groups, the collapsed vars of changed ones, which were rendered
+    again if they still are, and the search index, which is rendered whole and so needs none of its old shards.
+    """
+    gone = ["search/"]
+    for name, change in changes.items():
+        for kind, names in (("host", change["hosts"]), ("group", change["groups"])):
+            gone.extend(f"inventory/{name}/{kind}/{item}/" for item in names["removed"])
+            gone.extend(f"inventory/{name}/{kind}/{item}/var/" for item in names["changed"])
+    prefixes = tuple(gone)
+    return lambda key: not key.startswith(prefixes)
+
+
+def _render_tasks(inventories: dict, chunk_hosts: int = 0) -> list[tuple]:
+    """The site as an ordered list of independent tasks, for _render_task.
+
+    The home page, then per inventory its page, its hosts (in ranges of chunk_hosts, or all at once when 0), and
+    its groups, then the search index. Host pages are the bulk of a large inventory, so they are what gets split.
+    """
+    tasks: list[tuple] = [("home",)]
+    for name, inventory_dict in inventories.items():
+        tasks.append(("inventory", name))
+        host_count = len(inventory_dict.get("hosts", {}))
+        step = chunk_hosts or host_count or 1
+        tasks.extend(("hosts", name, start, start + step) for start in range(0, host_count, step))
+        tasks.append(("groups", name))
+    tasks.append(("search",))
+    return tasks
+
+
+def _render_task(
+    inventories: dict, schema_mappings: dict[str, dict[str, str]], built_at: str, task: tuple
+) -> Iterator[tuple[str, bytes, str]]:
+    """Yield the objects of one task from _render_tasks."""
+    kind, *args = task
+    if kind == "home":
+        yield (
+            "index.html",
+            _render(
+                "home.html.j2",
+                {
+                    "inventories": inventories,
+                    "program_version": version_string(),
+                    "program_repo_url": PROGRAM_REPO_URL,
+                    "generated_at": built_at,
+                },
+            ),
+            HTML_CONTENT_TYPE,
+        )
+    elif kind == "inventory":
+        (name,) = args
+        yield from _render_inventory_page(name, inventories[name], schema_mappings[name])
+    elif kind == "hosts":
+        name, start, stop = args
+        hosts = inventories[name].get("hosts", {})
+        yield from _render_hosts(name, itertools.islice(hosts.items(), start, stop))
+    elif kind == "groups":
+        (name,) = args
+        yield from _render_groups(name, inventories[name])
+    elif kind == "search":
+        for key, body in SearchIndex(inventories).shards().items():
+            yield f"search/{key}", body, JSON_CONTENT_TYPE
+
+
+# A render pool process's copy of render_site's arguments, set once by _init_render_worker.
+_worker_state: dict = {}
+
+
+def _init_render_worker(inventories: dict, schema_mappings: dict[str, dict[str, str]], built_at: str) -> None:
+    """ProcessPoolExecutor initializer: keep the inventories for every task this process runs."""
+    _worker_state.update(inventories=inventories, schema_mappings=schema_mappings, built_at=built_at)
+
+
+def _run_render_task(task: tuple) -> list[tuple[str, bytes, str]]:
+    """Run one task in a render pool process. A list, since a generator can't be sent back."""
+    return list(
+        _render_task(_worker_state["inventories"], _worker_state["schema_mappings"], _worker_state["built_at"], task)
+    )
+
+
+def _render_inventory_page(
+    name: str, inventory_dict: dict, schema_mapping: dict[str, str]
+) -> Iterator[tuple[str, bytes, str]]:
+    """Yield the inventory page and the inventory's whole-inventory JSON objects."""
     yield (
         f"inventory/{name}/index.html",
         _render(
             "inventory.html.j2",
             {
                 "inventory_name": name,
-                "inventory_dict": inventory_dict,
                 "schema_mapping": schema_mapping,
-                "groups": groups,
+                "rows": list(inventory_dict.get("hosts", {}).items()),  # All of them, static/sorttable.js sorts
+                "groups": group_list(inventory_dict),
             },
         ),
         HTML_CONTENT_TYPE,
     )
+    yield f"inventory/{name}/json", dump_inventory_json(inventory_dict), JSON_CONTENT_TYPE
+    yield f"inventory/{name}/ansible/json", dump_ansible_inventory(inventory_dict), JSON_CONTENT_TYPE
 
-    for host, host_data in inventory_dict.get("hosts", {}).items():
-        yield (
-            f"inventory/{name}/host/{host}/index.html",
-            _render(
-                "vars.html.j2",
-                {
-                    "__inventory": name,
-                    "__thing": "host_vars",
-                    "__host": host,
-                    "__vars": dump_vars(host_data["vars"]),
-                },
-            ),
-            HTML_CONTENT_TYPE,
+
+def _render_vars_page(prefix: str, context: dict, var_dict: dict) -> Iterator[tuple[str, bytes, str]]:
+    """Yield a host's or group's page, under prefix, and each var it collapsed, for the page to link."""
+    page_vars = vars_context(var_dict)
+    yield f"{prefix}/index.html", _render("vars.html.j2", {**context, **page_vars}), HTML_CONTENT_TYPE
+    for var in page_vars["large_vars"]:
+        yield f"{prefix}/var/{var}", dump_var(var, var_dict[var]), VAR_CONTENT_TYPE
+
+
+def _render_hosts(name: str, hosts: Iterable[tuple[str, dict]]) -> Iterator[tuple[str, bytes, str]]:
+    """Yield the page, collapsed vars and JSON of each host."""
+    for host, host_data in hosts:
+        yield from _render_vars_page(
+            f"inventory/{name}/host/{host}",
+            {"__inventory": name, "__thing": "host_vars", "__host": host},
+            host_data["vars"],
         )
+        yield f"inventory/{name}/host/{host}/json", dump_host_json(host_data), JSON_CONTENT_TYPE
 
+
+def _render_groups(
+    name: str, inventory_dict: dict, pages: Collection[str] | None = None
+) -> Iterator[tuple[str, bytes, str]]:
+    """Yield every group page and its collapsed vars, or only those named in pages, then every group JSON object."""
     for group in inventory_dict.get("groups", {}):
-        yield (
-            f"inventory/{name}/group/{group}/index.html",
-            _render(
-                "vars.html.j2",
-                {
-                    "__inventory": name,
-                    "__thing": "group_vars",
-                    "__host": group,
-                    "__vars": dump_vars(inventory_dict["groups"][group]),
-                },
-            ),
-            HTML_CONTENT_TYPE,
+        if pages is not None and group not in pages:
+            continue
+        yield from _render_vars_page(
+            f"inventory/{name}/group/{group}",
+            {"__inventory": name, "__thing": "group_vars", "__host": group},
+            inventory_dict["groups"][group],
         )
 
     # The inventory page links a json endpoint per group, plus the synthetic 'all'.
-    for group in groups:
+    for group in group_list(inventory_dict):
         yield (
             f"inventory/{name}/group/{group}/json",
-            json.dumps(group_hosts(inventory_dict, group) or {}, indent=2).encode(),
+            dump_group_json(inventory_dict, group) or b"{}",
             JSON_CONTENT_TYPE,
         )
 
 
-def write_site(inventories: dict, cmdb_config: dict[str, Inventory], out_dir: Path, built_at: str) -> int:
-    """Write the whole site to a directory. Returns the number of objects written."""
-    count = 0
-    for key, body, _ in render_site(inventories, cmdb_config, built_at):
-        path = out_dir / key
-        path.parent.mkdir(parents=True, exist_ok=True)
-        path.write_bytes(body)
-        count += 1
-    return count
+def site_objects(  # noqa: PLR0913 All but the first three are opt-in switches
+    inventories: dict,
+    cmdb_config: dict[str, Inventory],
+    built_at: str,
+    *,
+    gzip_siblings: bool = False,
+    encoded: bool = False,
+    exports: bool = False,
+    jobs: int = 1,
+    changes: dict[str, dict] | None = None,
+) -> Iterator[SiteObject]:
+    """Every object of the site as publish.publish takes them: (key, body, content type, Content-Encoding).
+
+    encoded stores compressible objects gzipped, as content_encoded does, for a sink with Sink.content_encoded.
+    exports adds each inventory's export.ndjson and export.csv, as chunks rather than bodies, since they hold every
+    host's vars at once. With changes, only those of inventories that changed. The rest is as render_site.
+    """
+    objects = render_site(inventories, cmdb_config, built_at, gzip_siblings=gzip_siblings, jobs=jobs, changes=changes)
+    if encoded:
+        yield from content_encoded(objects)
+    else:
+        for key, body, content_type in objects:
+            yield key, body, content_type, ""
+    if exports:
+        if changes is not None:
+            inventories = {name: inventories[name] for name, change in changes.items() if changed(change)}
+        for key, chunks, content_type in export_objects(inventories, cmdb_config):
+            yield key, chunks, content_type, ""
+
+
+def write_site(  # noqa: PLR0913 All but the first four are opt-in switches
+    inventories: dict,
+    cmdb_config: dict[str, Inventory],
+    out_dir: Path,
+    built_at: str,
+    *,
+    gzip_siblings: bool = False,
+    exports: bool = False,
+    jobs: int = 1,
+    concurrency: int = DEFAULT_CONCURRENCY,
+) -> dict[str, int]:
+    """Write the whole site to a directory, publishing it atomically. See site_objects for the rest.
+
+    Only objects whose content changed are written, and objects no longer produced are dropped (see
+    manifest.SiteWriter). Returns how many objects were written, skipped as unchanged, and deleted.
+    """
+    objects = site_objects(inventories, cmdb_config, built_at, gzip_siblings=gzip_siblings, exports=exports, jobs=jobs)
+    return asyncio.run(publish(objects, DirectorySink(out_dir), concurrency))
+
+
+async def watch(
+    cmdb: AnsibleCMDB, publish_site: Callable[[dict[str, dict] | None], Awaitable[object]], interval: float
+) -> None:
+    """Keep a published site current: build and publish it, then every interval rebuild and publish what changed.
+
+    Runs until cancelled. One fetcher is kept throughout (see cmdb.Revalidator), so each interval asks the origin
+    whether any file changed, a 304 or the same body each if not, and only rebuilds if one did. cmdb's change feed
+    (see changes.py) then says which hosts and groups the rebuild changed. publish_site(None) publishes the whole
+    site, publish_site(changes) only what the changes affect. A rebuild that changed nothing publishes nothing,
+    leaving the site and its mtimes alone until the next. A file the origin fails to answer for leaves its
+    inventory as the last build had it, see AnsibleCMDB.revalidate(), so a bad moment at the origin removes
+    nothing from the site. A failed publish is logged, and its changes are published with the next that works.
+    """
+    from .cmdb import revalidating_fetcher  # noqa: PLC0415 Avoids an import cycle, site.py is the lower layer
+
+    change_log = cmdb.changes
+    if change_log is None:
+        msg = "Watching needs a CMDB built with track_changes"
+        raise ValueError(msg)
+
+    async with revalidating_fetcher() as fetcher:
+        await cmdb.build(fetcher)
+        await publish_site(None)
+        published = cmdb.generation
+
+        while True:
+            logger.info("Checking for changes in %s seconds", interval)
+            await asyncio.sleep(interval)
+            try:
+                if not await cmdb.revalidate(fetcher) and published == cmdb.generation:
+                    continue
+                changes = {name: change_log.changes(name, published, cmdb.generation) for name in cmdb.inventories}
+                if not any(changed(change) for change in changes.values()):
+                    logger.info("Nothing changed in generation %s, not publishing", cmdb.generation)
+                elif any(change["reset"] for change in changes.values()):
+                    await publish_site(None)
+                else:
+                    await publish_site(changes)
+                published = cmdb.generation
+            except Exception:
+                logger.exception("Rebuilding or publishing the site failed, trying again next time")
 
 
 def main() -> None:
-    """Build the CMDB and render it to a directory, for the `ansibleinventorycmdb-generate` console script."""
-    import asyncio  # noqa: PLC0415 Only needed by the CLI, not by the Worker
-
-    from .cmdb import AnsibleCMDB  # noqa: PLC0415 Avoids an import cycle, site.py is the lower layer
-    from .config import get_instance_path, load_config  # noqa: PLC0415
-    from .logger import LoggingConfig, setup_logger  # noqa: PLC0415
-
-    if len(sys.argv) != 2:  # noqa: PLR2004 argv[0] plus the output directory
-        sys.exit(f"Usage: {Path(sys.argv[0]).name} <output directory>")
-
-    out_dir = Path(sys.argv[1])
+    """Build the CMDB and publish it as a static site, for the `ansibleinventorycmdb-generate` console script."""
+    from .cmdb import AnsibleCMDB, NotCachedError  # noqa: PLC0415 Avoids an import cycle, site.py is the lower layer
+    from .config import LoggingConfig, get_instance_path, load_config  # noqa: PLC0415
+    from .logger import setup_logger  # noqa: PLC0415
+
+    parser = argparse.ArgumentParser(description="Build the CMDB and publish it as a static site.")
+    parser.add_argument(
+        "destination",
+        help="directory to write the site to, or a .tar, .tar.gz, .tgz or .zip archive, - for a tar stream on "
+        "stdout, or s3://bucket/prefix",
+    )
+    parser.add_argument(
+        "--gzip", action="store_true", help="also write a pre-compressed .gz beside every compressible file"
+    )
+    parser.add_argument("--exports", action="store_true", help="also write each inventory as NDJSON and CSV")
+    parser.add_argument(
+        "--jobs", type=int, default=1, help="render in this many processes, 0 for one per CPU (default: 1)"
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=DEFAULT_CONCURRENCY,
+        help=f"objects written at once (default: {DEFAULT_CONCURRENCY})",
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="keep running, rebuilding every --interval and publishing only what changed (directories only)",
+    )
+    parser.add_argument(
+        "--interval",
+        type=float,
+        default=WATCH_INTERVAL_SECONDS,
+        help=f"seconds between rebuilds with --watch (default: {WATCH_INTERVAL_SECONDS})",
+    )
+    parser.add_argument(
+        "--offline",
+        action="store_true",
+        help="build from the URL cache of an earlier run alone, fetching nothing, to re-render after a template or "
+        "schema_mapping change",
+    )
+    args = parser.parse_args()
+    jobs: int = args.jobs or os.cpu_count() or 1
+    try:  # Made before building, so a destination that can't be published to fails at once
+        unused_sinks = [sink_for(args.destination)]
+    except FileExistsError as exc:
+        parser.error(str(exc))
+    if args.watch and not isinstance(unused_sinks[0], DirectorySink):
+        parser.error("--watch needs a directory to publish to, not an archive or a bucket")
+    if args.watch and args.offline:
+        parser.error("--watch rebuilds from the network, it can't be --offline")
 
     setup_logger(LoggingConfig())
     instance_path = get_instance_path()
     config = load_config(instance_path)
+    cmdb = AnsibleCMDB(config.cmdb, instance_path, track_changes=args.watch)
+
+    async def publish_site(changes: dict[str, dict] | None = None) -> None:
+        if changes is None:
+            sink = unused_sinks.pop() if unused_sinks else sink_for(args.destination)
+        else:  # Only what changed is rendered, the rest of the current release is carried over
+            sink = DirectorySink(Path(args.destination), carried_over(changes))
+        objects = site_objects(
+            cmdb.inventories,
+            config.cmdb,
+            cmdb.built_at,
+            gzip_siblings=args.gzip and not sink.content_encoded,  # Already compressed in place
+            encoded=sink.content_encoded,
+            exports=args.exports,
+            jobs=jobs,
+            changes=changes,
+        )
+        counts = await publish(objects, sink, args.concurrency)
+        logger.info(
+            "Published %s: %s", args.destination, ", ".join(f"{count} {what}" for what, count in counts.items())
+        )
+
+    if args.watch:
+        with contextlib.suppress(KeyboardInterrupt):
+            asyncio.run(watch(cmdb, publish_site, args.interval))
+        return
 
-    cmdb = AnsibleCMDB(config.cmdb, instance_path)
-    asyncio.run(cmdb.build())
+    async def build_and_publish() -> None:
+        await cmdb.build(offline=args.offline)
+        await publish_site()
 
-    count = write_site(cmdb.inventories, config.cmdb, out_dir, cmdb.built_at)
-    logger.info("Wrote %s objects to %s", count, out_dir)
+    try:
+        asyncio.run(build_and_publish())
+    except NotCachedError as exc:
+        parser.exit(1, f"Can't build offline: {exc}\n")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,87 @@
+// Searches the CMDB from the browser. The static site and the web app both serve the index as JSON under
+// /search/ (see search.py): index.json lists the shards, docs.json the hosts and groups, and shard/<hex>.json
+// holds the tokens that start with a given two characters. Only the shards a query's terms fall in are fetched.
+
+(function () {
+  const form = document.getElementById("search");
+  if (!form) {
+    return;
+  }
+  const input = form.querySelector("input");
+  const results = document.getElementById("search-results");
+  const pageSuffix = form.dataset.pageSuffix || "";
+  const fetched = {};
+
+  function getJSON(key) {
+    if (!(key in fetched)) {
+      fetched[key] = fetch("/search/" + key).then((response) => (response.ok ? response.json() : {}));
+    }
+    return fetched[key];
+  }
+
+  function hex(text) {
+    return Array.from(new TextEncoder().encode(text))
+      .map((byte) => byte.toString(16).padStart(2, "0"))
+      .join("");
+  }
+
+  async function matching(term) {
+    // Every shard a term spans: just its own, or for a one-character term, every shard starting with it.
+    const index = await getJSON("index.json");
+    const prefix = hex(term.slice(0, 2));
+    const names = index.shards.filter((name) => (term.length > 1 ? name === prefix : name.startsWith(prefix)));
+
+    const ids = new Set();
+    for (const name of names) {
+      const shard = await getJSON("shard/" + name + ".json");
+      for (const token in shard) {
+        if (token.startsWith(term)) {
+          shard[token].forEach((id) => ids.add(id));
+        }
+      }
+    }
+    return ids;
+  }
+
+  async function search(query) {
+    const terms = query
+      .toLowerCase()
+      .split(/\s+/)
+      .map((word) => word.replace(/^["'`,;:()[\]{}<>]+|["'`,;:()[\]{}<>]+$/g, ""))
+      .filter(Boolean);
+
+    let matches = null;
+    for (const term of new Set(terms)) {
+      const ids = await matching(term);
+      matches = matches === null ? ids : new Set([...matches].filter((id) => ids.has(id)));
+    }
+    if (matches === null) {
+      return [];
+    }
+
+    const docs = await getJSON("docs.json");
+    return [...matches]
+      .sort((a, b) => a - b)
+      .slice(0, 50)
+      .map((id) => docs[id]);
+  }
+
+  form.addEventListener("submit", async (event) => {
+    event.preventDefault(); // The app would answer the plain form with JSON, the static site not at all
+    const docs = await search(input.value);
+    const items = docs.map(([type, inventory, name]) => {
+      const link = document.createElement("a");
+      link.href = "/inventory/" + inventory + "/" + type + "/" + name + pageSuffix;
+      link.textContent = type + ": " + inventory + " / " + name;
+      const item = document.createElement("li");
+      item.appendChild(link);
+      return item;
+    });
+    if (items.length === 0) {
+      const item = document.createElement("li");
+      item.textContent = "No matches";
+      items.push(item);
+    }
+    results.replaceChildren(...items);
+  });
+})();
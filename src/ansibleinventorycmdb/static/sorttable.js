@@ -1,3 +1,6 @@
+// Sorts the static site's host table in the browser. The web app sorts, filters and pages on the server instead
+// (see table.py, which orders the same way), and marks its table data-server-sorted so this leaves it alone.
+
 function isIPAddress(str) {
   const ipPattern =
     /^(25[0-5]|2[0-4][0-9]|[01]?[0-9][0-9]?)\.(25[0-5]|2[0-4][0-9]|[01]?[0-9][0-9]?)\.(25[0-5]|2[0-4][0-9]|[01]?[0-9][0-9]?)\.(25[0-5]|2[0-4][0-9]|[01]?[0-9][0-9]?)$/;
@@ -5,78 +8,57 @@ function isIPAddress(str) {
 }
 
 function ipToNumber(ip) {
-  return ip.split(".").reduce((acc, octet) => (acc << 8) + parseInt(octet, 10), 0);
+  // Multiply rather than shift: << works on signed 32-bit ints, so anything from 128.0.0.0 up went negative.
+  return ip.split(".").reduce((acc, octet) => acc * 256 + parseInt(octet, 10), 0);
+}
+
+function naturalKey(str) {
+  // Alternating text and digit runs, so host2 sorts before host10.
+  return str
+    .toLowerCase()
+    .split(/(\d+)/)
+    .map((part, i) => (i % 2 ? parseInt(part, 10) : part));
+}
+
+function compareCells(x, y) {
+  const xIsIP = isIPAddress(x);
+  const yIsIP = isIPAddress(y);
+  if (xIsIP && yIsIP) {
+    return ipToNumber(x) - ipToNumber(y);
+  }
+  if (xIsIP !== yIsIP) {
+    return xIsIP ? -1 : 1; // IPs first
+  }
+
+  const a = naturalKey(x);
+  const b = naturalKey(y);
+  for (let i = 0; i < Math.min(a.length, b.length); i++) {
+    if (a[i] < b[i]) return -1;
+    if (a[i] > b[i]) return 1;
+  }
+  return a.length - b.length;
 }
 
 function sortTable(n) {
-  var table,
-    rows,
-    switching,
-    i,
-    x,
-    y,
-    shouldSwitch,
-    dir,
-    switchcount = 0;
-  table = document.getElementById("Hosts");
-  switching = true;
-  // Set the sorting direction to ascending:
-  dir = "asc";
-  /* Make a loop that will continue until
-    no switching has been done: */
-  while (switching) {
-    // Start by saying: no switching is done:
-    switching = false;
-    rows = table.rows;
-    /* Loop through all table rows (except the
-      first, which contains table headers): */
-    for (i = 1; i < rows.length - 1; i++) {
-      // Start by saying there should be no switching:
-      shouldSwitch = false;
-      /* Get the two elements you want to compare,
-        one from current row and one from the next: */
-      x = rows[i].getElementsByTagName("td")[n];
-      y = rows[i + 1].getElementsByTagName("td")[n];
-      /* Check if the two rows should switch place,
-        based on the direction, asc or desc: */
-      if (dir == "asc") {
-        if (isIPAddress(x.innerHTML) && isIPAddress(y.innerHTML)) {
-          if (ipToNumber(x.innerHTML) > ipToNumber(y.innerHTML)) {
-            shouldSwitch = true;
-            break;
-          }
-        } else if (x.innerHTML.toLowerCase() > y.innerHTML.toLowerCase()) {
-          shouldSwitch = true;
-          break;
-        }
-      } else if (dir == "desc") {
-        if (isIPAddress(x.innerHTML) && isIPAddress(y.innerHTML)) {
-          if (ipToNumber(x.innerHTML) < ipToNumber(y.innerHTML)) {
-            shouldSwitch = true;
-            break;
-          }
-        } else if (x.innerHTML.toLowerCase() < y.innerHTML.toLowerCase()) {
-          shouldSwitch = true;
-          break;
-        }
-      }
-    }
-    if (shouldSwitch) {
-      /* If a switch has been marked, make the switch
-        and mark that a switch has been done: */
-      rows[i].parentNode.insertBefore(rows[i + 1], rows[i]);
-      switching = true;
-      // Each time a switch is done, increase this count by 1:
-      switchcount++;
-    } else {
-      /* If no switching has been done AND the direction is "asc",
-        set the direction to "desc" and run the while loop again. */
-      if (switchcount == 0 && dir == "asc") {
-        dir = "desc";
-        switching = true;
-      }
-    }
+  // Ascending on a new column, and toggles on a repeat click. Each cell's text is read once and the rows are
+  // moved once, after an O(n log n) sort; swapping DOM rows pairwise took minutes on a large inventory.
+  const table = document.getElementById("Hosts");
+  const rows = Array.from(table.rows).slice(1); // Not the header row
+  if (rows.length === 0) {
+    return;
   }
+
+  const dir = table.dataset.sortColumn === String(n) && table.dataset.sortDir === "asc" ? "desc" : "asc";
+  const sign = dir === "asc" ? 1 : -1;
+  const keyed = rows.map((row) => ({ row: row, key: row.getElementsByTagName("td")[n].textContent.trim() }));
+  keyed.sort((x, y) => sign * compareCells(x.key, y.key));
+
+  const fragment = document.createDocumentFragment();
+  keyed.forEach((item) => fragment.appendChild(item.row));
+  rows[0].parentNode.appendChild(fragment);
+
+  table.dataset.sortColumn = String(n);
+  table.dataset.sortDir = dir;
 }
 
 function getColumnIndexByHeaderText(table, headerText) {
@@ -90,9 +72,12 @@ function getColumnIndexByHeaderText(table, headerText) {
 }
 
 var table = document.getElementById("Hosts");
-var columnIndex = getColumnIndexByHeaderText(table, "IP Address");
-if (columnIndex !== -1) {
-  sortTable(columnIndex);
-} else {
-  console.error("Column with header 'IP Address' not found, not sorting table");
+// Every page loads this script, but only the inventory page has the table.
+if (table && !table.hasAttribute("data-server-sorted")) {
+  var columnIndex = getColumnIndexByHeaderText(table, "IP Address");
+  if (columnIndex !== -1) {
+    sortTable(columnIndex);
+  } else {
+    console.error("Column with header 'IP Address' not found, not sorting table");
+  }
 }
@@ -0,0 +1,129 @@
+"""The inventory page's host table, sorted, filtered and paged on the server.
+
+Rendering every host of a large inventory into one table, then sorting it in the browser, doesn't scale. The app
+renders one page of it instead. Each column's sort order is computed once per CMDB generation (see
+AnsibleCMDB.cached) and a request only slices it, so a page costs the same however big the inventory is.
+
+The orderings are the ones static/sorttable.js applies in the browser for the static site: IP addresses by
+number rather than as text, and everything else naturally, so host2 comes before host10.
+"""
+
+from __future__ import annotations
+
+import ipaddress
+import math
+import re
+import threading
+from urllib.parse import urlencode
+
+# Ansible's own name for the host's name, so it can't collide with a var in schema_mapping.
+HOST_COLUMN = "inventory_hostname"
+
+# Without ?sort=, sort on the column with this heading, as sorttable.js always has. Inventory order otherwise.
+DEFAULT_SORT_HEADING = "IP Address"
+
+DEFAULT_PER_PAGE = 100
+MAX_PER_PAGE = 500
+FILTERED_VIEWS = 64  # Per inventory, see FilteredViews
+
+_DIGITS = re.compile(r"(\d+)")
+
+
+def sort_key(value: object) -> tuple:
+    """Sort key for one cell: IPs numerically and first, then text naturally, then hosts without the var.
+
+    Natural means runs of digits compare as numbers. re.split with a capture group alternates text and digits,
+    always starting with text, so two keys only ever compare str to str and int to int.
+    """
+    if value is None:
+        return (2,)
+
+    text = str(value)
+    try:
+        address = ipaddress.ip_address(text)
+    except ValueError:
+        parts = _DIGITS.split(text.lower())
+        return (1, tuple(int(part) if index % 2 else part for index, part in enumerate(parts)))
+
+    return (0, address.version, int(address))
+
+
+def cell_value(host: str, host_data: dict, column: str) -> object:
+    """What a column shows for a host. None when the host doesn't have the var."""
+    if column == HOST_COLUMN:
+        return host
+    return host_data["vars"].get(column)
+
+
+def sort_index(hosts: dict, column: str) -> list[str]:
+    """Every host, in ascending order of one column. Stable, so ties keep inventory order."""
+    return sorted(hosts, key=lambda host: sort_key(cell_value(host, hosts[host], column)))
+
+
+def filter_text(hosts: dict, schema_mapping: dict[str, str]) -> dict[str, str]:
+    """Per host, the lowercased text of every cell in its row, for a substring filter to scan."""
+    return {
+        host: "\0".join(
+            [host, *(str(host_data["vars"].get(key, "")) for key in schema_mapping), *host_data.get("groups", [])]
+        ).lower()
+        for host, host_data in hosts.items()
+    }
+
+
+class FilteredViews:
+    """The hosts matching a ?q= filter, in a sort order, for the FILTERED_VIEWS (sort, filter) pairs last asked for.
+
+    Kept for a generation, like the sort orders, so paging through a filtered table, or a filter many clients use,
+    scans the hosts once rather than on every request. Bounded, as the filter is whatever a client sends. The routes
+    are sync and run in threads, hence the lock.
+    """
+
+    def __init__(self, text: dict[str, str]) -> None:
+        """Views over filter_text()'s text of an inventory's hosts."""
+        self._text = text
+        self._views: dict[tuple[str, str], list[str]] = {}  # Least recently used first
+        self._lock = threading.Lock()
+
+    def get(self, sort: str, q: str, order: list[str]) -> list[str]:
+        """The hosts in order, the sort order named sort, whose row contains q, ignoring case."""
+        key = (sort, q.lower())
+        with self._lock:
+            if (view := self._views.pop(key, None)) is not None:
+                self._views[key] = view  # Reinserted, as the most recently used
+                return view
+
+        view = [host for host in order if key[1] in self._text[host]]
+        with self._lock:
+            self._views[key] = view
+            while len(self._views) > FILTERED_VIEWS:
+                del self._views[next(iter(self._views))]
+        return view
+
+
+def default_sort(schema_mapping: dict[str, str]) -> str:
+    """The column to sort on when the request doesn't say. "" means inventory order."""
+    for key, heading in schema_mapping.items():
+        if heading == DEFAULT_SORT_HEADING:
+            return key
+    return ""
+
+
+def paginate(total: int, page: int, per_page: int) -> tuple[int, int, int]:
+    """Clamp a requested page to what exists. Returns (page, pages, per_page)."""
+    per_page = min(max(per_page, 1), MAX_PER_PAGE)
+    pages = max(math.ceil(total / per_page), 1)
+    return min(max(page, 1), pages), pages, per_page
+
+
+def query_string(sort: str, q: str, page: int, per_page: int) -> str:
+    """The query string of a link to another view of the table, leaving out anything at its default."""
+    params: dict[str, str | int] = {}
+    if sort:
+        params["sort"] = sort
+    if q:
+        params["q"] = q
+    if page != 1:
+        params["page"] = page
+    if per_page != DEFAULT_PER_PAGE:
+        params["per_page"] = per_page
+    return f"?{urlencode(params)}" if params else "?"
@@ -0,0 +1,236 @@
+"""The URL cache: every inventory file a build parsed, by URL, bounded in memory and optionally kept on disk.
+
+A build reads each vars file once and the inventory itself twice, and build() without a refresh, at startup, takes
+whatever is cached over fetching again. A 404 is cached too, as an empty document, and so is each vars file
+listing, so the cache on disk holds everything a build asked for: enough for build(offline=True) to need no network.
+A plain dict would keep every parsed document in memory for the life of the process, beside the copy merged into
+the inventories, so the in-memory part is bounded by an approximate size in bytes, AIC_URL_CACHE_MB (default
+DEFAULT_MAX_MB), evicting the least recently used entries past it.
+
+With a directory, every entry is also pickled to a file of its own as it is added, so an evicted entry is read
+back from disk rather than refetched, and a restarted process starts from what the last one fetched. Without one,
+as in the Worker, an evicted entry is fetched again. Disk reads and writes run in a thread, off the event loop.
+
+A refresh fetches everything again, into a snapshot (see begin_snapshot) written beside the last one, which only
+replaces it once the build is done. Until then the last snapshot is whole on disk, for an offline build, and a
+refresh that fails leaves it there. Only documents actually fetched are cached: a timeout or an error is the
+origin's problem of the moment, not something to build from later.
+
+Sizes come from sys.getsizeof over the document and everything in it. That overcounts strings and numbers PyYAML
+shares between documents and undercounts allocator overhead, which is close enough for a ceiling. Everything here
+runs on the event loop's thread, so nothing is locked.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import os
+import pickle
+import shutil
+import sys
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from . import metrics
+from .logger import get_logger
+
+if TYPE_CHECKING:
+    from collections.abc import Collection
+
+logger = get_logger(__name__)
+
+URL_CACHE_MB_ENV_VAR = "AIC_URL_CACHE_MB"
+DEFAULT_MAX_MB = 64
+CACHE_DIR = "url_cache"  # Under the instance path
+
+
+def max_bytes_from_env() -> int:
+    """The in-memory ceiling, from AIC_URL_CACHE_MB."""
+    return int(float(os.environ.get(URL_CACHE_MB_ENV_VAR) or DEFAULT_MAX_MB) * 1024 * 1024)
+
+
+def approximate_size(value: object) -> int:
+    """Roughly the bytes value takes: sys.getsizeof of it, and of everything in it. Iterative, YAML nests deep."""
+    size = 0
+    pending = [value]
+    while pending:
+        item = pending.pop()
+        size += sys.getsizeof(item)
+        if isinstance(item, dict):
+            pending.extend(item.keys())
+            pending.extend(item.values())
+        elif isinstance(item, list | tuple | set):
+            pending.extend(item)
+    return size
+
+
+class UrlCache:
+    """Parsed documents by URL, least recently used first, evicted from memory past max_bytes."""
+
+    def __init__(self, directory: str | None, max_bytes: int) -> None:
+        """A cache holding up to about max_bytes in memory, and everything on disk in directory, if given."""
+        self._directory = Path(directory) if directory else None
+        self._staged: Path | None = None  # Where a snapshot is written until committed, see begin_snapshot()
+        self.max_bytes = max_bytes
+        self._entries: dict[str, tuple[dict, int]] = {}  # url: (document, approximate size), oldest first
+        self.bytes = 0
+        self.evictions = 0
+        self.disk_reads = 0
+
+    def __len__(self) -> int:
+        """Entries in memory."""
+        return len(self._entries)
+
+    def on_disk(self) -> bool:
+        """Whether there is anything on disk, from this process or an earlier one."""
+        return self._directory is not None and any(self._directory.glob("*.pkl"))
+
+    async def get(self, url: str) -> dict | None:
+        """The document cached for url, from memory or disk, or None if it has to be fetched."""
+        entry = self._entries.pop(url, None)
+        if entry is not None:
+            self._entries[url] = entry  # Reinserted, as the most recently used
+            metrics.URL_CACHE.inc("hit")
+            return entry[0]
+
+        if (directory := self._writing()) is not None:
+            document = await asyncio.to_thread(_read, directory / _filename(url), url)
+            if document is not None:
+                self.disk_reads += 1
+                metrics.URL_CACHE.inc("disk")
+                self._add(url, document)
+                return document
+
+        metrics.URL_CACHE.inc("miss")
+        return None
+
+    async def put(self, url: str, document: dict) -> None:
+        """Cache a freshly fetched document, writing it to disk first if there is a directory."""
+        if (directory := self._writing()) is not None:
+            await asyncio.to_thread(_write, directory / _filename(url), document)
+        self._add(url, document)
+
+    async def forget(self, url: str) -> None:
+        """Drop url, from memory and disk, so that the next build fetches it again."""
+        if (entry := self._entries.pop(url, None)) is not None:
+            self.bytes -= entry[1]
+            metrics.URL_CACHE_BYTES.set(self.bytes)
+        if (directory := self._writing()) is not None:
+            await asyncio.to_thread((directory / _filename(url)).unlink, missing_ok=True)
+
+    async def begin_snapshot(self) -> None:
+        """Start caching afresh, so that the next build fetches everything again.
+
+        Entries from here on are written to a directory of their own, beside the last snapshot, which stays as it
+        was until commit_snapshot() replaces it or abandon_snapshot() goes back to it.
+        """
+        self._forget_memory()
+        if self._directory is not None:
+            self._staged = self._directory.with_name(f"{self._directory.name}.new")
+            await asyncio.to_thread(shutil.rmtree, self._staged, ignore_errors=True)  # Left by a failed refresh
+
+    async def previous(self, url: str) -> dict | None:
+        """The last snapshot's copy of url, while a new one is being taken, or None if it has none."""
+        if self._staged is None or self._directory is None:
+            return None
+        return await asyncio.to_thread(_read, self._directory / _filename(url), url)
+
+    async def commit_snapshot(self, keep: Collection[str] = ()) -> None:
+        """Replace the last snapshot with the new one, carrying over the last one's copies of the URLs in keep.
+
+        keep is for what the new snapshot couldn't fetch, so that the cache on disk still has every file.
+        """
+        if self._staged is not None and self._directory is not None:
+            await asyncio.to_thread(_replace, self._directory, self._staged, [_filename(url) for url in keep])
+        self._staged = None
+
+    async def abandon_snapshot(self) -> None:
+        """Go back to the last snapshot, dropping the new one."""
+        self._forget_memory()  # Some of it is from the new snapshot, which is about to go
+        if self._staged is not None:
+            await asyncio.to_thread(shutil.rmtree, self._staged, ignore_errors=True)
+        self._staged = None
+
+    def stats(self) -> dict:
+        """Size and counters, for /health and the build log."""
+        return {
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "evictions": self.evictions,
+            "disk_reads": self.disk_reads,
+        }
+
+    def _writing(self) -> Path | None:
+        """The directory entries are read from and written to: the new snapshot's while one is being taken."""
+        return self._staged or self._directory
+
+    def _forget_memory(self) -> None:
+        """Drop every entry held in memory."""
+        self._entries = {}
+        self.bytes = 0
+        metrics.URL_CACHE_BYTES.set(0)
+
+    def _add(self, url: str, document: dict) -> None:
+        """Put a document in memory, then evict the oldest entries until back under max_bytes.
+
+        The newest entry is never evicted, even alone over the ceiling: it's about to be used.
+        """
+        size = approximate_size(document)
+        if (previous := self._entries.pop(url, None)) is not None:
+            self.bytes -= previous[1]
+        self._entries[url] = (document, size)
+        self.bytes += size
+
+        while self.bytes > self.max_bytes and len(self._entries) > 1:
+            oldest = next(iter(self._entries))
+            self.bytes -= self._entries.pop(oldest)[1]
+            self.evictions += 1
+            metrics.URL_CACHE_EVICTIONS.inc()
+        metrics.URL_CACHE_BYTES.set(self.bytes)
+
+
+def _filename(url: str) -> str:
+    """The file an entry is kept in: named for the URL's hash, since a URL isn't a safe filename."""
+    return f"{hashlib.sha256(url.encode()).hexdigest()}.pkl"
+
+
+def _read(path: Path, url: str) -> dict | None:
+    """An entry's copy on disk, or None if there isn't a readable one."""
+    try:
+        with path.open("rb") as cache_file:
+            return pickle.load(cache_file)
+    except FileNotFoundError:
+        return None
+    except (pickle.UnpicklingError, EOFError) as exc:
+        logger.warning("Ignoring unreadable URL cache file for %s: %s", url, exc)
+        return None
+
+
+def _write(path: Path, document: dict) -> None:
+    """Pickle an entry to its file, replacing any earlier copy whole."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    partial = path.with_suffix(".partial")
+    with partial.open("wb") as cache_file:
+        pickle.dump(document, cache_file, pickle.HIGHEST_PROTOCOL)
+    partial.replace(path)
+
+
+def _replace(live: Path, staged: Path, keep: list[str]) -> None:
+    """Make the staged snapshot the live one, with copies of the files named in keep taken from the live one first.
+
+    Two renames rather than one, since a directory can't be renamed over one that isn't empty. A crash between them
+    leaves no live directory, which is as if nothing was cached: the next build fetches everything.
+    """
+    staged.mkdir(parents=True, exist_ok=True)  # Nothing was written if nothing was fetched
+    for name in keep:
+        if (live / name).exists() and not (staged / name).exists():
+            shutil.copy2(live / name, staged / name)
+
+    retired = live.with_name(f"{live.name}.old")
+    shutil.rmtree(retired, ignore_errors=True)
+    if live.exists():
+        live.rename(retired)
+    staged.rename(live)
+    shutil.rmtree(retired, ignore_errors=True)
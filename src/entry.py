@@ -10,22 +10,32 @@ To trigger a build during `pywrangler dev`, curl http://localhost:8787/cdn-cgi/h
 import hmac
 import json
 import os
+import time
 from datetime import UTC, datetime
 from pathlib import Path
 from urllib.parse import parse_qs, urlparse
 
-import yaml
 from workers import Response, WorkerEntrypoint, fetch
 
-from ansibleinventorycmdb.cmdb import AnsibleCMDB, github_zip_fetcher
-from ansibleinventorycmdb.config import Config
-from ansibleinventorycmdb.constants import COMMIT_SHA_ENV_VAR
+from ansibleinventorycmdb import metrics
+from ansibleinventorycmdb.bundle import load_bundled_config
 from ansibleinventorycmdb.logger import get_logger, setup_logger
-from ansibleinventorycmdb.site import render_site
+
+# Anything heavier is imported by the handler that needs it, not here: a cold start pays for every module-level
+# import before the first request is served, and /status needs none of the build.
 
 # src/config.yml is a symlink to instance/config.yml, so there is only ever one config file. Workers have no
-# instance path to read one from at runtime, so it is bundled (wrangler resolves the symlink at bundle time).
-CONFIG = Config(**yaml.safe_load((Path(__file__).parent / "config.yml").read_text()))
+# instance path to read one from at runtime, so `npm run bundle` validates it into config.json beside this file,
+# which is plain JSON and so needs neither PyYAML nor pydantic to load (see ansibleinventorycmdb/bundle.py).
+CONFIG_JSON = Path(__file__).parent / "config.json"
+if CONFIG_JSON.exists():
+    CONFIG = load_bundled_config(CONFIG_JSON)
+else:  # A `pywrangler dev` run by hand, without the npm script: validate the YAML here, the slow way
+    import yaml
+
+    from ansibleinventorycmdb.config import Config
+
+    CONFIG = Config(**yaml.safe_load((Path(__file__).parent / "config.yml").read_text()))
 
 setup_logger(CONFIG.logging)
 logger = get_logger(__name__)
@@ -33,14 +43,24 @@ logger = get_logger(__name__)
 # The cron runs daily, so anything past a day plus a couple of hours of slack means a run was missed or failed.
 STALE_AFTER_SECONDS = 26 * 60 * 60
 
+# Where each build leaves its metrics for /status. Not in the manifest, so a build never deletes it as stale.
+METRICS_NAME = ".metrics.json"
+
 
 async def fetch_bytes(url: str) -> bytes | None:
     """Fetch a URL with the Workers runtime's fetch, rather than cmdb.py's default httpx client.
 
     Bytes rather than text because github_zip_fetcher, which this is handed to, pulls down repo zips.
     """
-    response = await fetch(url)
-    return await response.bytes() if response.ok else None
+    started = time.perf_counter()
+    try:
+        response = await fetch(url)
+        body = await response.bytes()
+    except Exception:
+        metrics.record_fetch(url, None, 0, started)
+        raise
+    metrics.record_fetch(url, response.status, len(body), started)
+    return body if response.ok else None
 
 
 class Default(WorkerEntrypoint):
@@ -81,33 +101,43 @@ class Default(WorkerEntrypoint):
             logger.warning("Rejected an unauthenticated build request")
             return Response("Not found", status=404)
 
-        count = await self._build_and_upload()
-        return Response(f"Wrote {count} objects\n")
+        counts = await self._build_and_upload()
+        return Response(
+            f"Uploaded {counts['uploaded']} objects, {counts['unchanged']} unchanged, {counts['deleted']} deleted\n"
+        )
 
     async def _status(self) -> Response:
         """Report when the last build landed, as JSON. One R2 head request, no stored state of its own.
 
-        The bucket already records this: every build rewrites index.html, so its upload time *is* the last
-        successful run. A failed build writes nothing, which shows up here as an age that keeps growing — the
-        thing worth alerting on either way. Recording failures as well would mean writing a status object on
-        every run, and it would not answer a different question.
+        The bucket already records this: every build ends by rewriting the object manifest (see bucket.py), so
+        its upload time *is* the last successful run. A failed build never gets that far, which shows up here as
+        an age that keeps growing — the thing worth alerting on either way. Recording failures as well would
+        mean a second status object, and it would not answer a different question.
+
+        `metrics` is what that build recorded (see ansibleinventorycmdb/metrics.py): fetches by origin and status
+        class, bytes, URL cache hits and misses, YAML parse time and time per phase. Left at METRICS_NAME by the
+        build, and read back with a second R2 request.
 
         Unauthenticated, unlike the build path: the bucket is public, so this leaks nothing a HEAD on the site
-        itself wouldn't, and it costs one Cloudflare-internal request rather than a repo download. Stale answers
+        itself wouldn't, and it costs two Cloudflare-internal requests rather than a repo download. Stale answers
         503 so a plain uptime monitor can watch the URL without parsing the body.
         """
-        page = await self.env.CMDB_BUCKET.head("index.html")
+        from ansibleinventorycmdb.manifest import MANIFEST_NAME  # noqa: PLC0415 See the module-level imports
+
+        page = await self.env.CMDB_BUCKET.head(MANIFEST_NAME)
         # The binding hands `uploaded` over as a datetime. R2 records it in UTC, but the object comes through
         # naive, and subtracting that from an aware now() raises — so say so rather than reading it as local time.
         uploaded = None if page is None else page.uploaded.replace(tzinfo=UTC)
         age = None if uploaded is None else round((datetime.now(UTC) - uploaded).total_seconds())
         fresh = age is not None and age < STALE_AFTER_SECONDS
+        metrics_object = await self.env.CMDB_BUCKET.get(METRICS_NAME)
 
         body = {
             "ok": fresh,
             "last_build": None if uploaded is None else uploaded.isoformat(),
             "age_seconds": age,
             "stale_after_seconds": STALE_AFTER_SECONDS,
+            "metrics": None if metrics_object is None else json.loads(await metrics_object.text()),
         }
         return Response(
             json.dumps(body) + "\n",
@@ -115,22 +145,46 @@ class Default(WorkerEntrypoint):
             headers={"content-type": "application/json"},
         )
 
-    async def _build_and_upload(self) -> int:
-        """Build the CMDB and PUT every rendered page into R2. Returns the number of objects written."""
+    async def _build_and_upload(self) -> dict[str, int]:
+        """Build the CMDB and sync every rendered page into R2. Returns counts uploaded, unchanged and deleted."""
+        from ansibleinventorycmdb.bucket import BucketSink  # noqa: PLC0415 See the module-level imports
+        from ansibleinventorycmdb.cmdb import AnsibleCMDB, github_zip_fetcher  # noqa: PLC0415
+        from ansibleinventorycmdb.constants import COMMIT_SHA_ENV_VAR  # noqa: PLC0415
+        from ansibleinventorycmdb.publish import DEFAULT_CONCURRENCY, publish  # noqa: PLC0415
+        from ansibleinventorycmdb.site import site_objects  # noqa: PLC0415
+
         # constants.version_string() reads this from the environment, which is the only channel all three modes
         # share. Set here rather than at import: a wrangler var only exists on `env`, which the runtime hands to
         # a handler. Both handlers funnel through here, so it is always set before render_site() reads it.
         os.environ[COMMIT_SHA_ENV_VAR] = getattr(self.env, "COMMIT_SHA", "") or ""
+        metrics.REGISTRY.reset()  # An isolate can outlive a build; /status reports on one build at a time
 
         cmdb = AnsibleCMDB(CONFIG.cmdb)  # No instance path: Workers have no writable filesystem
         # One zip per repo, not one request per file: the free plan allows 50 external subrequests per invocation
-        # and a build needs ~75. The R2 puts below come out of a separate, larger budget.
+        # and a build needs ~75. The R2 operations below come out of a separate, larger budget.
         await cmdb.build(github_zip_fetcher(fetch_bytes))
 
-        count = 0
-        for key, body, content_type in render_site(cmdb.inventories, CONFIG.cmdb, cmdb.built_at):
-            await self.env.CMDB_BUCKET.put(key, body, httpMetadata={"contentType": content_type})
-            count += 1
+        # Stored gzipped with the Content-Encoding recorded alongside, so R2 serves the compressed bytes as they
+        # are and compression happens here, once a build, rather than on every request for the object. Only
+        # objects whose bytes changed since the last run are uploaded, PUBLISH_CONCURRENCY of them at a time.
+        concurrency = int(getattr(self.env, "PUBLISH_CONCURRENCY", 0) or DEFAULT_CONCURRENCY)
+        started = time.perf_counter()
+        counts = await publish(
+            site_objects(cmdb.inventories, CONFIG.cmdb, cmdb.built_at, encoded=True),
+            BucketSink(self.env.CMDB_BUCKET),
+            concurrency,
+        )
+        metrics.BUILD_PHASE_SECONDS.observe(time.perf_counter() - started, "publish")
+
+        snapshot = {**metrics.REGISTRY.snapshot(), "published": counts}
+        await self.env.CMDB_BUCKET.put(
+            METRICS_NAME, json.dumps(snapshot).encode(), httpMetadata={"contentType": "application/json"}
+        )
 
-        logger.info("Wrote %s objects to R2", count)
-        return count
+        logger.info(
+            "Synced R2: %s objects uploaded, %s unchanged, %s deleted",
+            counts["uploaded"],
+            counts["unchanged"],
+            counts["deleted"],
+        )
+        return counts
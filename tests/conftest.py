@@ -17,6 +17,7 @@ import shutil
 from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
 from threading import Thread
+from types import SimpleNamespace
 from typing import TYPE_CHECKING
 
 import pytest
@@ -24,6 +25,7 @@ import yaml
 from fastapi.testclient import TestClient
 
 from ansibleinventorycmdb import create_app
+from ansibleinventorycmdb.cmdb import VARS_MANIFEST
 from ansibleinventorycmdb.config import Config
 
 if TYPE_CHECKING:
@@ -48,6 +50,9 @@ EMPTY_VAR_PATHS = frozenset(
     }
 )
 
+# Paths the CMDB may ask for that the test repo doesn't have, and 404s like a real one would. Not recorded.
+ABSENT_PATHS = frozenset({f"/{VARS_MANIFEST}"})
+
 
 class _InventoryHandler(BaseHTTPRequestHandler):
     """Serves the test inventory. Anything it doesn't recognise is recorded and 404'd."""
@@ -61,6 +66,9 @@ class _InventoryHandler(BaseHTTPRequestHandler):
             body = self.inventory_body
         elif self.path in EMPTY_VAR_PATHS:
             body = b""
+        elif self.path in ABSENT_PATHS:
+            self.send_error(404)
+            return
         else:
             self.unexpected_paths.append(self.path)
             self.send_error(404)
@@ -89,6 +97,56 @@ def inventory_server():
     server.shutdown()
 
 
+class _StoredObject:
+    """What R2's binding returns from get(): the body, read with text(), and the httpMetadata it was put with."""
+
+    def __init__(self, body: bytes, http_metadata: dict) -> None:
+        self.body = body
+        self.httpMetadata = http_metadata
+
+    async def text(self) -> str:
+        return self.body.decode()
+
+
+class MemoryBucket:
+    """A stand-in for the Worker's R2 bucket binding, holding objects in a dict. Records every put and delete."""
+
+    def __init__(self) -> None:
+        self.objects: dict[str, _StoredObject] = {}
+        self.page_size = 2  # Small, so that listing a few objects takes more than one page of list()
+        self.puts: list[str] = []
+        self.deletes: list[str] = []
+
+    async def get(self, key: str) -> _StoredObject | None:
+        return self.objects.get(key)
+
+    async def put(self, key: str, body: bytes, httpMetadata: dict | None = None) -> None:  # noqa: N803 Named as in the R2 binding
+        self.objects[key] = _StoredObject(body, httpMetadata or {})
+        self.puts.append(key)
+
+    async def delete(self, keys: str | list[str]) -> None:
+        for key in [keys] if isinstance(keys, str) else keys:
+            self.objects.pop(key, None)
+            self.deletes.append(key)
+
+    async def list(self, cursor: str | None = None) -> SimpleNamespace:
+        """A page of keys in order, the cursor being the last key of the page before."""
+        keys = sorted(key for key in self.objects if cursor is None or key > cursor)
+        page = keys[: self.page_size]
+        truncated = len(keys) > len(page)
+        return SimpleNamespace(
+            objects=[SimpleNamespace(key=key) for key in page],
+            truncated=truncated,
+            cursor=page[-1] if truncated else None,
+        )
+
+
+@pytest.fixture
+def bucket() -> MemoryBucket:
+    """An empty stand-in R2 bucket."""
+    return MemoryBucket()
+
+
 @pytest.fixture(autouse=True)
 def mock_get_inventory_url(inventory_server):
     """Fail the test if the CMDB asked for a URL the test server doesn't know about.
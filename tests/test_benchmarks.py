@@ -0,0 +1,63 @@
+"""Tests the build benchmark's synthetic repo and fault-injecting origin, which its numbers are only as good as."""
+
+import asyncio
+import urllib.error
+import urllib.request
+
+import pytest
+
+from ansibleinventorycmdb.cmdb import AnsibleCMDB
+from ansibleinventorycmdb.config import Inventory
+from benchmarks.origin import Origin
+from benchmarks.synthetic import SCHEMA_MAPPING, synthetic_repo
+
+BASE_URL = "https://origin.internal"
+
+
+def test_synthetic_repo_builds():
+    """TEST: The repo builds into every host, with its inline and vars-file vars, and some vars files missing."""
+    files = synthetic_repo(50, groups=5, vars_per_file=4, missing_vars=0.5)
+
+    async def fetch_text(url: str) -> str | None:
+        body = files.get(url.removeprefix(f"{BASE_URL}/"))
+        return body.decode() if body is not None else None
+
+    inventories = {
+        "synthetic": Inventory(inventory_url=f"{BASE_URL}/inventory/main.yml", schema_mapping=SCHEMA_MAPPING)
+    }
+    cmdb = AnsibleCMDB(inventories)
+    asyncio.run(cmdb.build(fetch_text))
+
+    hosts = cmdb.inventories["synthetic"]["hosts"]
+    assert len(hosts) == 50  # noqa: PLR2004
+    with_file = [host for host in hosts if f"inventory/host_vars/{host}.yml" in files]
+    assert 0 < len(with_file) < len(hosts)
+    assert {"ansible_host", "role", "setting_3"} <= hosts[with_file[0]]["vars"].keys()
+
+
+def get_status(url: str) -> int:
+    try:
+        with urllib.request.urlopen(url) as response:  # noqa: S310 The local origin
+            return response.status
+    except urllib.error.HTTPError as exc:
+        return exc.code
+
+
+def test_origin_faults():
+    """TEST: The origin serves files, injects 404s and throttles as configured, and counts what it served."""
+    files = {"inventory/main.yml": b"---\n"}
+
+    with Origin(files) as origin:
+        assert get_status(f"{origin.url}/inventory/main.yml") == 200  # noqa: PLR2004
+        assert get_status(f"{origin.url}/missing.yml") == 404  # noqa: PLR2004
+        assert origin.stats() == {"requests": 2, "200": 1, "404": 1}
+
+    with Origin(files, not_found=1.0, rate=1) as origin:
+        statuses = [get_status(f"{origin.url}/inventory/main.yml") for _ in range(2)]
+        assert statuses == [404, 429]
+
+
+def test_origin_unknown_fault():
+    """TEST: A misspelt fault is an error, not silently a fault-free run."""
+    with pytest.raises(ValueError, match="latncy"):
+        Origin({}, latncy=1)
@@ -0,0 +1,66 @@
+"""Tests the Worker's bundle step: the config validated into JSON, and the templates precompiled."""
+
+import sys
+
+import pytest
+import yaml
+from jinja2 import FileSystemLoader, ModuleLoader
+
+from ansibleinventorycmdb import site as site_module
+from ansibleinventorycmdb.bundle import compile_templates, load_bundled_config, main
+from ansibleinventorycmdb.cmdb import AnsibleCMDB
+from ansibleinventorycmdb.config import Config
+from ansibleinventorycmdb.site import render_site
+
+
+@pytest.fixture
+def compiled_dir(tmp_path, monkeypatch):
+    """Where compiled templates go and are looked for, with the environment rebuilt before and after the test."""
+    monkeypatch.setattr(site_module, "COMPILED_TEMPLATES_DIR", tmp_path / "compiled_templates")
+    site_module._environment.cache_clear()
+    yield tmp_path / "compiled_templates"
+    site_module._environment.cache_clear()
+
+
+def rendered(inventories: dict, cmdb_config: dict, built_at: str) -> list[tuple[str, bytes, str]]:
+    return list(render_site(inventories, cmdb_config, built_at))
+
+
+def test_compiled_templates_render_identically(tmp_path, compiled_dir, get_test_config, build_cmdb):
+    """TEST: Pages rendered from the precompiled templates are byte for byte the ones rendered from source."""
+    config = Config(**get_test_config("valid.yml"))
+    cmdb = build_cmdb(AnsibleCMDB(config.cmdb, str(tmp_path)))
+    from_source = rendered(cmdb.inventories, config.cmdb, cmdb.built_at)
+
+    compile_templates(compiled_dir)
+    site_module._environment.cache_clear()
+
+    assert isinstance(site_module._environment().loader, ModuleLoader)
+    assert rendered(cmdb.inventories, config.cmdb, cmdb.built_at) == from_source
+
+
+def test_stale_compiled_templates_ignored(compiled_dir):
+    """TEST: A compiled set under any key but the current one, from older templates or Jinja2, is never loaded."""
+    compile_templates(compiled_dir).rename(compiled_dir / "0123456789abcdef")
+
+    assert isinstance(site_module._environment().loader, FileSystemLoader)
+
+
+def test_bundled_config(tmp_path, monkeypatch, compiled_dir, get_test_config, build_cmdb):
+    """TEST: The config the Worker loads from config.json renders the same site as the validated YAML does."""
+    config_yml = tmp_path / "config.yml"
+    config_yml.write_text(yaml.safe_dump(get_test_config("valid.yml")))
+    config_json = tmp_path / "config.json"
+    monkeypatch.setattr(sys, "argv", ["bundle", "--config", str(config_yml), "--out", str(config_json)])
+
+    main()
+
+    config = Config(**get_test_config("valid.yml"))
+    bundled = load_bundled_config(config_json)
+    assert bundled.logging.level == config.logging.level
+    assert (compiled_dir / site_module.template_key()).is_dir()
+
+    cmdb = build_cmdb(AnsibleCMDB(config.cmdb, str(tmp_path)))
+    assert rendered(cmdb.inventories, bundled.cmdb, cmdb.built_at) == rendered(
+        cmdb.inventories, config.cmdb, cmdb.built_at
+    )
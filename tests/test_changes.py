@@ -0,0 +1,101 @@
+"""Tests the change feed: what each build added, removed or changed, and serving it to pollers."""
+
+from http import HTTPStatus
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from ansibleinventorycmdb.changes import ChangeLog, content_hash, inventory_digest, inventory_hashes
+
+
+def inventory_with(hosts: dict[str, dict], groups: dict[str, dict] | None = None) -> dict:
+    """An inventory dict of hosts, each {var: value}, in group all, and its groups."""
+    return {
+        "hosts": {host: {"groups": ["all"], "vars": host_vars} for host, host_vars in hosts.items()},
+        "groups": groups or {"all": {}},
+    }
+
+
+def test_content_hash_ignores_order():
+    """TEST: Hashes depend on the data, not on the order its dicts were built in."""
+    assert content_hash({"a": 1, "b": {"c": 2, "d": 3}}) == content_hash({"b": {"d": 3, "c": 2}, "a": 1})
+    assert content_hash({"a": 1}) != content_hash({"a": 2})
+
+    one = inventory_hashes(inventory_with({"hostone": {"a": 1}, "hosttwo": {}}))
+    two = inventory_hashes(inventory_with({"hosttwo": {}, "hostone": {"a": 1}}))
+    assert inventory_digest(one) == inventory_digest(two)
+
+
+def test_changes_folded():
+    """TEST: Diffs after since fold into where each host started and where it is now."""
+    log = ChangeLog()
+    log.record(1, {"main": inventory_with({"kept": {}, "edited": {"a": 1}, "dropped": {}, "flapping": {}})})
+    log.record(2, {"main": inventory_with({"kept": {}, "edited": {"a": 2}, "brief": {}, "flapping": {}})})
+    log.record(3, {"main": inventory_with({"kept": {}, "edited": {"a": 2}, "new": {}, "flapping": {"b": 1}})})
+
+    assert log.changes("main", 1, 3)["hosts"] == {
+        "added": ["new"],  # "brief" came and went in between, so never happened
+        "removed": ["dropped"],
+        "changed": ["edited", "flapping"],
+    }
+    assert log.changes("main", 2, 3)["hosts"] == {"added": ["new"], "removed": ["brief"], "changed": ["flapping"]}
+
+    current = log.changes("main", 3, 3)
+    assert not current["reset"]
+    assert current["hosts"] == current["groups"] == {"added": [], "removed": [], "changed": []}
+
+
+def test_resets():
+    """TEST: A since the feed can't answer, from before it, another process or the future, asks for a full fetch."""
+    log = ChangeLog(keep=2)
+    for generation in range(1, 5):
+        log.record(generation, {"main": inventory_with({f"host{generation}": {}})})
+
+    assert log.changes("main", 0, 4)["reset"]  # Before the first build
+    assert log.changes("main", 1, 4)["reset"]  # Its diff was dropped to keep two
+    assert not log.changes("main", 2, 4)["reset"]
+    assert log.changes("main", 5, 4)["reset"]
+    assert log.changes("main", 3, 4, epoch="another")["reset"]
+    assert not log.changes("main", 3, 4, epoch=log.epoch)["reset"]
+    assert log.changes("nope", 3, 4)["reset"]
+
+
+def test_recorded_ahead_of_generation():
+    """TEST: Asked about a generation before the last one recorded, the log answers as of that generation."""
+    log = ChangeLog()
+    log.record(1, {"main": inventory_with({"kept": {}})})
+    log.record(2, {"main": inventory_with({"kept": {}, "added": {}})})
+    before = log.changes("main", 1, 2)
+    log.record(3, {"main": inventory_with({"kept": {"a": 1}})})  # Generation 3 not started yet
+
+    assert log.changes("main", 1, 2) == before
+    assert log.span("main", 1, 2) == 1
+    assert log.changes("main", 2, 3)["hosts"] == {"added": [], "removed": ["added"], "changed": ["kept"]}
+
+    fresh = ChangeLog()
+    fresh.record(1, {"main": inventory_with({"kept": {}})})
+    assert fresh.changes("main", 0, 0)["reset"]
+
+
+def test_changes_route(client: TestClient, app: FastAPI, build_cmdb):
+    """TEST: The app serves the feed, and a poller that is up to date gets a 304 for its ETag."""
+    cmdb = build_cmdb(app.state.cmdb)
+    build_cmdb(cmdb)
+
+    response = client.get("/inventory/test_main/changes", params={"since": cmdb.generation - 1})
+    assert response.status_code == HTTPStatus.OK
+    answer = response.json()
+    assert answer["generation"] == cmdb.generation
+    assert not answer["reset"]
+    assert answer["hosts"] == {"added": [], "removed": [], "changed": []}  # Built twice from the same files
+
+    unchanged = client.get(
+        "/inventory/test_main/changes",
+        params={"since": cmdb.generation, "epoch": answer["epoch"]},
+        headers={"If-None-Match": response.headers["etag"]},
+    )
+    assert unchanged.status_code == HTTPStatus.NOT_MODIFIED
+    assert unchanged.content == b""
+
+    assert client.get("/inventory/test_main/changes", params={"since": 0}).json()["reset"]
+    assert client.get("/inventory/nope/changes", params={"since": 0}).status_code == HTTPStatus.NOT_FOUND
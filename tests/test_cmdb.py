@@ -1,7 +1,14 @@
 """Tests the AnsibleCMDB object."""
 
-from ansibleinventorycmdb.cmdb import AnsibleCMDB
-from ansibleinventorycmdb.config import Config
+import asyncio
+
+import pytest
+
+from ansibleinventorycmdb.cmdb import VARS_MANIFEST, AnsibleCMDB, NotCachedError
+from ansibleinventorycmdb.config import Config, Inventory
+from ansibleinventorycmdb.urlcache import UrlCache
+
+BASE = "https://git.example.com/playbooks"
 
 
 def test_object_creation(tmp_path, get_test_config, build_cmdb):
@@ -26,11 +33,72 @@ def test_object_creation(tmp_path, get_test_config, build_cmdb):
 
 
 def test_url_cache_reload(tmp_path, get_test_config, build_cmdb):
-    """TEST: A second CMDB picks up the pickled url cache written by the first and flags a refresh."""
+    """TEST: A second CMDB builds from the url cache the first left on disk, fetching no vars, and flags a refresh."""
     inventories = Config(**get_test_config("valid.yml")).cmdb
 
     build_cmdb(AnsibleCMDB(instance_path=str(tmp_path), inventories=inventories))
 
     cmdb = AnsibleCMDB(instance_path=str(tmp_path), inventories=inventories)
-    assert cmdb.url_cache != {}
     assert cmdb.refresh_required
+
+    async def no_fetching(url: str) -> None:
+        if not url.endswith(VARS_MANIFEST):  # The listing is asked for every build, it's what saves the probes
+            pytest.fail(f"Fetched {url}, which was cached")
+
+    asyncio.run(cmdb.build(no_fetching))
+    assert set(cmdb.get_inventory("test_main")["hosts"]) == {"hostone", "hosttwo", "grouptwo"}
+    assert cmdb.url_cache.stats()["disk_reads"] > 0
+
+
+def test_cached_per_generation(tmp_path, get_test_config, build_cmdb):
+    """TEST: cached() computes once per build, and every build starts a new generation."""
+    cmdb = build_cmdb(AnsibleCMDB(instance_path=str(tmp_path), inventories=Config(**get_test_config("valid.yml")).cmdb))
+    generation = cmdb.generation
+    calls = []
+
+    def compute() -> int:
+        calls.append(1)
+        return len(calls)
+
+    assert cmdb.cached("key", compute) == 1
+    assert cmdb.cached("key", compute) == 1
+
+    build_cmdb(cmdb)
+    assert cmdb.generation == generation + 1
+    assert cmdb.cached("key", compute) == 2  # noqa: PLR2004 Computed a second time, for the new generation
+
+
+def test_offline_build(tmp_path):
+    """TEST: An offline build rebuilds from the cache on disk alone, 404s and vars listings included."""
+    responses = {
+        f"{BASE}/inventory/main.yml": "all:\n  hosts:\n    hostone:\n    hosttwo:\n",
+        f"{BASE}/host_vars/hostone.yml": "a: 1\n",
+    }  # No VARS_MANIFEST, so every other vars file is probed for and 404s
+    requested: list[str] = []
+
+    async def fetch_text(url: str) -> str | None:
+        requested.append(url)
+        return responses.get(url)
+
+    inventories = {"main": Inventory(inventory_url=f"{BASE}/inventory/main.yml", schema_mapping={"a": "A"})}
+    online = AnsibleCMDB(inventories, str(tmp_path))
+    asyncio.run(online.build(fetch_text))
+    assert f"{BASE}/{VARS_MANIFEST}" in requested
+
+    requested.clear()
+    offline = AnsibleCMDB(inventories, str(tmp_path))
+    asyncio.run(offline.build(fetch_text, offline=True))  # Offline wins over any fetcher
+    assert requested == []
+    assert offline.complete()
+    assert offline.inventories == online.inventories
+
+
+def test_offline_build_missing(tmp_path):
+    """TEST: Offline, a file that was never cached, or no cache at all, fails the build rather than leaving a hole."""
+    inventory = Inventory(inventory_url=f"{BASE}/inventory/main.yml", schema_mapping={"a": "A"})
+    with pytest.raises(NotCachedError, match="No URL cache"):
+        asyncio.run(AnsibleCMDB({"main": inventory}, str(tmp_path)).build(offline=True))
+
+    asyncio.run(UrlCache(str(tmp_path / "url_cache"), max_bytes=1).put("unrelated", {"a": 1}))
+    with pytest.raises(NotCachedError, match=f"{BASE}/"):
+        asyncio.run(AnsibleCMDB({"main": inventory}, str(tmp_path)).build(offline=True))
@@ -0,0 +1,59 @@
+"""Tests the pre-compression helpers shared by the app and the static site."""
+
+import gzip
+
+import pytest
+
+from ansibleinventorycmdb.encoding import MIN_COMPRESS_BYTES, compress, gzip_compress, is_compressible, negotiate
+
+BODY = b"<tr><td>hostone.pytest.internal</td></tr>\n" * 100
+
+
+@pytest.mark.parametrize(
+    ("accept_encoding", "expected"),
+    [
+        (None, "identity"),
+        ("", "identity"),
+        ("gzip", "gzip"),
+        ("gzip, deflate, br", "gzip"),
+        ("br", "identity"),
+        ("gzip;q=0", "identity"),
+        ("*", "gzip"),
+        ("*;q=0.5, gzip;q=0", "identity"),
+        ("GZIP;q=0.7", "gzip"),
+        ("gzip;q=nonsense", "identity"),
+    ],
+)
+def test_negotiate(accept_encoding, expected):
+    """TEST: Accept-Encoding is followed, q-values included, and identity is the fallback."""
+    assert negotiate(accept_encoding, {"identity", "gzip"}) == expected
+
+
+def test_negotiate_prefers_zstd_at_equal_weight():
+    """TEST: zstd wins a tie, but not against a higher q-value for gzip."""
+    available = {"identity", "gzip", "zstd"}
+    assert negotiate("gzip, zstd", available) == "zstd"
+    assert negotiate("gzip, zstd;q=0.5", available) == "gzip"
+
+
+def test_compress():
+    """TEST: Every variant decodes to the original, and small bodies aren't compressed at all."""
+    variants = compress(BODY)
+    assert variants["identity"] is BODY
+    assert gzip.decompress(variants["gzip"]) == BODY
+    assert len(variants["gzip"]) < len(BODY)
+
+    assert compress(b"x" * (MIN_COMPRESS_BYTES - 1)).keys() == {"identity"}
+
+
+def test_gzip_is_reproducible():
+    """TEST: The same body always compresses to the same bytes, so a rebuild doesn't look like a change."""
+    assert gzip_compress(BODY) == gzip_compress(BODY)
+
+
+def test_is_compressible():
+    """TEST: Text compresses, already-compressed formats don't."""
+    assert is_compressible("text/html; charset=utf-8")
+    assert is_compressible("application/json")
+    assert not is_compressible("font/woff2")
+    assert not is_compressible("image/png")
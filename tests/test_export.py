@@ -0,0 +1,59 @@
+"""Tests the NDJSON and CSV bulk exports."""
+
+import csv
+import datetime as dt
+import io
+import json
+
+from ansibleinventorycmdb.config import Config
+from ansibleinventorycmdb.export import EXPORT_CHUNK_BYTES, csv_fields, export_objects, iter_csv, iter_ndjson
+
+HOSTS = {
+    "web1": {"groups": ["web"], "vars": {"ip": "10.0.0.1", "ports": [80, 443], "since": dt.date(2024, 1, 2)}},
+    "db1": {"groups": ["db"], "vars": {"ip": "10.0.0.2", "note": 'has "quotes", and a comma'}},
+}
+
+
+def test_ndjson():
+    """TEST: One parseable line per host, dates included."""
+    lines = b"".join(iter_ndjson(HOSTS)).decode().splitlines()
+    records = [json.loads(line) for line in lines]
+
+    assert [record["host"] for record in records] == ["web1", "db1"]
+    assert records[0]["groups"] == ["web"]
+    assert records[0]["vars"]["since"] == "2024-01-02"
+
+
+def test_csv():
+    """TEST: A header, then a row per host, with lists as JSON and missing vars empty."""
+    rows = list(csv.reader(io.StringIO(b"".join(iter_csv(HOSTS, ["ip", "ports", "note"])).decode())))
+
+    assert rows[0] == ["host", "ip", "ports", "note"]
+    assert rows[1] == ["web1", "10.0.0.1", "[80, 443]", ""]
+    assert rows[2] == ["db1", "10.0.0.2", "", 'has "quotes", and a comma']
+
+
+def test_streams_in_chunks():
+    """TEST: The first row comes out alone, then rows are batched rather than held until the end."""
+    hosts = {f"host{i}": {"groups": [], "vars": {"padding": "x" * 1000}} for i in range(500)}
+    chunks = list(iter_ndjson(hosts))
+
+    assert chunks[0].count(b"\n") == 1
+    assert len(chunks) > 2  # noqa: PLR2004 More than the first row plus one chunk holding everything else
+    assert all(len(chunk) < EXPORT_CHUNK_BYTES + 2000 for chunk in chunks)  # A chunk plus one row
+
+
+def test_csv_fields():
+    """TEST: Explicit fields win over the schema_mapping."""
+    assert csv_fields({"a": "A", "b": "B"}) == ["a", "b"]
+    assert csv_fields({"a": "A"}, "x, y,") == ["x", "y"]
+
+
+def test_export_objects(get_test_config):
+    """TEST: The CLI's exports land at the same keys the app serves them at."""
+    config = Config(**get_test_config("valid.yml"))
+    exports = {key: b"".join(chunks) for key, chunks, _ in export_objects({"test_main": {"hosts": HOSTS}}, config.cmdb)}
+
+    assert set(exports) == {"inventory/test_main/export.ndjson", "inventory/test_main/export.csv"}
+    assert exports["inventory/test_main/export.ndjson"] == b"".join(iter_ndjson(HOSTS))
+    assert exports["inventory/test_main/export.csv"].startswith(b"host,ansible_host,")
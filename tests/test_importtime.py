@@ -0,0 +1,67 @@
+"""Holds the package's entry points to an import-time budget.
+
+The cron-driven generate CLI, the Worker and each autoscaled app container all pay for their imports before doing
+any work. Two budgets per entry point: dependencies it must not load at import, which is exact, and a time, which
+is a generous multiple of what it takes on a laptop so that only a real regression trips it. The times still
+depend on the machine, and a loaded CI runner can blow any of them, so they're marked `timing` and only run with
+`pytest -m timing`. Run `python -m benchmarks.importtime <module>` to see where the time goes.
+"""
+
+import pytest
+
+from benchmarks.importtime import import_times, parse_importtime, total_ms
+
+HEAVY = {"fastapi", "httpx", "jinja2", "pydantic", "uvicorn", "yaml"}
+
+# module: (dependencies it may load at import, milliseconds)
+BUDGETS = {
+    "ansibleinventorycmdb": (set(), 50),  # Resolves create_app lazily
+    "ansibleinventorycmdb.bundle": (set(), 150),  # The Worker, before a handler runs
+    "ansibleinventorycmdb.site": (set(), 300),  # The generate CLI, and the Worker's build
+    "ansibleinventorycmdb.cmdb": ({"yaml"}, 300),  # Parses inventories; fetches with httpx only when asked to
+    "ansibleinventorycmdb.app": ({"fastapi", "jinja2", "pydantic", "yaml"}, 1500),  # Everything serving needs
+}
+
+# Runs per measurement, keeping the fastest. The slowest says more about the machine than about the code.
+RUNS = 3
+
+SAMPLE_OUTPUT = """\
+import time: self [us] | cumulative | imported package
+import time:       200 |        200 | encodings
+-- importtime start --
+import time:       100 |        100 |     yaml.error
+import time:      1000 |       1100 |   yaml
+import time:       500 |       1600 | mypackage
+"""
+
+
+def test_parse_importtime():
+    """TEST: Only what came after interpreter startup is kept, with each module's depth and timings."""
+    modules = parse_importtime(SAMPLE_OUTPUT)
+
+    assert [(module["module"], module["depth"]) for module in modules] == [
+        ("yaml.error", 2),
+        ("yaml", 1),
+        ("mypackage", 0),
+    ]
+    assert modules[1]["self_us"] == 1000  # noqa: PLR2004
+    assert total_ms(modules) == 1.6  # noqa: PLR2004
+
+
+@pytest.mark.parametrize(("module", "budget"), BUDGETS.items())
+def test_import_dependencies(module, budget):
+    """TEST: Importing an entry point loads no heavy dependency it doesn't need."""
+    allowed, _ = budget
+
+    loaded = {entry["module"].partition(".")[0] for entry in import_times(module)}
+    assert loaded & HEAVY <= allowed, f"{module} imports {sorted((loaded & HEAVY) - allowed)} at import"
+
+
+@pytest.mark.timing
+@pytest.mark.parametrize(("module", "budget"), BUDGETS.items())
+def test_import_budget(module, budget):
+    """TEST: Importing an entry point stays within its time."""
+    _, budget_ms = budget
+    runs = [import_times(module) for _ in range(RUNS)]
+
+    assert min(total_ms(modules) for modules in runs) < budget_ms
@@ -4,12 +4,13 @@ from __future__ import annotations
 
 import logging
 import os
+from logging.handlers import QueueHandler
 from typing import TYPE_CHECKING
 
 import pytest
 
 import ansibleinventorycmdb.logger
-from ansibleinventorycmdb.logger import LoggingConfig, _add_file_handler, _set_log_level
+from ansibleinventorycmdb.logger import LoggingConfig, _add_file_handler, _remove_queue, _set_log_level
 
 if TYPE_CHECKING:
     from collections.abc import Generator
@@ -27,6 +28,7 @@ def logger() -> Generator:
     yield logger
 
     # Reset the test object since it will persist.
+    _remove_queue(logger)
     for handler in logger.handlers[:]:
         logger.removeHandler(handler)
         handler.close()
@@ -65,7 +67,8 @@ def test_handler_console_added(logger):
 
 def test_handler_file_added(logger, tmp_path):
     """Test logging file handler."""
-    logging_conf = LoggingConfig(level="INFO", path=os.path.join(tmp_path, "test.log"))  # Test file handler
+    # Test file handler, attached directly
+    logging_conf = LoggingConfig(level="INFO", path=os.path.join(tmp_path, "test.log"), queue=False)
 
     # TEST: Two handlers when logging to file expected
     ansibleinventorycmdb.logger.setup_logger(logging_conf, logger)
@@ -76,6 +79,39 @@ def test_handler_file_added(logger, tmp_path):
     assert len(logger.handlers) == 2  # noqa: PLR2004 A console and a file handler are expected
 
 
+def test_handlers_queued(logger, tmp_path):
+    """Test logging through the queue."""
+    log_path = tmp_path / "test.log"
+    logging_conf = LoggingConfig(level="DEBUG", path=str(log_path))
+
+    # TEST: The console and file handlers sit behind one QueueHandler, however many times the logger is set up
+    ansibleinventorycmdb.logger.setup_logger(logging_conf, logger)
+    ansibleinventorycmdb.logger.setup_logger(logging_conf, logger)
+    assert len(logger.handlers) == 1
+    queue_handler = logger.handlers[0]
+    assert isinstance(queue_handler, QueueHandler)
+    assert len(queue_handler.listener.handlers) == 2  # noqa: PLR2004 A console and a file handler are expected
+
+    # TEST: Records reach the file once the listener has drained the queue
+    logger.debug("Getting URL: %s", "https://example.com/host_vars/host.yml")
+    _remove_queue(logger)
+    assert "DEBUG:TEST_LOGGER:Getting URL: https://example.com/host_vars/host.yml" in log_path.read_text()
+
+    # TEST: Taking the queue down puts its handlers back on the logger
+    assert len(logger.handlers) == 2  # noqa: PLR2004
+
+
+def test_foreign_handlers_not_queued(logger):
+    """TEST: Handlers the logger module didn't add, like pytest's, stay on the logger rather than being queued."""
+    foreign = logging.NullHandler()
+    logger.addHandler(foreign)
+
+    ansibleinventorycmdb.logger.setup_logger(LoggingConfig(), logger)
+
+    assert foreign in logger.handlers
+    assert len(logger.handlers) == 2  # noqa: PLR2004 The foreign handler and the QueueHandler
+
+
 @pytest.mark.parametrize(
     ("log_level_in", "log_level_expected"),
     [
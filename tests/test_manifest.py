@@ -0,0 +1,142 @@
+"""Tests the incremental, atomically published static-site writer."""
+
+import json
+
+import pytest
+
+from ansibleinventorycmdb.manifest import MANIFEST_NAME, SiteWriter, content_hash, dump_manifest
+
+
+def publish(out_dir, objects: dict[str, bytes]) -> dict[str, int]:
+    with SiteWriter(out_dir) as writer:
+        for key, body in objects.items():
+            writer.write(key, body)
+        return writer.publish()
+
+
+def test_first_publish(tmp_path):
+    """TEST: A first run writes everything and leaves the output directory a symlink to the release."""
+    out_dir = tmp_path / "site"
+
+    counts = publish(out_dir, {"index.html": b"home", "inventory/x/index.html": b"x"})
+
+    assert counts == {"written": 2, "skipped": 0, "deleted": 0}
+    assert out_dir.is_symlink()
+    assert (out_dir / "inventory/x/index.html").read_bytes() == b"x"
+    assert json.loads((out_dir / MANIFEST_NAME).read_bytes()) == {
+        "index.html": content_hash(b"home"),
+        "inventory/x/index.html": content_hash(b"x"),
+    }
+
+
+def test_incremental_publish(tmp_path):
+    """TEST: Unchanged objects are linked rather than rewritten, orphans dropped, and old releases pruned."""
+    out_dir = tmp_path / "site"
+    publish(out_dir, {"index.html": b"home", "a": b"a", "gone": b"gone"})
+    inode = (out_dir / "index.html").stat().st_ino
+
+    counts = publish(out_dir, {"index.html": b"home", "a": b"changed"})
+
+    assert counts == {"written": 1, "skipped": 1, "deleted": 1}
+    assert (out_dir / "index.html").stat().st_ino == inode
+    assert (out_dir / "a").read_bytes() == b"changed"
+    assert not (out_dir / "gone").exists()
+
+    publish(out_dir, {"index.html": b"home"})
+    assert len(list((tmp_path / ".site.releases").iterdir())) == 2  # noqa: PLR2004 Current and previous
+
+
+def test_write_chunks(tmp_path):
+    """TEST: A streamed object that turns out unchanged counts as skipped, and is linked like any other."""
+    out_dir = tmp_path / "site"
+    for expected in ({"written": 1, "skipped": 0, "deleted": 0}, {"written": 0, "skipped": 1, "deleted": 0}):
+        with SiteWriter(out_dir) as writer:
+            writer.write_chunks("export.csv", iter([b"host\n", b"one\n"]))
+            assert writer.publish() == expected
+
+    assert (out_dir / "export.csv").read_bytes() == b"host\none\n"
+
+
+def test_plain_directory_taken_over(tmp_path):
+    """TEST: A plain directory with a manifest is reused and replaced by the symlink, then pruned like a release."""
+    out_dir = tmp_path / "site"
+    out_dir.mkdir()
+    (out_dir / "index.html").write_bytes(b"home")
+    (out_dir / "orphan.html").write_bytes(b"old")
+    (out_dir / MANIFEST_NAME).write_bytes(
+        dump_manifest({"index.html": content_hash(b"home"), "orphan.html": content_hash(b"old")})
+    )
+
+    counts = publish(out_dir, {"index.html": b"home"})
+
+    assert counts == {"written": 0, "skipped": 1, "deleted": 1}
+    assert out_dir.is_symlink()
+    assert (out_dir / "index.html").read_bytes() == b"home"
+
+    publish(out_dir, {"index.html": b"home"})
+    publish(out_dir, {"index.html": b"home"})
+    assert not any(release.name.endswith("-legacy") for release in (tmp_path / ".site.releases").iterdir())
+
+
+def test_foreign_directory_refused(tmp_path):
+    """TEST: A directory without a manifest isn't a site this wrote, so it is refused and left alone."""
+    out_dir = tmp_path / "www"
+    out_dir.mkdir()
+    (out_dir / "index.html").write_bytes(b"someone else's")
+
+    with pytest.raises(FileExistsError, match="isn't a site this wrote"):
+        publish(out_dir, {"index.html": b"home"})
+
+    assert not out_dir.is_symlink()
+    assert (out_dir / "index.html").read_bytes() == b"someone else's"
+    assert not (tmp_path / ".www.releases").exists()
+
+
+def test_legacy_release_with_strays_kept(tmp_path):
+    """TEST: A taken-over directory holding files its manifest doesn't list is never pruned."""
+    out_dir = tmp_path / "site"
+    out_dir.mkdir()
+    (out_dir / MANIFEST_NAME).write_bytes(dump_manifest({}))
+    (out_dir / "notes.txt").write_bytes(b"not the site's")
+
+    for _ in range(3):
+        publish(out_dir, {"index.html": b"home"})
+
+    legacy = [release for release in (tmp_path / ".site.releases").iterdir() if release.name.endswith("-legacy")]
+    assert [(release / "notes.txt").read_bytes() for release in legacy] == [b"not the site's"]
+
+
+def test_failed_write_leaves_site_alone(tmp_path):
+    """TEST: An exception before publish leaves the current release published and removes the new one."""
+    out_dir = tmp_path / "site"
+    publish(out_dir, {"index.html": b"home"})
+    current = out_dir.resolve()
+
+    def write_then_fail() -> None:
+        with SiteWriter(out_dir) as writer:
+            writer.write("index.html", b"half")
+            raise RuntimeError
+
+    with pytest.raises(RuntimeError):
+        write_then_fail()
+
+    assert out_dir.resolve() == current
+    assert (out_dir / "index.html").read_bytes() == b"home"
+    assert list((tmp_path / ".site.releases").iterdir()) == [current]
+
+
+def test_carry_over(tmp_path):
+    """TEST: A release that only wrote what changed carries over the rest of the current one, bar what keep rejects."""
+    out_dir = tmp_path / "site"
+    publish(out_dir, {"index.html": b"home", "host/kept/index.html": b"kept", "host/gone/index.html": b"gone"})
+
+    with SiteWriter(out_dir) as writer:
+        writer.write("index.html", b"new home")
+        writer.carry_over(lambda key: not key.startswith("host/gone/"))
+        counts = writer.publish()
+
+    assert counts == {"written": 1, "skipped": 1, "deleted": 1}
+    assert (out_dir / "index.html").read_bytes() == b"new home"
+    assert (out_dir / "host/kept/index.html").read_bytes() == b"kept"
+    assert not (out_dir / "host/gone/index.html").exists()
+    assert set(json.loads((out_dir / MANIFEST_NAME).read_bytes())) == {"index.html", "host/kept/index.html"}
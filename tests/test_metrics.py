@@ -0,0 +1,86 @@
+"""Tests the metrics registry, its Prometheus text format, and what a build records."""
+
+import asyncio
+from http import HTTPStatus
+
+import pytest
+
+from ansibleinventorycmdb import metrics
+from ansibleinventorycmdb.cmdb import AnsibleCMDB
+from ansibleinventorycmdb.config import Config
+
+
+@pytest.fixture
+def registry(monkeypatch) -> metrics.Registry:
+    """A registry of its own, so metrics declared by a test don't collide with the package's."""
+    registry = metrics.Registry()
+    monkeypatch.setattr(metrics, "REGISTRY", registry)
+    return registry
+
+
+def test_exposition(registry):
+    """TEST: Counters, gauges and histograms come out in the text format, labels escaped, buckets cumulative."""
+    counter = metrics.Counter("test_requests_total", "Requests.", ("origin",))
+    gauge = metrics.Gauge("test_generation", "Generation.")
+    histogram = metrics.Histogram("test_seconds", "Seconds.", buckets=(0.1, 1.0))
+
+    counter.inc('a"b')
+    counter.inc('a"b', amount=2)
+    gauge.set(3)
+    for value in (0.05, 0.5, 5):
+        histogram.observe(value)
+
+    assert registry.exposition().splitlines() == [
+        "# HELP test_requests_total Requests.",
+        "# TYPE test_requests_total counter",
+        'test_requests_total{origin="a\\"b"} 3',
+        "# HELP test_generation Generation.",
+        "# TYPE test_generation gauge",
+        "test_generation 3",
+        "# HELP test_seconds Seconds.",
+        "# TYPE test_seconds histogram",
+        'test_seconds_bucket{le="0.1"} 1',
+        'test_seconds_bucket{le="1"} 2',
+        'test_seconds_bucket{le="+Inf"} 3',
+        "test_seconds_sum 5.55",
+        "test_seconds_count 3",
+    ]
+    assert registry.snapshot()["test_seconds"] == {"": {"count": 3, "sum": 5.55}}
+
+    registry.reset()
+    assert registry.snapshot() == {}
+
+
+def test_duplicate_metric(registry):
+    """TEST: Two metrics can't share a name."""
+    metrics.Counter("test_total", "Once.")
+    with pytest.raises(ValueError, match="test_total"):
+        metrics.Counter("test_total", "Twice.")
+
+
+def test_build_records(tmp_path, get_test_config, build_cmdb, inventory_server):
+    """TEST: A build records its fetches, URL cache lookups, YAML parses, phases and generation."""
+    metrics.REGISTRY.reset()
+    config = Config(**get_test_config("valid.yml"))
+    cmdb = build_cmdb(AnsibleCMDB(config.cmdb, str(tmp_path)))
+    asyncio.run(cmdb.build())  # Without a refresh, from the URL cache
+
+    snapshot = metrics.REGISTRY.snapshot()
+    origin = inventory_server.removeprefix("http://")
+    assert snapshot["aic_fetch_requests_total"][f"origin={origin},status_class=2xx"] > 0
+    assert snapshot["aic_fetch_bytes_total"][f"origin={origin}"] > 0
+    assert snapshot["aic_url_cache_total"]["result=hit"] > 0
+    assert snapshot["aic_yaml_parse_seconds"][""]["count"] > 0
+    assert {"phase=skeleton", "phase=vars", "phase=write_output", "phase=total"} <= snapshot[
+        "aic_build_phase_seconds"
+    ].keys()
+    assert snapshot["aic_build_generation"] == {"": 2}
+
+
+def test_metrics_route(client):
+    """TEST: /metrics serves every metric in the Prometheus text format."""
+    response = client.get("/metrics")
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert "# TYPE aic_fetch_requests_total counter" in response.text
@@ -0,0 +1,133 @@
+"""Tests on-demand profiling of builds and requests."""
+
+import asyncio
+import threading
+import time
+from http import HTTPStatus
+
+import pytest
+from fastapi.testclient import TestClient
+
+from ansibleinventorycmdb import profiling
+from ansibleinventorycmdb.app import create_app
+from ansibleinventorycmdb.cmdb import AnsibleCMDB
+from ansibleinventorycmdb.config import Config
+
+TOKEN = "test-token"  # noqa: S105
+
+
+@pytest.fixture
+def admin(monkeypatch) -> dict[str, str]:
+    """The admin token configured, and the header that presents it."""
+    monkeypatch.setenv(profiling.ADMIN_TOKEN_ENV_VAR, TOKEN)
+    return {"Authorization": f"Bearer {TOKEN}"}
+
+
+def test_profiled(tmp_path, monkeypatch):
+    """TEST: A profiled block saves a .pstats and a .txt report, and only the newest KEEP_PROFILES are kept."""
+    monkeypatch.setattr(profiling, "KEEP_PROFILES", 2)
+
+    async def profile() -> None:
+        async with profiling.profiled(str(tmp_path), "a/test label"):
+            sorted(str(number) for number in range(1000))
+
+    for _ in range(3):
+        asyncio.run(profile())
+
+    names = profiling.list_profiles(str(tmp_path))
+    assert len(names) == 2  # noqa: PLR2004
+    assert names[0].endswith("-a-test-label")
+    report = (profiling.profiles_dir(str(tmp_path)) / f"{names[0]}.txt").read_text()
+    assert "functions by cumulative time" in report
+    assert "memory they allocated" in report
+    assert len(list(profiling.profiles_dir(str(tmp_path)).iterdir())) == 4  # noqa: PLR2004
+
+
+def test_profiled_nested(tmp_path):
+    """TEST: A block inside a running profile runs unprofiled, rather than failing on the profiler in use."""
+
+    async def profile() -> None:
+        async with profiling.profiled(str(tmp_path), "outer"), profiling.profiled(str(tmp_path), "inner"):
+            pass
+
+    asyncio.run(profile())
+
+    assert [name.rpartition("-")[2] for name in profiling.list_profiles(str(tmp_path))] == ["outer"]
+
+
+def test_saved_off_the_event_loop(tmp_path, monkeypatch):
+    """TEST: A profile is saved in a thread, so the event loop keeps running while it's written."""
+    saved_on: list[bool] = []
+    save = profiling._save
+
+    def slow_save(*args) -> None:
+        saved_on.append(threading.current_thread() is threading.main_thread())
+        time.sleep(0.1)
+        save(*args)
+
+    monkeypatch.setattr(profiling, "_save", slow_save)
+
+    async def profile_beside_a_ticker() -> int:
+        ticks = 0
+
+        async def tick() -> None:
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        ticker = asyncio.create_task(tick())
+        async with profiling.profiled(str(tmp_path), "slow"):
+            await asyncio.sleep(0)
+        ticker.cancel()
+        return ticks
+
+    assert asyncio.run(profile_beside_a_ticker()) > 3  # noqa: PLR2004 About 10, a few with a loaded machine
+    assert saved_on == [False]
+
+
+def test_build_profiled_from_env(tmp_path, monkeypatch, get_test_config, build_cmdb):
+    """TEST: AIC_PROFILE=build profiles builds into the instance path."""
+    monkeypatch.setenv(profiling.PROFILE_ENV_VAR, "build")
+
+    build_cmdb(AnsibleCMDB(Config(**get_test_config("valid.yml")).cmdb, str(tmp_path)))
+
+    assert [name.rpartition("-")[2] for name in profiling.list_profiles(str(tmp_path))] == ["build"]
+
+
+def test_admin_routes_need_token(client, monkeypatch):
+    """TEST: Without a token configured, or with the wrong one, the admin routes are a plain 404."""
+    assert client.post("/admin/profile").status_code == HTTPStatus.NOT_FOUND
+
+    monkeypatch.setenv(profiling.ADMIN_TOKEN_ENV_VAR, TOKEN)
+    response = client.get("/admin/profiles", headers={"Authorization": "Bearer wrong"})
+    assert response.status_code == HTTPStatus.NOT_FOUND
+
+
+def test_profile_next_build(client, app, admin, build_cmdb, tmp_path):
+    """TEST: POST /admin/profile profiles the next build only, and its profile can be listed and downloaded."""
+    assert client.post("/admin/profile", headers=admin).status_code == HTTPStatus.OK
+    build_cmdb(app.state.cmdb)
+    build_cmdb(app.state.cmdb)
+
+    names = client.get("/admin/profiles", headers=admin).json()["profiles"]
+    assert len(names) == 1
+
+    response = client.get(f"/admin/profiles/{names[0]}.txt", headers=admin)
+    assert response.status_code == HTTPStatus.OK
+    assert "functions by cumulative time" in response.text
+
+    assert client.get(f"/admin/profiles/{names[0]}.pstats", headers=admin).status_code == HTTPStatus.OK
+    for missing in ("nope.txt", "..%2Fconfig.yml", f"{names[0]}.py"):
+        assert client.get(f"/admin/profiles/{missing}", headers=admin).status_code == HTTPStatus.NOT_FOUND
+    assert str(tmp_path) in str(profiling.profiles_dir(app.state.instance_path))
+
+
+def test_request_sampling(tmp_path, monkeypatch, get_test_config):
+    """TEST: AIC_PROFILE_REQUESTS installs the sampler, which profiles that fraction of requests."""
+    monkeypatch.setenv(profiling.PROFILE_REQUESTS_ENV_VAR, "1")
+    client = TestClient(create_app(config=Config(**get_test_config("valid.yml")), instance_path=str(tmp_path)))
+
+    assert client.get("/health").status_code == HTTPStatus.OK
+
+    assert [name.partition("-")[2] for name in profiling.list_profiles(str(tmp_path))] == ["request-GET-health"]
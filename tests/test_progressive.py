@@ -0,0 +1,83 @@
+"""Tests serving each inventory from its skeleton on, while its vars files are still being fetched."""
+
+import asyncio
+
+from ansibleinventorycmdb.cmdb import PHASE_PENDING, PHASE_READY, PHASE_SKELETON, AnsibleCMDB
+from ansibleinventorycmdb.config import Inventory
+
+BASE = "https://git.example.com/playbooks"
+MAIN = "all:\n  hosts:\n    hostone:\n      inline: 1\n    hosttwo:\n"
+RESPONSES = {
+    f"{BASE}/inventory/main.yml": MAIN,
+    f"{BASE}/host_vars/hostone.yml": "from_file: 2\ninline: 3\n",
+    f"{BASE}/group_vars/all.yml": "group_var: 4\n",
+}
+
+
+def slow_vars_fetcher(release: asyncio.Event, waiting: asyncio.Event):
+    """A fetch answering from RESPONSES, holding back every vars file until release is set. Sets waiting once held."""
+
+    async def fetch_text(url: str) -> str | None:
+        if "_vars/" in url:
+            waiting.set()
+            await release.wait()
+        return RESPONSES.get(url)
+
+    return fetch_text
+
+
+def test_skeleton_before_vars():
+    """TEST: An inventory is published with its hosts and inline vars before its vars files have arrived."""
+    cmdb = AnsibleCMDB({"main": Inventory(inventory_url=f"{BASE}/inventory/main.yml", schema_mapping={"a": "A"})})
+    assert cmdb.phase("main") == PHASE_PENDING
+    assert cmdb.phase("nope") is None
+
+    async def build_in_steps() -> None:
+        release, waiting = asyncio.Event(), asyncio.Event()
+        build = asyncio.create_task(cmdb.build(slow_vars_fetcher(release, waiting)))
+        await waiting.wait()
+        assert cmdb.phase("main") == PHASE_SKELETON
+
+        skeleton = cmdb.get_inventory("main")
+        assert skeleton["hosts"]["hostone"] == {"groups": ["all"], "vars": {"inline": 1}}
+        assert skeleton["groups"] == {"all": {}}
+        assert not cmdb.ready
+        assert not cmdb.complete()
+        assert cmdb.cached("key", lambda: 1) == 1
+        assert cmdb._derived == {}  # Part built, so nothing is kept
+
+        release.set()
+        await build
+        assert skeleton["hosts"]["hostone"]["vars"] == {"inline": 1}  # A new dict replaced it, rather than changed
+
+    asyncio.run(build_in_steps())
+
+    assert cmdb.phase("main") == PHASE_READY
+    assert cmdb.ready
+    assert cmdb.get_host("main", "hostone")["vars"] == {"from_file": 2, "inline": 1}  # Inline vars win
+    assert cmdb.get_group("main", "all") == {"group_var": 4}
+
+
+def test_refresh_keeps_serving_complete():
+    """TEST: A refresh builds privately, an inventory already served complete isn't set back to its skeleton."""
+    cmdb = AnsibleCMDB({"main": Inventory(inventory_url=f"{BASE}/inventory/main.yml", schema_mapping={"a": "A"})})
+
+    async def build_then_refresh() -> dict:
+        release, waiting = asyncio.Event(), asyncio.Event()
+        release.set()
+        await cmdb.build(slow_vars_fetcher(release, waiting))
+        served = cmdb.get_inventory("main")
+
+        release, waiting = asyncio.Event(), asyncio.Event()
+        refresh = asyncio.create_task(cmdb.refresh(slow_vars_fetcher(release, waiting)))
+        await waiting.wait()
+        assert cmdb.phase("main") == PHASE_READY
+        assert cmdb.get_inventory("main") is served
+
+        release.set()
+        await refresh
+        return served
+
+    served = asyncio.run(build_then_refresh())
+    assert cmdb.get_inventory("main") is not served
+    assert cmdb.get_host("main", "hostone")["vars"] == {"from_file": 2, "inline": 1}
@@ -0,0 +1,107 @@
+"""Tests publishing to sinks with bounded concurrency."""
+
+import asyncio
+import io
+import tarfile
+import zipfile
+
+import pytest
+
+from ansibleinventorycmdb.publish import ArchiveSink, DirectorySink, Sink, publish, sink_for
+
+
+def site_objects() -> list:
+    """A few objects, one of them chunked like the exports. A function since the chunks can only be read once."""
+    return [
+        ("index.html", b"home", "text/html; charset=utf-8", ""),
+        ("inventory/x/index.html", b"x", "text/html; charset=utf-8", ""),
+        ("inventory/x/export.csv", iter([b"host\n", b"one\n"]), "text/csv; charset=utf-8", ""),
+    ]
+
+
+class SlowSink(Sink):
+    """Takes a while over each put, and records how many were in flight at once."""
+
+    def __init__(self, fail_on: str = "") -> None:
+        self.in_flight = 0
+        self.most_in_flight = 0
+        self.stored: list[str] = []
+        self.aborted = False
+        self.fail_on = fail_on
+
+    async def put(self, key, body, content_type, content_encoding) -> None:
+        if key == self.fail_on:
+            raise OSError(key)
+        self.in_flight += 1
+        self.most_in_flight = max(self.most_in_flight, self.in_flight)
+        await asyncio.sleep(0.001)
+        self.in_flight -= 1
+        self.stored.append(key)
+
+    async def abort(self) -> None:
+        self.aborted = True
+
+
+def test_bounded_concurrency_and_backpressure():
+    """TEST: No more than `concurrency` puts run at once, and rendering never runs far ahead of them."""
+    sink = SlowSink()
+    rendered = 0
+    most_ahead = 0
+
+    def objects():
+        nonlocal rendered, most_ahead
+        for index in range(50):
+            most_ahead = max(most_ahead, rendered - len(sink.stored))
+            rendered += 1
+            yield f"object{index}", b"", "text/plain", ""
+
+    asyncio.run(publish(objects(), sink, concurrency=4))
+
+    assert len(sink.stored) == 50  # noqa: PLR2004
+    assert sink.most_in_flight == 4  # noqa: PLR2004
+    assert most_ahead <= 4 * 2 + 1  # In flight, plus queued, plus the one being handed over
+
+
+def test_failed_put_aborts():
+    """TEST: A put that raises stops the publish, aborts the sink, and raises."""
+    sink = SlowSink(fail_on="object3")
+    objects = ((f"object{index}", b"", "text/plain", "") for index in range(20))
+
+    with pytest.raises(ExceptionGroup):
+        asyncio.run(publish(objects, sink))
+
+    assert sink.aborted
+
+
+def test_directory_sink(tmp_path):
+    """TEST: The directory sink writes bodies and chunks alike, and publishes the release."""
+    counts = asyncio.run(publish(site_objects(), DirectorySink(tmp_path / "site")))
+
+    assert counts == {"written": 3, "skipped": 0, "deleted": 0}
+    assert (tmp_path / "site/inventory/x/export.csv").read_bytes() == b"host\none\n"
+
+
+@pytest.mark.parametrize("archive_format", ["tar", "tar.gz"])
+def test_tar_sink(archive_format):
+    """TEST: A tar stream holds every object, in the order they were rendered."""
+    stream = io.BytesIO()
+    asyncio.run(publish(site_objects(), ArchiveSink(stream, archive_format)))
+
+    with tarfile.open(fileobj=io.BytesIO(stream.getvalue())) as archive:
+        assert archive.getnames() == ["index.html", "inventory/x/index.html", "inventory/x/export.csv"]
+        assert archive.extractfile("inventory/x/export.csv").read() == b"host\none\n"
+
+
+def test_zip_sink(tmp_path):
+    """TEST: A zip file holds every object, picked by the destination's suffix."""
+    sink = sink_for(str(tmp_path / "site.zip"))
+    assert asyncio.run(publish(site_objects(), sink)) == {"written": 3}
+
+    with zipfile.ZipFile(tmp_path / "site.zip") as archive:
+        assert archive.read("index.html") == b"home"
+
+
+def test_sink_for(tmp_path):
+    """TEST: A destination that isn't an archive, a stream or a bucket is a directory."""
+    assert isinstance(sink_for(str(tmp_path / "out")), DirectorySink)
+    assert isinstance(sink_for("-"), ArchiveSink)
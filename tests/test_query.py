@@ -0,0 +1,62 @@
+"""Tests the columnar var index behind the host query endpoint."""
+
+import pytest
+
+from ansibleinventorycmdb.query import QueryError, VarIndex, parse_clause
+
+HOSTS = {
+    "web1": {"groups": [], "vars": {"os_family": "Debian", "backup_enabled": True, "port": 22, "tags": ["a"]}},
+    "web2": {"groups": [], "vars": {"os_family": "Debian", "port": 2222}},
+    "db1": {"groups": [], "vars": {"os_family": "RedHat", "backup_enabled": False}},
+    "bare": {"groups": [], "vars": {}},
+}
+
+
+@pytest.mark.parametrize(
+    ("clause", "expected"),
+    [
+        ("os_family==Debian", ("os_family", "==", "Debian")),
+        ("os_family != Debian", ("os_family", "!=", "Debian")),
+        ("backup_enabled", ("backup_enabled", "exists", "")),
+        ("!backup_enabled", ("backup_enabled", "missing", "")),
+        ("url==http://a/?b==c", ("url", "==", "http://a/?b==c")),
+    ],
+)
+def test_parse_clause(clause, expected):
+    """TEST: Every clause form parses, and only the first operator splits it."""
+    assert parse_clause(clause) == expected
+
+
+@pytest.mark.parametrize("clause", ["", "==Debian", "!"])
+def test_parse_clause_invalid(clause):
+    """TEST: A clause with no var name is an error rather than a match on nothing."""
+    with pytest.raises(QueryError):
+        parse_clause(clause)
+
+
+@pytest.mark.parametrize(
+    ("clauses", "expected"),
+    [
+        ([], ["web1", "web2", "db1", "bare"]),
+        (["os_family==Debian"], ["web1", "web2"]),
+        (["os_family==Debian", "backup_enabled"], ["web1"]),
+        (["backup_enabled==true"], ["web1"]),
+        (["backup_enabled==false"], ["db1"]),
+        (["port==22"], ["web1"]),
+        (["os_family!=Debian"], ["db1", "bare"]),
+        (["!backup_enabled"], ["web2", "bare"]),
+        (["tags"], ["web1"]),
+        (["tags==a"], []),
+        (["nope==x"], []),
+    ],
+)
+def test_select(clauses, expected):
+    """TEST: Clauses combine as AND, and matches come back in inventory order."""
+    assert VarIndex(HOSTS).select(clauses) == expected
+
+
+def test_project():
+    """TEST: Only the requested fields are returned, and a host missing one just leaves it out."""
+    index = VarIndex(HOSTS)
+    assert index.project(["web1", "db1"], ["port"]) == {"web1": {"port": 22}, "db1": {}}
+    assert index.project(["web2"], None) == {"web2": HOSTS["web2"]["vars"]}
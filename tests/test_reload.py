@@ -0,0 +1,133 @@
+"""Tests reloading the config while the app runs, and rebuilding only what it changed."""
+
+import asyncio
+import contextlib
+import time
+from http import HTTPStatus
+from types import SimpleNamespace
+
+import pytest
+import yaml
+from fastapi.testclient import TestClient
+
+from ansibleinventorycmdb import reload
+from ansibleinventorycmdb.app import create_app
+from ansibleinventorycmdb.cmdb import AnsibleCMDB
+from ansibleinventorycmdb.config import Config, Inventory
+
+BASE = "https://git.example.com"
+RESPONSES = {
+    f"{BASE}/one/inventory/main.yml": "all:\n  hosts:\n    hostone:\n",
+    f"{BASE}/two/inventory/main.yml": "all:\n  hosts:\n    hosttwo:\n",
+}
+
+
+def inventory(name: str, schema_mapping: dict | None = None) -> Inventory:
+    """An inventory served from RESPONSES."""
+    return Inventory(inventory_url=f"{BASE}/{name}/inventory/main.yml", schema_mapping=schema_mapping or {"a": "A"})
+
+
+def fetcher() -> tuple:
+    """A fetch over RESPONSES, plus the list of URLs it was asked for."""
+    requested: list[str] = []
+
+    async def fetch_text(url: str) -> str | None:
+        requested.append(url)
+        return RESPONSES.get(url)
+
+    return fetch_text, requested
+
+
+@pytest.fixture
+def built() -> AnsibleCMDB:
+    """A CMDB built with one inventory, "main", from RESPONSES."""
+    cmdb = AnsibleCMDB({"main": inventory("one")})
+    asyncio.run(cmdb.build(fetcher()[0]))
+    return cmdb
+
+
+def test_schema_change_rebuilds_nothing(built):
+    """TEST: A schema_mapping change fetches nothing, but drops what was rendered for the last generation."""
+    hosts = built.get_inventory("main")["hosts"]
+    generation = built.generation
+    assert built.cached("page", lambda: "old") == "old"
+    fetch_text, requested = fetcher()
+
+    rebuilt = asyncio.run(built.reconfigure({"main": inventory("one", {"b": "B"})}, fetch_text))
+
+    assert rebuilt == []
+    assert requested == []
+    assert built.get_inventory("main")["hosts"] is hosts
+    assert built.generation == generation + 1
+    assert built.cached("page", lambda: "new") == "new"
+
+
+def test_added_and_moved_inventories_rebuilt(built):
+    """TEST: Only added inventories and those whose URL changed are built; the others are left as they were."""
+    asyncio.run(built.reconfigure({"main": inventory("one"), "other": inventory("one")}, fetcher()[0]))
+    hosts = built.get_inventory("main")["hosts"]
+    fetch_text, requested = fetcher()
+
+    rebuilt = asyncio.run(built.reconfigure({"main": inventory("one"), "other": inventory("two")}, fetch_text))
+
+    assert rebuilt == ["other"]
+    assert all("/two/" in url for url in requested)
+    assert built.get_inventory("main")["hosts"] is hosts
+    assert set(built.get_inventory("other")["hosts"]) == {"hosttwo"}
+
+
+def test_removed_inventory(built):
+    """TEST: An inventory gone from the config is gone from the CMDB."""
+    asyncio.run(built.reconfigure({}, fetcher()[0]))
+
+    assert built.get_inventories() == {}
+
+
+def test_config_applied_during_a_build(built):
+    """TEST: What was rendered from the old config is dropped as the new one is swapped in, not after a build ends."""
+    old = Config(cmdb={"main": inventory("one")})
+    new = Config(cmdb={"main": inventory("one", {"b": "B"}), "other": inventory("two")})
+    app = SimpleNamespace(state=SimpleNamespace(config=old, cmdb=built))
+
+    async def apply_while_building() -> None:
+        assert built.cached("page", lambda: "old") == "old"
+        async with built._building:  # A refresh in progress
+            applying = asyncio.create_task(reload.apply_config(app, new))
+            await asyncio.sleep(0)
+            assert app.state.config is new
+            assert built.cached("page", lambda: "new") == "new"
+        applying.cancel()  # It would fetch the added inventory next
+        with contextlib.suppress(asyncio.CancelledError):
+            await applying
+
+    asyncio.run(apply_while_building())
+
+
+def wait_for(condition, timeout: float = 10) -> bool:
+    """Poll condition() until it's true or timeout seconds pass. Returns whether it came true."""
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.02)
+    return condition()
+
+
+def test_watch_config(tmp_path, monkeypatch, caplog, get_test_config):
+    """TEST: An edited config.yml is picked up while the app runs, and an invalid one leaves it running as it was."""
+    monkeypatch.setattr(reload, "CONFIG_POLL_SECONDS", 0.02)
+    config = get_test_config("valid.yml")
+    config_file = tmp_path / "config.yml"
+    config_file.write_text(yaml.safe_dump(config))
+    app = create_app(instance_path=str(tmp_path))
+
+    with TestClient(app) as client:
+        assert wait_for(lambda: app.state.cmdb.ready)
+
+        config["cmdb"]["second"] = config["cmdb"]["test_main"]
+        config_file.write_text(yaml.safe_dump(config))
+        assert wait_for(lambda: app.state.cmdb.get_inventory("second").get("hosts")), "Config was not reloaded"
+        assert client.get("/inventory/second").status_code == HTTPStatus.OK
+
+        config_file.write_text("cmdb:\n  second: {not_a_field: 1}\n")
+        assert wait_for(lambda: "Not reloading the config" in caplog.text)
+        assert "second" in app.state.config.cmdb
+        assert client.get("/inventory/second").status_code == HTTPStatus.OK
@@ -9,7 +9,7 @@ from typing import TYPE_CHECKING
 import pytest
 from fastapi.testclient import TestClient
 
-from ansibleinventorycmdb.cmdb import AnsibleCMDB
+from ansibleinventorycmdb.cmdb import PHASE_PENDING, PHASE_SKELETON, AnsibleCMDB
 from ansibleinventorycmdb.config import Config
 
 if TYPE_CHECKING:
@@ -64,6 +64,29 @@ def test_get_json_all(client: TestClient, app: FastAPI, test_cmdb_object):
     assert set(response.json()) == {"hostone", "hosttwo", "grouptwo"}
 
 
+def test_get_host_and_inventory_json(client: TestClient, app: FastAPI, test_cmdb_object):
+    """TEST: A host's JSON has its groups and vars, and the inventory's has every host and group."""
+    app.state.cmdb = test_cmdb_object
+
+    host = client.get("/inventory/test_main/host/hostone/json").json()
+    assert host["groups"] == ["all", "groupone", "groupthree"]
+    assert host["vars"]["ansible_host"] == "hostone.pytest.internal"
+
+    inventory = client.get("/inventory/test_main/json").json()
+    assert set(inventory["hosts"]) == {"hostone", "hosttwo", "grouptwo"}
+    assert set(inventory["groups"]) == {"all", "groupone", "grouptwo", "groupthree"}
+
+
+def test_get_ansible_inventory(client: TestClient, app: FastAPI, test_cmdb_object):
+    """TEST: The dynamic inventory endpoint returns Ansible's --list format, host vars under _meta."""
+    app.state.cmdb = test_cmdb_object
+
+    inventory = client.get("/inventory/test_main/ansible/json").json()
+    assert set(inventory["_meta"]["hostvars"]) == {"hostone", "hosttwo", "grouptwo"}
+    assert "hostone" in inventory["groupone"]["hosts"]
+    assert "groupone" in inventory["all"]["children"]
+
+
 @pytest.mark.parametrize(
     "endpoint",
     [
@@ -71,6 +94,9 @@ def test_get_json_all(client: TestClient, app: FastAPI, test_cmdb_object):
         "/inventory/test_main/host/nope",
         "/inventory/nope/group/nope/json",
         "/inventory/test_main/group/nope/json",
+        "/inventory/nope/json",
+        "/inventory/nope/ansible/json",
+        "/inventory/test_main/host/nope/json",
     ],
 )
 def test_get_not_found(client: TestClient, app: FastAPI, test_cmdb_object, endpoint):
@@ -98,8 +124,8 @@ def test_get_uninitialised(client: TestClient, app: FastAPI):
 
 
 def test_get_not_ready(client: TestClient, app: FastAPI, test_cmdb_object):
-    """TEST: Pages render a placeholder rather than erroring while the CMDB is still building."""
-    test_cmdb_object.ready = False
+    """TEST: Pages render a placeholder rather than erroring while an inventory is still building."""
+    test_cmdb_object.phases["test_main"] = PHASE_PENDING
     app.state.cmdb = test_cmdb_object
 
     assert client.get("/inventory/test_main").status_code == HTTPStatus.OK
@@ -108,6 +134,54 @@ def test_get_not_ready(client: TestClient, app: FastAPI, test_cmdb_object):
     assert client.get("/inventory/test_main/group/groupthree/json").status_code == HTTPStatus.SERVICE_UNAVAILABLE
 
 
+def test_skeleton_routes(client: TestClient, app: FastAPI, test_cmdb_object):
+    """TEST: Pages serve a skeleton inventory, saying what's still loading, and its JSON waits for the vars."""
+    test_cmdb_object.phases["test_main"] = PHASE_SKELETON
+    app.state.cmdb = test_cmdb_object
+
+    for endpoint in ("/inventory/test_main", "/inventory/test_main/host/hostone", "/inventory/test_main/group/all"):
+        response = client.get(endpoint)
+        assert response.status_code == HTTPStatus.OK, endpoint
+        assert "still loading" in response.text, endpoint
+    assert "(loading vars)" in client.get("/").text
+    assert test_cmdb_object._derived == {}
+
+    for endpoint in ("/inventory/test_main/json", "/inventory/test_main/host/hostone/json", "/search?q=host"):
+        assert client.get(endpoint).status_code == HTTPStatus.SERVICE_UNAVAILABLE, endpoint
+    assert client.get("/inventory/nope/json").status_code == HTTPStatus.NOT_FOUND
+
+
+def test_large_vars(client: TestClient, app: FastAPI, test_cmdb_object):
+    """TEST: A var too large for its page is collapsed there, and served on its own at the URL the page links."""
+    large = "x" * 100_000
+    test_cmdb_object.inventories["test_main"]["hosts"]["hostone"]["vars"]["large"] = large
+    test_cmdb_object.inventories["test_main"]["groups"]["all"] = {"large": large}
+    app.state.cmdb = test_cmdb_object
+
+    for path in ("/inventory/test_main/host/hostone", "/inventory/test_main/group/all"):
+        page = client.get(path).text
+        assert large not in page
+        assert f'href="{path}/var/large"' in page
+
+        response = client.get(f"{path}/var/large")
+        assert response.status_code == HTTPStatus.OK
+        assert response.headers["content-type"].startswith("text/plain")
+        assert large in response.text
+        assert client.get(f"{path}/var/nope").status_code == HTTPStatus.NOT_FOUND
+
+    # A skeleton's pages link the inline vars they collapse, so those are served too, just not cached
+    test_cmdb_object.phases["test_main"] = PHASE_SKELETON
+    test_cmdb_object._derived.clear()
+    response = client.get("/inventory/test_main/host/hostone/var/large")
+    assert response.status_code == HTTPStatus.OK
+    assert large in response.text
+    assert test_cmdb_object._derived == {}
+
+    test_cmdb_object.phases["test_main"] = PHASE_PENDING
+    response = client.get("/inventory/test_main/host/hostone/var/large")
+    assert response.status_code == HTTPStatus.SERVICE_UNAVAILABLE
+
+
 def test_lifespan_builds_cmdb(app: FastAPI):
     """TEST: Entering the lifespan starts the refresh thread, which builds the CMDB."""
     assert not app.state.cmdb.ready
@@ -127,3 +201,104 @@ def test_static(client: TestClient):
     """TEST: Static assets, including the fonts subdirectory, are served."""
     assert client.get("/static/zy.css").status_code == HTTPStatus.OK
     assert client.get("/static/fonts/fira-code-400.woff2").status_code == HTTPStatus.OK
+
+
+def test_compressed_when_accepted(client: TestClient, app: FastAPI, test_cmdb_object):
+    """TEST: Pages come back gzipped when the client accepts it, and plain when it doesn't."""
+    app.state.cmdb = test_cmdb_object
+
+    for endpoint in ("/", "/inventory/test_main"):
+        plain = client.get(endpoint, headers={"Accept-Encoding": "identity"})
+        assert "content-encoding" not in plain.headers, endpoint
+        assert plain.headers["vary"] == "Accept-Encoding", endpoint
+
+        gzipped = client.get(endpoint, headers={"Accept-Encoding": "gzip"})
+        assert gzipped.headers["content-encoding"] == "gzip", endpoint
+        assert gzipped.content == plain.content, endpoint  # httpx decodes it, so this is the decompressed body
+
+
+def test_responses_cached_per_generation(client: TestClient, app: FastAPI, test_cmdb_object, build_cmdb):
+    """TEST: A page is rendered once per build, and a rebuild throws the rendered copy away."""
+    app.state.cmdb = test_cmdb_object
+
+    client.get("/inventory/test_main/host/hostone")
+    assert ("response", "/inventory/test_main/host/hostone") in test_cmdb_object._derived
+
+    build_cmdb(test_cmdb_object)
+    assert test_cmdb_object._derived == {}
+
+
+def test_unknown_group_not_cached(client: TestClient, app: FastAPI, test_cmdb_object):
+    """TEST: Made-up group names still render, but don't each get a cache entry."""
+    app.state.cmdb = test_cmdb_object
+
+    assert client.get("/inventory/test_main/group/made_up").status_code == HTTPStatus.OK
+    assert not any("made_up" in str(key) for key in test_cmdb_object._derived)
+
+
+def test_inventory_table_controls(client: TestClient, app: FastAPI, test_cmdb_object):
+    """TEST: The inventory table pages, sorts and filters on the server."""
+    app.state.cmdb = test_cmdb_object
+
+    first = client.get("/inventory/test_main", params={"per_page": 1, "sort": "inventory_hostname"})
+    assert first.status_code == HTTPStatus.OK
+    assert "Hosts 1-1 of 3" in first.text
+    assert "/inventory/test_main/host/grouptwo" in first.text
+    assert "/inventory/test_main/host/hostone" not in first.text
+
+    last = client.get("/inventory/test_main", params={"per_page": 1, "sort": "-inventory_hostname"})
+    assert "/inventory/test_main/host/hosttwo" in last.text
+
+    filtered = client.get("/inventory/test_main", params={"q": "HOST ONE"})
+    assert "Hosts 1-1 of 1" in filtered.text
+    assert "/inventory/test_main/host/hostone" in filtered.text
+
+    assert client.get("/inventory/test_main", params={"sort": "nope"}).status_code == HTTPStatus.BAD_REQUEST
+
+
+def test_search(client: TestClient, app: FastAPI, test_cmdb_object):
+    """TEST: /search finds hosts by a var value, and serves the same shards as the static site."""
+    app.state.cmdb = test_cmdb_object
+
+    response = client.get("/search", params={"q": "hostone.pytest"})
+    assert response.status_code == HTTPStatus.OK
+    assert [result["url"] for result in response.json()["results"]] == ["/inventory/test_main/host/hostone"]
+
+    assert client.get("/search/index.json").status_code == HTTPStatus.OK
+    assert client.get("/search/shard/zz.json").status_code == HTTPStatus.NOT_FOUND
+
+
+def test_hosts_query(client: TestClient, app: FastAPI, test_cmdb_object):
+    """TEST: The host query endpoint filters on vars and returns only the projected fields."""
+    app.state.cmdb = test_cmdb_object
+
+    response = client.get(
+        "/inventory/test_main/hosts",
+        params={"where": ["ansible_host==hostone.pytest.internal"], "fields": "ansible_host_description"},
+    )
+    assert response.status_code == HTTPStatus.OK
+    assert response.json() == {"hostone": {"ansible_host_description": "Host One"}}
+
+    assert set(client.get("/inventory/test_main/hosts", params={"where": "ansible_host"}).json()) == {
+        "hostone",
+        "hosttwo",
+    }
+    assert client.get("/inventory/test_main/hosts", params={"where": "==x"}).status_code == HTTPStatus.BAD_REQUEST
+    assert client.get("/inventory/nope/hosts").status_code == HTTPStatus.NOT_FOUND
+
+
+def test_exports(client: TestClient, app: FastAPI, test_cmdb_object):
+    """TEST: The inventory streams out as NDJSON and as CSV with the schema_mapping columns."""
+    app.state.cmdb = test_cmdb_object
+
+    ndjson = client.get("/inventory/test_main/export.ndjson")
+    assert ndjson.headers["content-type"] == "application/x-ndjson"
+    assert len(ndjson.text.splitlines()) == 3  # noqa: PLR2004 hostone, hosttwo and grouptwo
+
+    csv_response = client.get("/inventory/test_main/export.csv")
+    assert csv_response.text.splitlines()[0] == "host,ansible_host,ansible_host_description"
+
+    custom = client.get("/inventory/test_main/export.csv", params={"fields": "ansible_host"})
+    assert custom.text.splitlines()[0] == "host,ansible_host"
+
+    assert client.get("/inventory/nope/export.csv").status_code == HTTPStatus.NOT_FOUND
@@ -0,0 +1,76 @@
+"""Tests the full-text search index."""
+
+import json
+
+import pytest
+
+from ansibleinventorycmdb.search import SearchIndex, shard_name, tokenize
+
+INVENTORIES = {
+    "main": {
+        "hosts": {
+            "web01.prod.example.com": {
+                "groups": ["web"],
+                "vars": {"ansible_host": "10.0.1.5", "os_family": "Debian", "ports": [80, 443]},
+            },
+            "db01.prod.example.com": {"groups": ["db"], "vars": {"ansible_host": "10.0.2.7", "os_family": "RedHat"}},
+        },
+        "groups": {"web": {"backup_enabled": True}, "db": {}},
+    },
+    "other": {"hosts": {"web01": {"groups": [], "vars": {"owner": {"team": "Platform"}}}}, "groups": {}},
+}
+
+
+def test_tokenize():
+    """TEST: Hostnames, IPs and var names break into their whole, their parts and their dotted suffixes."""
+    tokens = tokenize("web01.prod.example.com")
+    assert {"web01.prod.example.com", "web01", "prod", "example.com", "com"} <= tokens
+
+    assert {"10.0.1.5/24", "10", "5", "24"} <= tokenize("10.0.1.5/24")
+    assert {"backup_enabled", "backup", "enabled"} <= tokenize("backup_enabled")
+    assert tokenize("'Quoted,'") == {"quoted"}
+
+
+@pytest.mark.parametrize(
+    ("query", "expected"),
+    [
+        ("10.0.1", {"web01.prod.example.com"}),
+        ("10.0", {"web01.prod.example.com", "db01.prod.example.com"}),
+        ("example.com", {"web01.prod.example.com", "db01.prod.example.com"}),
+        ("debian", {"web01.prod.example.com"}),
+        ("web01", {"web01.prod.example.com", "web01"}),
+        ("web01 debian", {"web01.prod.example.com"}),
+        ("443", {"web01.prod.example.com"}),
+        ("platform", {"web01"}),
+        ("backup", {"web"}),
+        ("nothing-like-this", set()),
+        ("", set()),
+    ],
+)
+def test_search(query, expected):
+    """TEST: Terms match by prefix, across names, var names and nested values, and all must match."""
+    total, docs = SearchIndex(INVENTORIES).search(query)
+    assert {doc["name"] for doc in docs} == expected
+    assert total == len(expected)
+
+
+def test_search_limit():
+    """TEST: The total counts every match, the results stop at the limit."""
+    total, docs = SearchIndex(INVENTORIES).search("web", limit=1)
+    assert total > 1
+    assert len(docs) == 1
+
+
+def test_shards_hold_the_whole_index():
+    """TEST: Every token is in the shard its first two characters name, with the same documents."""
+    index = SearchIndex(INVENTORIES)
+    objects = index.shards()
+
+    listed = json.loads(objects["index.json"])["shards"]
+    assert sorted(f"shard/{name}.json" for name in listed) == sorted(set(objects) - {"index.json", "docs.json"})
+
+    docs = json.loads(objects["docs.json"])
+    for token, posting in zip(index.tokens, index.postings, strict=True):
+        shard = json.loads(objects[f"shard/{shard_name(token)}.json"])
+        assert shard[token] == posting
+        assert all(docs[doc_id][2] == index.docs[doc_id]["name"] for doc_id in posting)
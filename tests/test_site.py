@@ -5,15 +5,34 @@ have to match the app's URL paths exactly. test_every_link_resolves is the check
 """
 
 import asyncio
+import contextlib
+import gzip
 import json
 import re
 from pathlib import Path
 
+import httpx
 import pytest
-
-from ansibleinventorycmdb.cmdb import AnsibleCMDB
-from ansibleinventorycmdb.config import Config
-from ansibleinventorycmdb.site import STATIC_ROOT_HREF, render_site
+import yaml
+
+from ansibleinventorycmdb import cmdb as cmdb_module
+from ansibleinventorycmdb import site as site_module
+from ansibleinventorycmdb.cmdb import AnsibleCMDB, Revalidator
+from ansibleinventorycmdb.config import Config, Inventory
+from ansibleinventorycmdb.publish import DirectorySink, publish
+from ansibleinventorycmdb.site import (
+    PAGE_VARS_BYTES,
+    STATIC_ROOT_HREF,
+    VAR_CONTENT_TYPE,
+    VAR_INLINE_BYTES,
+    carried_over,
+    collapsed_vars,
+    content_encoded,
+    render_site,
+    site_objects,
+    watch,
+    write_site,
+)
 
 # Root-relative hrefs only, external links are somebody else's problem.
 HREF_RE = re.compile(r'href="(/[^"]*)"')
@@ -41,6 +60,10 @@ def test_expected_keys(site):
         "inventory/test_main/host/hostone/index.html",
         "inventory/test_main/group/groupone/index.html",
         "inventory/test_main/group/all/json",
+        "inventory/test_main/json",
+        "inventory/test_main/host/hostone/json",
+        "search/index.json",
+        "search/docs.json",
         "static/zy.css",
         "static/fonts/fira-code-400.woff2",
     ):
@@ -89,12 +112,72 @@ def test_group_json_matches_the_route(site, client, build_cmdb, app):
         assert static == served
 
 
+def test_json_objects_are_the_served_bytes(site, client, build_cmdb, app):
+    """Every JSON object is byte for byte what the app serves at the same path, not just the same data."""
+    build_cmdb(app.state.cmdb)
+
+    for key in (
+        "inventory/test_main/json",
+        "inventory/test_main/ansible/json",
+        "inventory/test_main/host/hostone/json",
+        "inventory/test_main/group/all/json",
+    ):
+        assert client.get(f"/{key}").content == site[key][0], key
+
+
 def test_host_page_contains_vars(site):
     """The host page renders the host's vars, not a 'not ready' placeholder."""
     body = site["inventory/test_main/host/hostone/index.html"][0].decode()
     assert "hostone.pytest.internal" in body
 
 
+def test_large_vars_collapsed():
+    """TEST: Vars too large for their page are collapsed there and written on their own, and the page links them."""
+    certificate = "-----BEGIN CERTIFICATE-----\n" + "A" * VAR_INLINE_BYTES + "\n-----END CERTIFICATE-----"
+    rule_count = PAGE_VARS_BYTES // VAR_INLINE_BYTES * 3  # Each under the limit, but too many for one page
+    rules = {f"rule{number}": "x" * (VAR_INLINE_BYTES // 2) for number in range(rule_count)}
+    host_vars = {"certificate": certificate, "ansible_host": "10.0.0.1", **rules}
+
+    collapsed = collapsed_vars(host_vars)
+    assert "certificate" in collapsed  # Over the limit on its own
+    assert "ansible_host" not in collapsed
+    assert 0 < len(collapsed.keys() & rules.keys()) < len(rules)  # Only enough to bring the page under its limit
+
+    inventory_dict = {"hosts": {"hostone": {"groups": ["all"], "vars": host_vars}}, "groups": {"all": {}}}
+    inventories = {
+        "main": Inventory(inventory_url="https://git.example.com/inventory/main.yml", schema_mapping={"a": "A"})
+    }
+    objects = {
+        key: (body, content_type) for key, body, content_type in render_site({"main": inventory_dict}, inventories, "")
+    }
+
+    page = objects["inventory/main/host/hostone/index.html"][0].decode()
+    assert len(page) < PAGE_VARS_BYTES + VAR_INLINE_BYTES
+    assert "10.0.0.1" in page
+    assert "A" * VAR_INLINE_BYTES not in page
+    for var in collapsed:
+        href = f"/inventory/main/host/hostone/var/{var}"
+        assert f'href="{href}"' in page
+        body, content_type = objects[href.removeprefix("/")]
+        assert content_type == VAR_CONTENT_TYPE
+        assert yaml.safe_load(body) == {var: host_vars[var]}
+
+
+def test_unlinkable_vars_shown_inline():
+    """TEST: A var whose name isn't a safe object key or URL is shown inline however large, never written on its own."""
+    large = "x" * (VAR_INLINE_BYTES * 2)
+    host_vars = {"../../escape": large, "a/b": large, 1: large, "fine": large}
+    assert collapsed_vars(host_vars).keys() == {"fine"}
+
+    inventory_dict = {"hosts": {"h": {"groups": ["all"], "vars": host_vars}}, "groups": {"all": {}}}
+    inventories = {
+        "main": Inventory(inventory_url="https://git.example.com/inventory/main.yml", schema_mapping={"a": "A"})
+    }
+    keys = [key for key, _, _ in render_site({"main": inventory_dict}, inventories, "")]
+    assert [key for key in keys if "/var/" in key] == ["inventory/main/host/h/var/fine"]
+    assert not any(".." in key for key in keys)
+
+
 def test_cmdb_without_instance_path_writes_nothing(tmp_path, get_test_config, build_cmdb):
     """The Worker runs with no writable filesystem, so instance_path=None must not touch disk."""
     config = Config(**get_test_config("valid.yml"))
@@ -136,3 +219,201 @@ def test_unusable_inventory_is_skipped(tmp_path, get_test_config, caplog):
 
     assert cmdb.get_inventory("test_main")["hosts"] == {}
     assert "is not a mapping of groups to hosts" in caplog.text
+
+
+def test_gzip_siblings(tmp_path, get_test_config, build_cmdb):
+    """TEST: Compressible objects get a .gz sibling that decompresses to them, and nothing else does."""
+    config = Config(**get_test_config("valid.yml"))
+    cmdb = build_cmdb(AnsibleCMDB(config.cmdb, str(tmp_path)))
+    site = {key: body for key, body, _ in render_site(cmdb.inventories, config.cmdb, cmdb.built_at, gzip_siblings=True)}
+
+    assert gzip.decompress(site["inventory/test_main/index.html.gz"]) == site["inventory/test_main/index.html"]
+    assert gzip.decompress(site["inventory/test_main/group/all/json.gz"]) == site["inventory/test_main/group/all/json"]
+    assert "static/fonts/fira-code-400.woff2.gz" not in site
+
+
+def test_content_encoded(site):
+    """TEST: For an object store, text is gzipped in place and fonts are stored as they are."""
+    objects = ((key, body, content_type) for key, (body, content_type) in site.items())
+    encoded = {key: (body, encoding) for key, body, _, encoding in content_encoded(objects)}
+
+    body, encoding = encoded["inventory/test_main/index.html"]
+    assert encoding == "gzip"
+    assert gzip.decompress(body) == site["inventory/test_main/index.html"][0]
+    assert encoded["static/fonts/fira-code-400.woff2"] == (site["static/fonts/fira-code-400.woff2"][0], "")
+
+
+def test_ansible_inventory(site):
+    """TEST: The dynamic inventory object has every group's hosts, all's children, and every host's vars."""
+    inventory = json.loads(site["inventory/test_main/ansible/json"][0])
+
+    assert inventory["_meta"]["hostvars"]["hostone"]["ansible_host"] == "hostone.pytest.internal"
+    assert inventory["groupthree"]["hosts"] == ["hostone", "hosttwo"]
+    assert set(inventory["all"]["children"]) == {"groupone", "grouptwo", "groupthree"}
+    assert "all" not in inventory["all"]["children"]
+
+
+def test_parallel_render_is_identical(tmp_path, get_test_config, build_cmdb, monkeypatch):
+    """TEST: Rendering across processes gives the same objects, in the same order, byte for byte."""
+    monkeypatch.setattr(site_module, "RENDER_CHUNK_HOSTS", 1)  # One task per host, so order has to be kept
+    config = Config(**get_test_config("valid.yml"))
+    cmdb = build_cmdb(AnsibleCMDB(config.cmdb, str(tmp_path)))
+
+    serial = list(render_site(cmdb.inventories, config.cmdb, cmdb.built_at))
+    parallel = list(render_site(cmdb.inventories, config.cmdb, cmdb.built_at, jobs=2))
+
+    assert parallel == serial
+
+
+def test_write_site_unchanged(tmp_path, get_test_config, build_cmdb):
+    """TEST: Writing the same build twice writes nothing the second time."""
+    config = Config(**get_test_config("valid.yml"))
+    cmdb = build_cmdb(AnsibleCMDB(config.cmdb, str(tmp_path)))
+    out_dir = tmp_path / "out"
+
+    first = write_site(cmdb.inventories, config.cmdb, out_dir, cmdb.built_at, exports=True)
+    second = write_site(cmdb.inventories, config.cmdb, out_dir, cmdb.built_at, exports=True)
+
+    assert first["written"] > 0
+    assert second == {"written": 0, "skipped": first["written"], "deleted": 0}
+    assert (out_dir / "inventory/test_main/export.csv").is_file()
+
+
+def site_files(site_dir: Path) -> dict[str, bytes]:
+    """Every file of a written site, by path."""
+    return {path.relative_to(site_dir).as_posix(): path.read_bytes() for path in site_dir.rglob("*") if path.is_file()}
+
+
+def test_incremental_publish_matches_full(tmp_path):
+    """TEST: Publishing only what a rebuild changed, over the last release, gives the site a full publish would."""
+    base = "https://git.example.com/playbooks"
+    responses = {
+        f"{base}/inventory/main.yml": "all:\n  hosts:\n    hostone:\n    hosttwo:\n    hostgone:\n"
+        "web:\n  hosts:\n    hostone:\n",
+        f"{base}/host_vars/hostone.yml": "a: 1\n",
+    }
+
+    async def fetch_text(url: str) -> str | None:
+        return responses.get(url)
+
+    inventories = {"main": Inventory(inventory_url=f"{base}/inventory/main.yml", schema_mapping={"a": "A"})}
+    cmdb = AnsibleCMDB(inventories, track_changes=True)
+    asyncio.run(cmdb.build(fetch_text))
+    out_dir = tmp_path / "out"
+    first = write_site(cmdb.inventories, inventories, out_dir, cmdb.built_at, gzip_siblings=True, exports=True)
+    published = cmdb.generation
+
+    responses[f"{base}/inventory/main.yml"] = "all:\n  hosts:\n    hostone:\n    hosttwo:\n    hostnew:\n"
+    responses[f"{base}/host_vars/hostone.yml"] = "a: 2\n"
+    asyncio.run(cmdb.refresh(fetch_text))
+    changes = {"main": cmdb.changes.changes("main", published, cmdb.generation)}
+    assert changes["main"]["hosts"] == {"added": ["hostnew"], "removed": ["hostgone"], "changed": ["hostone"]}
+
+    objects = site_objects(
+        cmdb.inventories, inventories, cmdb.built_at, gzip_siblings=True, exports=True, changes=changes
+    )
+    counts = asyncio.run(publish(objects, DirectorySink(out_dir, carried_over(changes))))
+    full_dir = tmp_path / "full"
+    write_site(cmdb.inventories, inventories, full_dir, cmdb.built_at, gzip_siblings=True, exports=True)
+
+    assert site_files(out_dir) == site_files(full_dir)
+    assert counts["written"] < first["written"] // 2
+    assert counts["deleted"] > 0
+
+
+def watch_until(cmdb: AnsibleCMDB, publish_site, revalidations: int, before=None) -> None:
+    """Run watch() over cmdb until it has asked the origin about changes revalidations times, and published after.
+
+    before(n), if given, runs ahead of the nth time, to change what the origin serves.
+    """
+    revalidate = cmdb.revalidate
+    calls = 0
+
+    async def counted(fetcher) -> bool:
+        nonlocal calls
+        calls += 1
+        if before is not None:
+            before(calls)
+        return await revalidate(fetcher)
+
+    cmdb.revalidate = counted
+
+    async def watch_a_while() -> None:
+        task = asyncio.create_task(watch(cmdb, publish_site, 0.01))
+        while calls <= revalidations:  # noqa: ASYNC110 Nothing to wait on: the next one starting means the last is done
+            await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(watch_a_while())
+
+
+def test_watch_publishes_only_changes(tmp_path, get_test_config):
+    """TEST: Watching publishes the whole site once, then builds and publishes nothing while the sources stay put."""
+    config = Config(**get_test_config("valid.yml"))
+    cmdb = AnsibleCMDB(config.cmdb, str(tmp_path), track_changes=True)
+    published: list[dict | None] = []
+
+    async def publish_site(changes: dict | None) -> None:
+        published.append(changes)
+
+    watch_until(cmdb, publish_site, 3)
+    assert published == [None]
+    assert cmdb.generation == 1
+
+
+class FlakyOrigin:
+    """Enough of an httpx.AsyncClient for a Revalidator: serves responses, or times out while failing is set."""
+
+    def __init__(self, responses: dict[str, str]) -> None:
+        self.responses = responses
+        self.failing: set[str] = set()
+
+    async def get(self, url: str, headers: dict | None = None) -> httpx.Response:
+        if url in self.failing:
+            raise TimeoutError
+        if url not in self.responses:
+            return httpx.Response(404)
+        return httpx.Response(200, text=self.responses[url])
+
+
+def test_watch_survives_a_failed_fetch(tmp_path, monkeypatch):
+    """TEST: An interval in which fetches fail removes nothing from the site, and the next one publishes the change."""
+    base = "https://git.example.com/playbooks"
+    inventory_url = f"{base}/inventory/main.yml"
+    origin = FlakyOrigin(
+        {inventory_url: "all:\n  hosts:\n    hostone:\n    hosttwo:\n", f"{base}/host_vars/hostone.yml": "a: 1\n"}
+    )
+
+    @contextlib.asynccontextmanager
+    async def revalidating_fetcher():
+        yield Revalidator(origin)
+
+    monkeypatch.setattr(cmdb_module, "revalidating_fetcher", revalidating_fetcher)
+
+    def before(calls: int) -> None:
+        if calls == 1:  # The whole origin is down
+            origin.failing = {*origin.responses, f"{base}/host_vars/hosttwo.yml"}
+        elif calls == 2:  # A host is added, but its vars file times out  # noqa: PLR2004
+            origin.responses[inventory_url] += "    hostthree:\n"
+            origin.failing = {f"{base}/host_vars/hostthree.yml"}
+        else:
+            origin.failing = set()
+
+    inventories = {"main": Inventory(inventory_url=inventory_url, schema_mapping={"a": "A"})}
+    cmdb = AnsibleCMDB(inventories, str(tmp_path), track_changes=True)
+    published: list[dict | None] = []
+
+    async def publish_site(changes: dict | None) -> None:
+        published.append(changes)
+        if changes is None:
+            assert sorted(cmdb.get_inventory("main")["hosts"]) == ["hostone", "hosttwo"]
+
+    watch_until(cmdb, publish_site, 3, before)
+
+    assert published[0] is None
+    assert [changes["main"]["hosts"] for changes in published[1:]] == [
+        {"added": ["hostthree"], "removed": [], "changed": []}
+    ]
+    assert cmdb.get_host("main", "hostone")["vars"] == {"a": 1}
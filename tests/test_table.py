@@ -0,0 +1,88 @@
+"""Tests the server-side sort, filter and paging of the inventory table."""
+
+import pytest
+
+from ansibleinventorycmdb import table
+from ansibleinventorycmdb.table import (
+    HOST_COLUMN,
+    MAX_PER_PAGE,
+    FilteredViews,
+    default_sort,
+    filter_text,
+    paginate,
+    query_string,
+    sort_index,
+)
+
+HOSTS = {
+    "host10": {"groups": ["web"], "vars": {"ip": "10.0.0.10"}},
+    "host2": {"groups": ["web"], "vars": {"ip": "10.0.0.9"}},
+    "Host1": {"groups": ["db"], "vars": {"ip": "192.168.1.1"}},
+    "nameless": {"groups": [], "vars": {}},
+}
+
+
+def test_sort_natural_hostnames():
+    """TEST: Hostnames sort naturally and case-insensitively, not as plain strings."""
+    assert sort_index(HOSTS, HOST_COLUMN) == ["Host1", "host2", "host10", "nameless"]
+
+
+def test_sort_ips_numerically():
+    """TEST: IPs sort by value, so .9 comes before .10 and 192.x after 10.x; hosts without the var go last."""
+    assert sort_index(HOSTS, "ip") == ["host2", "host10", "Host1", "nameless"]
+
+
+def test_sort_mixed_types():
+    """TEST: A column mixing IPs, text and numbers sorts without raising."""
+    hosts = {name: {"vars": {"x": value}} for name, value in {"a": "text", "b": 3, "c": "::1", "d": True}.items()}
+    assert sort_index(hosts, "x")[0] == "c"
+
+
+def test_filter_text():
+    """TEST: A row's filter text covers the host name, the schema columns and the groups, lowercased."""
+    text = filter_text(HOSTS, {"ip": "IP Address"})
+    assert "host1" in text["Host1"]
+    assert "192.168.1.1" in text["Host1"]
+    assert "db" in text["Host1"]
+
+
+def test_filtered_views(monkeypatch):
+    """TEST: A filter's matches are kept per sort order and filter, and only for the most recently used few."""
+    monkeypatch.setattr(table, "FILTERED_VIEWS", 2)
+    views = FilteredViews(filter_text(HOSTS, {"ip": "IP Address"}))
+    order = sort_index(HOSTS, "ip")
+
+    first = views.get("ip", "WEB", order)
+    assert first == ["host2", "host10"]
+    assert views.get("ip", "web", order) is first  # Not scanned again, and case doesn't matter
+    views.get("-ip", "web", order[::-1])
+    views.get("ip", "db", order)
+    assert views.get("ip", "web", order) is not first  # Evicted, the least recently used of three
+
+
+@pytest.mark.parametrize(
+    ("total", "page", "per_page", "expected"),
+    [
+        (250, 1, 100, (1, 3, 100)),
+        (250, 9, 100, (3, 3, 100)),
+        (250, 0, 100, (1, 3, 100)),
+        (0, 1, 100, (1, 1, 100)),
+        (250, 1, 0, (1, 250, 1)),
+        (5000, 1, 10**6, (1, 10, MAX_PER_PAGE)),
+    ],
+)
+def test_paginate(total, page, per_page, expected):
+    """TEST: The page and page size are clamped, so a request can't ask for unbounded work."""
+    assert paginate(total, page, per_page) == expected
+
+
+def test_default_sort():
+    """TEST: The IP Address column is the default sort, as it always was in the browser."""
+    assert default_sort({"a": "Hostname", "b": "IP Address"}) == "b"
+    assert default_sort({"a": "Hostname"}) == ""
+
+
+def test_query_string():
+    """TEST: Defaults are left out of links."""
+    assert query_string("", "", 1, 100) == "?"
+    assert query_string("-ip", "web", 2, 100) == "?sort=-ip&q=web&page=2"
@@ -0,0 +1,148 @@
+"""Tests the memory-bounded URL cache."""
+
+import asyncio
+from http import HTTPStatus
+
+from ansibleinventorycmdb.cmdb import AnsibleCMDB
+from ansibleinventorycmdb.config import Inventory
+from ansibleinventorycmdb.constants import PROGRAM_VERSION
+from ansibleinventorycmdb.urlcache import UrlCache, approximate_size
+
+DOCUMENT = {"vars": {f"var{number}": f"value{number}" for number in range(50)}, "list": [1, 2, 3]}
+DOCUMENT_SIZE = approximate_size(DOCUMENT)
+
+
+def test_approximate_size():
+    """TEST: A document's size counts what it contains, not just the outer dict."""
+    assert approximate_size({}) < DOCUMENT_SIZE
+    assert approximate_size({"a": DOCUMENT}) > DOCUMENT_SIZE
+
+
+def test_lru_eviction():
+    """TEST: Past max_bytes, the least recently used entries go first, and a read counts as a use."""
+    cache = UrlCache(None, max_bytes=DOCUMENT_SIZE * 2)
+
+    async def fill() -> None:
+        await cache.put("one", DOCUMENT)
+        await cache.put("two", DOCUMENT)
+        assert await cache.get("one") == DOCUMENT  # "two" is now the least recently used
+        await cache.put("three", DOCUMENT)
+
+    asyncio.run(fill())
+
+    assert asyncio.run(cache.get("two")) is None  # Nothing on disk to fall back to: fetch it again
+    assert asyncio.run(cache.get("one")) == DOCUMENT
+    assert cache.stats() == {
+        "entries": 2,
+        "bytes": DOCUMENT_SIZE * 2,
+        "max_bytes": DOCUMENT_SIZE * 2,
+        "evictions": 1,
+        "disk_reads": 0,
+    }
+
+
+def test_oversized_entry_kept():
+    """TEST: An entry over the ceiling on its own is still kept, in place of everything else."""
+    cache = UrlCache(None, max_bytes=1)
+
+    asyncio.run(cache.put("one", DOCUMENT))
+    asyncio.run(cache.put("two", DOCUMENT))
+
+    assert len(cache) == 1
+    assert asyncio.run(cache.get("two")) == DOCUMENT
+
+
+def test_disk_fallback(tmp_path):
+    """TEST: An evicted entry is read back from disk, and a committed snapshot replaces the disk copies."""
+    cache = UrlCache(str(tmp_path / "url_cache"), max_bytes=1)
+
+    asyncio.run(cache.put("one", DOCUMENT))
+    asyncio.run(cache.put("two", {"other": True}))
+    assert cache.stats()["evictions"] == 1
+
+    assert asyncio.run(cache.get("one")) == DOCUMENT
+    assert cache.stats()["disk_reads"] == 1
+    assert UrlCache(str(tmp_path / "url_cache"), max_bytes=1).on_disk()
+
+    async def snapshot() -> None:
+        await cache.begin_snapshot()
+        await cache.put("two", {"other": False})
+        await cache.commit_snapshot()
+
+    asyncio.run(snapshot())
+    assert asyncio.run(cache.get("one")) is None
+    assert asyncio.run(UrlCache(str(tmp_path / "url_cache"), max_bytes=1).get("two")) == {"other": False}
+
+
+def test_abandoned_snapshot(tmp_path):
+    """TEST: Until a snapshot is committed the last one is whole on disk, and abandoning it goes back to that."""
+    directory = str(tmp_path / "url_cache")
+    cache = UrlCache(directory, max_bytes=1)
+
+    async def refresh_that_fails() -> None:
+        await cache.put("one", DOCUMENT)
+        await cache.begin_snapshot()
+        assert await cache.get("one") is None  # Fetched again
+        assert await cache.previous("one") == DOCUMENT
+        await cache.put("one", {"half": "done"})
+        assert await UrlCache(directory, max_bytes=1).get("one") == DOCUMENT  # What an offline build sees
+        await cache.abandon_snapshot()
+
+    asyncio.run(refresh_that_fails())
+    assert asyncio.run(cache.get("one")) == DOCUMENT
+    assert [path.name for path in tmp_path.iterdir()] == ["url_cache"]
+
+
+def test_failed_fetches_not_cached(tmp_path):
+    """TEST: A refresh caches nothing for a fetch that failed, and keeps the last good copy on disk in its place."""
+    base = "https://git.example.com/playbooks"
+    responses = {
+        f"{base}/inventory/main.yml": "all:\n  hosts:\n    hostone:\n",
+        f"{base}/host_vars/hostone.yml": "a: 1\n",
+    }
+    failing: set[str] = set()
+
+    async def fetch_text(url: str) -> str | None:
+        if url in failing:
+            raise TimeoutError
+        return responses.get(url)
+
+    inventories = {"main": Inventory(inventory_url=f"{base}/inventory/main.yml", schema_mapping={"a": "A"})}
+    cmdb = AnsibleCMDB(inventories, str(tmp_path))
+    asyncio.run(cmdb.refresh(fetch_text))
+
+    failing.add(f"{base}/host_vars/hostone.yml")
+    asyncio.run(cmdb.refresh(fetch_text))
+    offline = AnsibleCMDB(inventories, str(tmp_path))
+    asyncio.run(offline.build(offline=True))
+
+    assert offline.get_host("main", "hostone")["vars"] == {"a": 1}
+
+
+def test_unreadable_disk_copy(tmp_path):
+    """TEST: A damaged file on disk reads as a miss, to be fetched again, rather than an error."""
+    cache = UrlCache(str(tmp_path), max_bytes=1)
+    asyncio.run(cache.put("one", DOCUMENT))
+    for path in tmp_path.iterdir():
+        path.write_bytes(b"not a pickle")
+
+    assert asyncio.run(UrlCache(str(tmp_path), max_bytes=1).get("one")) is None
+
+
+def test_health_shows_url_cache(client, app, build_cmdb):
+    """TEST: /health reports the URL cache's size and evictions."""
+    build_cmdb(app.state.cmdb)
+    url_cache = client.get("/health").json()["url_cache"]
+
+    assert url_cache["entries"] > 0
+    assert url_cache["bytes"] <= url_cache["max_bytes"]
+    assert url_cache["evictions"] == 0
+
+
+def test_health_without_a_cmdb(app, client):
+    """TEST: /health answers with the version before there's a CMDB on app.state, as while the app starts."""
+    del app.state.cmdb
+    response = client.get("/health")
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.json() == {"version": PROGRAM_VERSION}
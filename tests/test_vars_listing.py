@@ -0,0 +1,135 @@
+"""Tests listing an inventory's vars files, so that only the ones that exist are fetched."""
+
+import asyncio
+import json
+
+from ansibleinventorycmdb.cmdb import VARS_MANIFEST, AnsibleCMDB, OriginError
+from ansibleinventorycmdb.config import Inventory
+
+BASE = "https://git.example.com/playbooks"
+RAW = "https://raw.githubusercontent.com/someone/playbooks/refs/heads/main"
+TREE = "https://api.github.com/repos/someone/playbooks/git/trees/main?recursive=1"
+MAIN = "all:\n  hosts:\n    hostone:\n    hosttwo:\n"
+
+
+def build_over(base_url: str, responses: dict[str, str]) -> tuple[AnsibleCMDB, list[str]]:
+    """Build an inventory at base_url from a fixed url -> body mapping. Returns it, and every URL it asked for."""
+    requested: list[str] = []
+
+    async def fetch_text(url: str) -> str | None:
+        requested.append(url)
+        return responses.get(url)
+
+    cmdb = AnsibleCMDB({"main": Inventory(inventory_url=f"{base_url}/inventory/main.yml", schema_mapping={"a": "A"})})
+    asyncio.run(cmdb.build(fetch_text))
+    return cmdb, requested
+
+
+def test_manifest():
+    """TEST: With a manifest published beside the inventory, only the vars files it lists are fetched."""
+    cmdb, requested = build_over(
+        BASE,
+        {
+            f"{BASE}/{VARS_MANIFEST}": "./host_vars/hostone.yml\n",
+            f"{BASE}/inventory/main.yml": MAIN,
+            f"{BASE}/host_vars/hostone.yml": "a: 1\n",
+        },
+    )
+
+    assert sorted(requested) == sorted(
+        [f"{BASE}/{VARS_MANIFEST}", f"{BASE}/inventory/main.yml", f"{BASE}/host_vars/hostone.yml"]
+    )
+    assert cmdb.get_host("main", "hostone")["vars"] == {"a": 1}
+
+
+def test_no_listing_probes_everything():
+    """TEST: Without a manifest, every host and group is probed at both paths, as before there were listings."""
+    _, requested = build_over(BASE, {f"{BASE}/inventory/main.yml": MAIN})
+
+    probes = [url for url in requested if "_vars/" in url]
+    assert len(probes) == 6  # noqa: PLR2004 Two hosts and a group, at two paths each
+
+
+def test_manifest_that_is_not_a_listing():
+    """TEST: A 200 at the manifest's URL that isn't a list of vars files, a web page say, is ignored, not trusted."""
+    for body in ("<!doctype html>\n<html><body>Sign in</body></html>\n", "README.md\ninventory/main.yml\n"):
+        _, requested = build_over(BASE, {f"{BASE}/{VARS_MANIFEST}": body, f"{BASE}/inventory/main.yml": MAIN})
+
+        probes = [url for url in requested if "_vars/" in url]
+        assert len(probes) == 6  # noqa: PLR2004 As without a manifest
+
+
+def test_github_tree():
+    """TEST: A repo on GitHub is listed by the git trees API, and a base URL below its root is respected."""
+    tree = {
+        "tree": [
+            {"path": "infra/inventory/main.yml", "type": "blob"},
+            {"path": "infra/inventory/group_vars/all.yml", "type": "blob"},
+            {"path": "infra/inventory/group_vars", "type": "tree"},
+            {"path": "host_vars/hostone.yml", "type": "blob"},  # Outside infra/, not this inventory's
+        ],
+        "truncated": False,
+    }
+    cmdb, requested = build_over(
+        f"{RAW}/infra",
+        {
+            TREE: json.dumps(tree),
+            f"{RAW}/infra/inventory/main.yml": MAIN,
+            f"{RAW}/infra/inventory/group_vars/all.yml": "b: 2\n",
+        },
+    )
+
+    assert [url for url in requested if "_vars/" in url] == [f"{RAW}/infra/inventory/group_vars/all.yml"]
+    assert cmdb.get_group("main", "all") == {"b": 2}
+
+
+def test_truncated_github_tree():
+    """TEST: A listing GitHub truncated is incomplete, so everything is probed rather than trusting it."""
+    _, requested = build_over(
+        RAW, {TREE: json.dumps({"tree": [], "truncated": True}), f"{RAW}/inventory/main.yml": MAIN}
+    )
+
+    assert len([url for url in requested if "_vars/" in url]) == 6  # noqa: PLR2004
+
+
+def test_github_branch_with_a_slash():
+    """TEST: A branch with a "/" in it, read as a branch and a directory, gets another ref's listing: probe instead."""
+    raw = "https://raw.githubusercontent.com/someone/playbooks/refs/heads/release/1.2"
+    tree = "https://api.github.com/repos/someone/playbooks/git/trees/release?recursive=1"  # A tag named release, say
+    cmdb, requested = build_over(
+        raw,
+        {
+            tree: json.dumps({"tree": [{"path": "1.2/README.md", "type": "blob"}], "truncated": False}),
+            f"{raw}/inventory/main.yml": MAIN,
+            f"{raw}/host_vars/hostone.yml": "a: 1\n",
+        },
+    )
+
+    assert len([url for url in requested if "_vars/" in url]) == 6  # noqa: PLR2004 As without a listing
+    assert cmdb.get_host("main", "hostone")["vars"] == {"a": 1}
+
+
+def test_rate_limited_listing(tmp_path):
+    """TEST: A refresh that can't fetch the listing, GitHub's API being rate limited say, uses the last one."""
+    responses = {
+        TREE: json.dumps({"tree": [{"path": "inventory/main.yml", "type": "blob"}], "truncated": False}),
+        f"{RAW}/inventory/main.yml": MAIN,
+    }
+    requested: list[str] = []
+
+    async def fetch_text(url: str) -> str | None:
+        requested.append(url)
+        if url == TREE and TREE not in responses:
+            msg = f"{url} answered 403"
+            raise OriginError(msg)
+        return responses.get(url)
+
+    cmdb = AnsibleCMDB(
+        {"main": Inventory(inventory_url=f"{RAW}/inventory/main.yml", schema_mapping={"a": "A"})}, str(tmp_path)
+    )
+    asyncio.run(cmdb.refresh(fetch_text))
+    del responses[TREE]
+    requested.clear()
+    asyncio.run(cmdb.refresh(fetch_text))
+
+    assert sorted(requested) == sorted([TREE, f"{RAW}/inventory/main.yml"])  # No vars file probed
@@ -2,6 +2,7 @@
 
 import asyncio
 import io
+import json
 import zipfile
 
 from ansibleinventorycmdb.cmdb import github_zip_fetcher
@@ -57,3 +58,22 @@ def test_falls_back_to_per_file_requests():
 
     assert asyncio.run(run()) == ["groupone:\n", "grouptwo:\n"]
     assert requested.count("https://codeload.github.com/someone/playbooks/zip/refs/heads/main") == 1
+
+
+def test_serves_tree_listing_from_zip():
+    """TEST: The repo's git trees listing comes out of the same archive, without a request to the API."""
+    zip_body = make_zip({"inventory/main.yml": "groupone:\n", "inventory/host_vars/hostone.yml": "a: 1\n"})
+    fetch_text, requested = fetcher_over(
+        {"https://codeload.github.com/someone/playbooks/zip/refs/heads/main": zip_body}
+    )
+
+    listing = asyncio.run(fetch_text("https://api.github.com/repos/someone/playbooks/git/trees/main?recursive=1"))
+
+    assert json.loads(listing) == {
+        "tree": [
+            {"path": "inventory/main.yml", "type": "blob"},
+            {"path": "inventory/host_vars/hostone.yml", "type": "blob"},
+        ],
+        "truncated": False,
+    }
+    assert requested == ["https://codeload.github.com/someone/playbooks/zip/refs/heads/main"]